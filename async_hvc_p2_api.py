@@ -0,0 +1,189 @@
+﻿# ---------------------------------------------------------------------------
+# Copyright 2017-2018  OMRON Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ---------------------------------------------------------------------------
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+import threading
+import logging
+import Queue
+from hvc_p2_api import HVCP2Api
+
+_logger = logging.getLogger(__name__)
+
+# Methods of HVCP2Api provided as asynchronous methods.
+_API_METHODS = ('connect', 'disconnect', 'get_version',
+                'set_camera_angle', 'get_camera_angle', 'execute',
+                'reset_tracking', 'set_threshold', 'get_threshold',
+                'set_detection_size', 'get_detection_size',
+                'set_face_angle', 'get_face_angle', 'set_uart_baudrate',
+                'apply_config', 'get_config', 'invalidate_config',
+                'register_data', 'delete_data', 'delete_user',
+                'delete_all_data', 'get_user_data', 'save_album', 'load_album',
+                'save_album_to_flash', 'reformat_flash',
+                'get_stb_version',
+                'set_stb_tr_retry_count', 'get_stb_tr_retry_count',
+                'set_stb_tr_steadiness_param', 'get_stb_tr_steadiness_param',
+                'set_stb_pe_threshold_use', 'get_stb_pe_threshold_use',
+                'set_stb_pe_angle_use', 'get_stb_pe_angle_use',
+                'set_stb_pe_complete_frame_count',
+                'get_stb_pe_complete_frame_count',
+                'set_stb_fr_threshold_use', 'get_stb_fr_threshold_use',
+                'set_stb_fr_angle_use', 'get_stb_fr_angle_use',
+                'set_stb_fr_complete_frame_count',
+                'get_stb_fr_complete_frame_count',
+                'set_stb_fr_min_ratio', 'get_stb_fr_min_ratio')
+
+
+class HVCFuture(object):
+    """Result of an asynchronous command."""
+    __slots__ = ['_cond', '_done', '_result', '_exc_info', '_callbacks']
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._done = False
+        self._result = None
+        self._exc_info = None
+        self._callbacks = []
+
+    def done(self):
+        """Returns True if the command has finished."""
+        return self._done
+
+    def result(self, timeout=None):
+        """Waits for the command and returns its return value.
+
+        The exception raised by the command is raised again here.
+        """
+        with self._cond:
+            if not self._done:
+                self._cond.wait(timeout)
+            if not self._done:
+                raise Exception('Timeout waiting for the command.')
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+    def add_done_callback(self, fn):
+        """Calls fn(future) when the command has finished.
+
+        Note:
+            fn is called on the worker thread. Use the thread-safe call of
+            your event loop in fn to get back to the loop.
+            (e.g. loop.call_soon_threadsafe(), reactor.callFromThread())
+            The exception raised by fn is logged and ignored.
+        """
+        with self._cond:
+            if not self._done:
+                self._callbacks.append(fn)
+                return
+        self._call(fn)
+
+    def _call(self, fn):
+        try:
+            fn(self)
+        except Exception:
+            _logger.exception('Exception in the done callback of %r.', self)
+
+    def _set(self, result, exc_info):
+        with self._cond:
+            self._result = result
+            self._exc_info = exc_info
+            self._done = True
+            callbacks = self._callbacks
+            self._callbacks = []
+            self._cond.notify_all()
+        for fn in callbacks:
+            self._call(fn)
+
+
+class AsyncHVCP2Api(object):
+    """Asynchronous API for HVC-P2(B5T-007001) with STB library.
+
+    Provides all methods of HVCP2Api with the same arguments, but each
+    method returns HVCFuture immediately. The commands are executed in order
+    on a worker thread owning the device, i.e. the serial communication,
+    result decoding and STB process never block the caller.
+
+    Note:
+        The tracking result and the image given to execute() are filled on
+        the worker thread. Do not access them until the future is done.
+    """
+    def __init__(self, connector, exec_func, use_stabilizer):
+        self._api = HVCP2Api(connector, exec_func, use_stabilizer)
+        self._commands = Queue.Queue()
+        self._lock = threading.Lock()
+        self._close_future = None
+        self._worker = threading.Thread(target=self._work,\
+                                        name='hvc-p2-async-api')
+        self._worker.daemon = True
+        self._worker.start()
+
+    @property
+    def use_stb(self):
+        return self._api.use_stb
+
+    def close(self):
+        """Stops the worker thread after the commands already requested.
+
+        The commands requested after close() fail immediately.
+
+        Returns:
+            HVCFuture: done when the worker thread has stopped.
+        """
+        with self._lock:
+            if self._close_future is None:
+                self._close_future = HVCFuture()
+                self._commands.put((None, None, self._close_future))
+            return self._close_future
+
+    def _submit(self, func, args):
+        future = HVCFuture()
+        with self._lock:
+            if self._close_future is None:
+                self._commands.put((func, args, future))
+                return future
+        try:
+            raise Exception('AsyncHVCP2Api has been closed.')
+        except Exception:
+            future._set(None, sys.exc_info())
+        return future
+
+    def _work(self):
+        while True:
+            (func, args, future) = self._commands.get()
+            if func is None: # close()
+                future._set(None, None)
+                return
+            try:
+                result = func(*args)
+            except Exception:
+                future._set(None, sys.exc_info())
+            else:
+                future._set(result, None)
+
+def _make_async_method(name):
+    api_method = getattr(HVCP2Api, name)
+    def method(self, *args):
+        return self._submit(getattr(self._api, name), args)
+    method.__name__ = name
+    method.__doc__ = api_method.__doc__
+    return method
+
+for _name in _API_METHODS:
+    setattr(AsyncHVCP2Api, _name, _make_async_method(_name))
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,281 @@
+﻿# ---------------------------------------------------------------------------
+# Copyright 2017-2018  OMRON Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ---------------------------------------------------------------------------
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+import time
+from collections import deque
+from struct import *
+import p2def
+from hvc_p2_api import HVCP2Api
+from hvc_p2_wrapper import HVCP2Wrapper, LinkError, HVC_CMD_HDR_GETVERSION,\
+                           HVC_CMD_HDR_SET_UART_BAUDRATE
+
+# Link quality policy defaults.
+DEFAULT_WINDOW_SIZE = 50         # number of recent commands evaluated
+DEFAULT_MIN_SAMPLES = 10         # commands needed before evaluating the rate
+DEFAULT_MAX_ERROR_RATE = 0.05    # error rate to step down the baudrate
+DEFAULT_RETRY_COUNT = 2          # retries of a command failed by link error
+DEFAULT_PROBE_COUNT = 5          # commands to probe a baudrate
+DEFAULT_RECOVER_INTERVAL = 300   # sec. on a lower baudrate before stepping up
+MAX_RECOVER_INTERVAL = 3600      # sec.
+
+
+class AutoBaudWrapper(HVCP2Wrapper):
+    """HVCP2Wrapper negotiating the UART baudrate by the link quality.
+
+    The link errors (invalid sync code and not enough response size) of the
+    recent commands are counted. When the error rate exceeds the limit the
+    baudrate is stepped down, and after a while without errors a higher
+    baudrate is probed again. A command failed by a link error is retried.
+    """
+    __slots__ = ['_com_port', '_timeout', '_max_baudrate', '_results',\
+                 '_last_change', '_recover_interval', 'link_errors',\
+                 'window_size', 'min_samples', 'max_error_rate', 'retry_count',\
+                 'probe_count', 'recover_interval']
+    def __init__(self, connector):
+        HVCP2Wrapper.__init__(self, connector)
+        self._com_port = None
+        self._timeout = None
+        self._max_baudrate = None
+        self._results = deque()
+        self._last_change = 0
+        self.link_errors = 0
+
+        self.window_size = DEFAULT_WINDOW_SIZE
+        self.min_samples = DEFAULT_MIN_SAMPLES
+        self.max_error_rate = DEFAULT_MAX_ERROR_RATE
+        self.retry_count = DEFAULT_RETRY_COUNT
+        self.probe_count = DEFAULT_PROBE_COUNT
+        self.recover_interval = DEFAULT_RECOVER_INTERVAL
+        self._recover_interval = DEFAULT_RECOVER_INTERVAL
+
+    @property
+    def baudrate(self):
+        return self._baudrate
+
+    def connect(self, com_port, baudrate, timeout):
+        """Finds the current baudrate of the device and negotiates the
+        highest baudrate up to the specified one."""
+        if baudrate not in p2def.AVAILABLE_BAUD:
+            raise ValueError("Invalid baudrate:{0!r}".format(baudrate))
+        self._com_port = com_port
+        self._timeout = timeout
+        self._max_baudrate = baudrate
+        self._recover_interval = self.recover_interval
+        self._config = {}
+        self._find_device_baudrate()
+        self._negotiate(baudrate)
+        return True
+
+    def disconnect(self):
+        """Returns the device to 9600 baud and disconnects."""
+        try:
+            if self._baudrate != p2def.DEFAULT_BAUD:
+                self._switch_baudrate(p2def.DEFAULT_BAUD)
+        finally:
+            HVCP2Wrapper.disconnect(self)
+            self._baudrate = None
+
+    def set_uart_baudrate(self, baudrate):
+        """Changes the maximum baudrate and negotiates it again.
+        (The connection is kept, i.e. no reconnection is needed.)"""
+        if baudrate not in p2def.AVAILABLE_BAUD:
+            raise ValueError("Invalid baudrate:{0!r}".format(baudrate))
+        self._max_baudrate = baudrate
+        self._recover_interval = self.recover_interval
+        self._negotiate(baudrate)
+        return 0x00
+
+    def _send_command(self, data):
+        for i in range(self.retry_count + 1):
+            try:
+                response = HVCP2Wrapper._send_command(self, data)
+            except LinkError:
+                self.link_errors += 1
+                self._add_result(False)
+                if self._is_link_bad():
+                    self._step_down()
+                error = sys.exc_info()
+                continue
+            self._add_result(True)
+            if self._can_step_up():
+                self._step_up()
+            return response
+        raise error[0], error[1], error[2]
+
+    def _add_result(self, ok):
+        self._results.append(ok)
+        if len(self._results) > self.window_size:
+            self._results.popleft()
+
+    def _is_link_bad(self):
+        count = len(self._results)
+        errors = count - sum(self._results)
+        # A single error is not evaluated as the error rate.
+        return count >= self.min_samples\
+               and errors > max(1, count * self.max_error_rate)
+
+    def _can_step_up(self):
+        return self._baudrate < self._max_baudrate\
+               and len(self._results) >= self.window_size\
+               and all(self._results)\
+               and time.time() - self._last_change >= self._recover_interval
+
+    def _step_down(self):
+        lower = [b for b in p2def.AVAILABLE_BAUD if b < self._baudrate]
+        if lower:
+            self._negotiate(lower[-1])
+
+    def _step_up(self):
+        current = self._baudrate
+        higher = [b for b in p2def.AVAILABLE_BAUD if current < b <= self._max_baudrate]
+        if self._switch_baudrate(higher[0]) and self._probe():
+            self._recover_interval = self.recover_interval
+        else:
+            # Back to the current baudrate and waits longer for the next try.
+            self._negotiate(current)
+            self._recover_interval = min(self._recover_interval * 2,\
+                                         MAX_RECOVER_INTERVAL)
+
+    def _negotiate(self, max_baudrate):
+        """Switches to the highest baudrate passing the probe."""
+        candidates = [b for b in p2def.AVAILABLE_BAUD if b <= max_baudrate]
+        for baudrate in reversed(candidates):
+            if self._switch_baudrate(baudrate) and self._probe():
+                return
+        raise LinkError("No baudrate is available.")
+
+    def _reconnect(self, baudrate):
+        self._connector.disconnect()
+        self._connector.connect(self._com_port, baudrate, self._timeout)
+        self._baudrate = baudrate
+        self._config = {}
+        self._results.clear()
+        self._last_change = time.time()
+
+    def _switch_baudrate(self, baudrate):
+        """Changes the baudrate of the device and the connection.
+
+        Returns:
+            bool: False if the device did not respond
+        """
+        if baudrate == self._baudrate:
+            return True
+        cmd = HVC_CMD_HDR_SET_UART_BAUDRATE\
+            + pack('<B', p2def.AVAILABLE_BAUD.index(baudrate))
+        for i in range(self.retry_count + 1):
+            try:
+                (response_code, data_len, data) = HVCP2Wrapper._send_command(self, cmd)
+            except LinkError:
+                continue
+            if response_code != 0x00:
+                return False
+            self._reconnect(baudrate)
+            return True
+
+        # The command may have been done without the response.
+        self._find_device_baudrate()
+        return self._baudrate == baudrate
+
+    def _probe(self):
+        """Returns True if all probe commands are done without link error."""
+        for i in range(self.probe_count):
+            try:
+                HVCP2Wrapper._send_command(self, HVC_CMD_HDR_GETVERSION)
+            except LinkError:
+                return False
+        return True
+
+    def _find_device_baudrate(self):
+        """Connects in the baudrate which the device responds in."""
+        # Tries 9600 baud first, the baudrate after power on.
+        baudrates = (p2def.DEFAULT_BAUD,)\
+                  + tuple(b for b in p2def.AVAILABLE_BAUD if b != p2def.DEFAULT_BAUD)
+        for baudrate in baudrates:
+            if self._baudrate is None:
+                self._connector.connect(self._com_port, baudrate, self._timeout)
+                self._baudrate = baudrate
+            else:
+                self._reconnect(baudrate)
+            try:
+                HVCP2Wrapper._send_command(self, HVC_CMD_HDR_GETVERSION)
+                return
+            except LinkError:
+                pass
+        raise LinkError("Device is not responding in any baudrate.")
+
+
+class AutoBaudHVCP2Api(HVCP2Api):
+    """HVCP2Api negotiating the UART baudrate automatically.
+
+    connect() finds the baudrate which the device responds in, and switches
+    to the highest baudrate up to the specified one that the link sustains.
+    While running, the baudrate is stepped down when the link error rate
+    rises, and stepped up again after recover_interval without errors.
+    disconnect() returns the device to 9600 baud.
+
+    Usage:
+        hvc_p2_api = AutoBaudHVCP2Api(SerialConnector(), exec_func, use_stb)
+        hvc_p2_api.connect(port, 921600, timeout)  # no set_uart_baudrate()
+        ...
+        hvc_p2_api.disconnect()
+    """
+    __slots__ = []
+
+    wrapper_class = AutoBaudWrapper
+
+    @property
+    def baudrate(self):
+        """Current baudrate."""
+        return self._hvc_p2_wrapper.baudrate
+
+    @property
+    def link_errors(self):
+        """Number of link errors (invalid sync code, not enough size)."""
+        return self._hvc_p2_wrapper.link_errors
+
+    def set_link_policy(self, window_size=DEFAULT_WINDOW_SIZE,\
+                        min_samples=DEFAULT_MIN_SAMPLES,\
+                        max_error_rate=DEFAULT_MAX_ERROR_RATE,\
+                        retry_count=DEFAULT_RETRY_COUNT,\
+                        probe_count=DEFAULT_PROBE_COUNT,\
+                        recover_interval=DEFAULT_RECOVER_INTERVAL):
+        """Sets the policy of the baudrate negotiation.
+
+        Args:
+            window_size (int): number of recent commands evaluated
+            min_samples (int): commands needed before evaluating error rate
+            max_error_rate (float): link error rate to step down
+            retry_count (int): retries of a command failed by link error
+            probe_count (int): commands to probe a baudrate
+            recover_interval (float): time(sec) on a lower baudrate before
+                                      stepping up again
+
+        Returns:
+            void
+        """
+        wrapper = self._hvc_p2_wrapper
+        wrapper.window_size = window_size
+        wrapper.min_samples = min_samples
+        wrapper.max_error_rate = max_error_rate
+        wrapper.retry_count = retry_count
+        wrapper.probe_count = probe_count
+        wrapper.recover_interval = recover_interval
+
+if __name__ == '__main__':
+    pass
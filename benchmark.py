@@ -0,0 +1,342 @@
+﻿# ---------------------------------------------------------------------------
+# Copyright 2017-2018  OMRON Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ---------------------------------------------------------------------------
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import shutil
+import tempfile
+import timeit
+from struct import *
+from PIL import Image
+import p2def
+from p2def import *
+from grayscale_image import GrayscaleImage
+from ctypes import string_at, addressof, sizeof, byref, cdll, c_uint
+from hvc_result import HVCResult
+from hvc_result_c import *
+from hvc_tracking_result_c import *
+from hvc_p2_api import WINDOWS_STB_LIB_NAME, LINUX_STB_LIB_NAME
+from stb import STB, STB_EX_FUNC_ALL, STB_RET_NORMAL
+from okao_result import *
+from hvc_p2_emulator import make_frame_data
+
+###############################################################################
+#  Benchmark Config. Please edit here if you need.                            #
+###############################################################################
+# Number of calls measured for each case.
+number = 20
+
+# Output image sizes (width, height)
+img_sizes = ((p2def.OUT_IMG_TYPE_QQVGA, 'QQVGA', 160, 120),
+             (p2def.OUT_IMG_TYPE_QVGA,  'QVGA',  320, 240))
+
+# Detection counts of the synthetic frames (body, hand, face)
+frame_counts = (35, 35, 35)
+
+# Facial estimation flags combined in the decode benchmark
+face_flags = (EX_DIRECTION, EX_AGE, EX_GENDER, EX_GAZE, EX_BLINK,\
+              EX_EXPRESSION, EX_RECOGNITION)
+###############################################################################
+
+
+def _measure(func, count):
+    """Returns the average elapsed time of func() in msec."""
+    start = timeit.default_timer()
+    for i in range(count):
+        func()
+    return (timeit.default_timer() - start) * 1000 / count
+
+def _make_image(width, height):
+    img = GrayscaleImage()
+    img.width = width
+    img.height = height
+    img.data = b''.join(chr(i & 0xFF) for i in range(width * height))
+    return img
+
+def _save_per_pixel(img, fname):
+    """Previous GrayscaleImage.save() implementation (kept for comparison)."""
+    w = img.width
+    h = img.height
+    pil_img = Image.new("L", (w, h), 0)
+    for y in range(h):
+        for x in range(w):
+            pil_img.putpixel((x, y), ord(img.data[w * y + x]))
+    pil_img.save(fname)
+    return True
+
+def _read_from_buffer_per_field(res, exec_func, data_len, data):
+    """Previous HVCResult.read_from_buffer() implementation (kept for comparison)."""
+    cur = 0
+    body_count, = unpack_from('B',data, cur)
+    hand_count, = unpack_from('B',data, cur+1)
+    face_count, = unpack_from('B',data, cur+2)
+    cur+=4  # for reserved
+
+    for i in range(body_count):
+        x, y, size, conf = unpack_from('<HHHH', data, cur)
+        res.bodies.append(DetectionResult(x,y,size,conf))
+        cur += 8
+
+    for i in range(hand_count):
+        x, y, size, conf = unpack_from('<HHHH', data, cur)
+        res.hands.append(DetectionResult(x,y,size,conf))
+        cur += 8
+
+    for i in range(face_count):
+        x, y, size, conf = unpack_from('<HHHH', data, cur)
+        f = FaceResult(x,y,size,conf)
+        cur +=8
+        if exec_func & EX_DIRECTION:
+            LR, UD, roll, conf = unpack_from('<hhhH', data, cur)
+            f.direction = DirectionResult(LR, UD, roll, conf)
+            cur += 8
+        if exec_func & EX_AGE:
+            age, conf = unpack_from('<bh', data, cur)
+            f.age = AgeResult(age,conf)
+            cur += 3
+        if exec_func & EX_GENDER:
+            gen, conf = unpack_from('<bh', data, cur)
+            f.gender = GenderResult(gen,conf)
+            cur += 3
+        if exec_func & EX_GAZE:
+            LR, UD = unpack_from('<bb', data, cur)
+            f.gaze = GazeResult(LR,UD)
+            cur += 2
+        if exec_func & EX_BLINK:
+            L, R = unpack_from('<hh', data, cur)
+            f.blink = BlinkResult(L, R)
+            cur += 4
+        if exec_func & EX_EXPRESSION:
+            neu, hap, sur, ang, sad, neg = unpack_from('<bbbbbb', data, cur)
+            f.expression = ExpressionResult(neu, hap, sur, ang, sad, neg)
+            cur += 6
+        if exec_func & EX_RECOGNITION:
+            uid, score = unpack_from('<hh', data, cur)
+            f.recognition = RecognitionResult(uid, score)
+            cur += 4
+        res.faces.append(f)
+    return cur
+
+def _face_flag_combinations():
+    """Returns exec_func of every combination of facial estimation flags."""
+    combinations = []
+    for bits in range(1 << len(face_flags)):
+        exec_func = EX_BODY | EX_HAND | EX_FACE
+        for i in range(len(face_flags)):
+            if bits & (1 << i):
+                exec_func |= face_flags[i]
+        combinations.append(exec_func)
+    return combinations
+
+def bench_decode():
+    (body_count, hand_count, face_count) = frame_counts
+    print "==== HVCResult.read_from_buffer() ===="
+    print "Bodies:{0} Hands:{1} Faces:{2}".format(body_count, hand_count, face_count)
+    total_old = 0.0
+    total_new = 0.0
+    for exec_func in _face_flag_combinations():
+        data = make_frame_data(exec_func, body_count, hand_count, face_count)
+
+        # Both decoders must give the same result.
+        old_res = HVCResult()
+        new_res = HVCResult()
+        rc_old = _read_from_buffer_per_field(old_res, exec_func, len(data), data)
+        rc_new = new_res.read_from_buffer(exec_func, len(data), data)
+        if rc_old != rc_new or str(old_res) != str(new_res):
+            raise ValueError("Decode mismatch. exec_func:0x{0:03X}".format(exec_func))
+
+        old = _measure(lambda: _read_from_buffer_per_field(HVCResult(),\
+                                               exec_func, len(data), data), number)
+        new = _measure(lambda: HVCResult().read_from_buffer(exec_func,\
+                                                      len(data), data), number)
+        total_old += old
+        total_new += new
+        print "exec_func:0x{0:03X} per-field:{1:8.3f}[msec]  compiled:{2:8.3f}[msec]  x{3:.2f}"\
+              .format(exec_func, old, new, old / new)
+    print "Total      per-field:{0:8.3f}[msec]  compiled:{1:8.3f}[msec]  x{2:.2f}"\
+          .format(total_old, total_new, total_old / total_new)
+
+def _export_per_field(res, frame_result):
+    """Previous HVCResult.export_to_C_FRAME_RESULT() implementation
+    (kept for comparison).
+
+    Note:
+        The expression is written to anScore/nDegree as the current one does.
+        (The previous one set Python attributes not existing in the C struct.)
+        Age, gender and recognition not executed are written as not possible
+        as the current one does.
+    """
+    frame_result.bodys.nCount = len(res.bodies)
+    for i in range(len(res.bodies)):
+        src_body = res.bodies[i]
+        dst_body = frame_result.bodys.body[i]
+        dst_body.center.nX = src_body.pos_x
+        dst_body.center.nY = src_body.pos_y
+        dst_body.nSize = src_body.size
+        dst_body.nConfidence = src_body.conf
+
+    frame_result.faces.nCount = len(res.faces)
+    for i in range(len(res.faces)):
+        src_face = res.faces[i]
+        dst_face = frame_result.faces.face[i]
+        dst_face.center.nX = src_face.pos_x
+        dst_face.center.nY = src_face.pos_y
+        dst_face.nSize = src_face.size
+        dst_face.nConfidence = src_face.conf
+        if src_face.direction is not None:
+            dst_face.direction.nLR = src_face.direction.LR
+            dst_face.direction.nUD = src_face.direction.UD
+            dst_face.direction.nRoll = src_face.direction.roll
+            dst_face.direction.nConfidence = src_face.direction.conf
+        if src_face.age is not None:
+            dst_face.age.nAge = src_face.age.age
+            dst_face.age.nConfidence = src_face.age.conf
+        else:
+            dst_face.age.nAge = EST_NOT_POSSIBLE
+            dst_face.age.nConfidence = 0
+        if src_face.gender is not None:
+            dst_face.gender.nGender = src_face.gender.gender
+            dst_face.gender.nConfidence = src_face.gender.conf
+        else:
+            dst_face.gender.nGender = EST_NOT_POSSIBLE
+            dst_face.gender.nConfidence = 0
+        if src_face.gaze is not None:
+            dst_face.gaze.nLR = src_face.gaze.gazeLR
+            dst_face.gaze.nUD = src_face.gaze.gazeUD
+        if src_face.blink is not None:
+            dst_face.blink.nLeftEye = src_face.blink.ratioL
+            dst_face.blink.nRightEye = src_face.blink.ratioR
+        if src_face.expression is not None:
+            dst_face.expression.anScore[0] = src_face.expression.neutral
+            dst_face.expression.anScore[1] = src_face.expression.happiness
+            dst_face.expression.anScore[2] = src_face.expression.surprise
+            dst_face.expression.anScore[3] = src_face.expression.anger
+            dst_face.expression.anScore[4] = src_face.expression.sadness
+            dst_face.expression.nDegree = src_face.expression.neg_pos
+        if src_face.recognition is not None:
+            dst_face.recognition.nUID = src_face.recognition.uid
+            dst_face.recognition.nScore = src_face.recognition.score
+        else:
+            dst_face.recognition.nUID = RECOG_NOT_POSSIBLE
+            dst_face.recognition.nScore = 0
+
+def bench_export():
+    (body_count, hand_count, face_count) = frame_counts
+    print "==== HVCResult.export_to_C_FRAME_RESULT() ===="
+    print "Bodies:{0} Faces:{1}".format(body_count, face_count)
+    reused = C_FRAME_RESULT()
+    for exec_func in (EX_BODY | EX_FACE, EX_ALL):
+        data = make_frame_data(exec_func, body_count, hand_count, face_count)
+        res = HVCResult()
+        res.read_from_buffer(exec_func, len(data), data)
+
+        # Both exports must give the same C structure.
+        expected = C_FRAME_RESULT()
+        _export_per_field(res, expected)
+        res.export_to_C_FRAME_RESULT(reused)
+        if string_at(addressof(expected), sizeof(expected))\
+           != string_at(addressof(reused), sizeof(reused)):
+            raise ValueError("Export mismatch. exec_func:0x{0:03X}".format(exec_func))
+
+        old = _measure(lambda: _export_per_field(res, C_FRAME_RESULT()), number)
+        new = _measure(lambda: res.export_to_C_FRAME_RESULT(reused), number)
+        print "exec_func:0x{0:03X} per-field:{1:8.3f}[msec]  bulk:{2:8.3f}[msec]  x{3:.1f}"\
+              .format(exec_func, old, new, old / new)
+
+def _stb_lib_name():
+    if sys.platform == 'win32':
+        return WINDOWS_STB_LIB_NAME
+    return LINUX_STB_LIB_NAME
+
+def _execute_untyped(stb_dll, hSTB, frame_res, faces_res, bodies_res):
+    """Previous STB.execute() implementation without function prototypes
+    (kept for comparison)."""
+    _face_count = c_uint(0)
+    _body_count = c_uint(0)
+
+    ret = stb_dll.STB_SetFrameResult(hSTB, byref(frame_res))
+    if ret != STB_RET_NORMAL:
+        return (ret, 0, 0)
+    ret = stb_dll.STB_Execute(hSTB)
+    if ret != STB_RET_NORMAL:
+        return (ret, 0, 0)
+    ret = stb_dll.STB_GetFaces(hSTB, byref(_face_count), byref(faces_res))
+    if ret != STB_RET_NORMAL:
+        return (ret, 0, 0)
+    ret = stb_dll.STB_GetBodies(hSTB, byref(_body_count), byref(bodies_res))
+    if ret != STB_RET_NORMAL:
+        return (ret, 0, 0)
+    return (STB_RET_NORMAL, _face_count.value, _body_count.value)
+
+def bench_stb():
+    (body_count, hand_count, face_count) = frame_counts
+    print "==== STB.execute() ===="
+    try:
+        stb = STB(_stb_lib_name(), STB_EX_FUNC_ALL)
+    except OSError:
+        print "STB library is not available on this platform."
+        return
+    # Another instance of the library object has no function prototypes.
+    untyped_dll = cdll.LoadLibrary(_stb_lib_name())
+
+    data = make_frame_data(EX_ALL, body_count, hand_count, face_count)
+    res = HVCResult()
+    res.read_from_buffer(EX_ALL, len(data), data)
+    frame_res = C_FRAME_RESULT()
+    res.export_to_C_FRAME_RESULT(frame_res)
+    faces_res = C_FACE_RES35()
+    bodies_res = C_BODY_RES35()
+
+    old = _measure(lambda: _execute_untyped(untyped_dll, stb.hSTB,\
+                              frame_res, faces_res, bodies_res), number)
+    new = _measure(lambda: stb.execute(frame_res, faces_res, bodies_res), number)
+    print "Bodies:{0} Faces:{1} untyped:{2:8.3f}[msec]  prototyped:{3:8.3f}[msec]  x{4:.2f}"\
+          .format(body_count, face_count, old, new, old / new)
+
+def bench_image():
+    tmp_dir = tempfile.mkdtemp()
+    fname = os.path.join(tmp_dir, 'img.jpg')
+    try:
+        print "==== GrayscaleImage.save() ===="
+        for (img_type, name, width, height) in img_sizes:
+            img = _make_image(width, height)
+            old = _measure(lambda: _save_per_pixel(img, fname), number)
+            new = _measure(lambda: img.save(fname), number)
+            print "{0:<6} per-pixel:{1:9.3f}[msec]  bulk:{2:9.3f}[msec]  x{3:.1f}"\
+                  .format(name, old, new, old / new)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+benchmarks = {'image': bench_image,
+              'decode': bench_decode,
+              'export': bench_export,
+              'stb': bench_stb}
+
+def main():
+    names = sys.argv[1:]
+    if len(names) == 0:
+        names = sorted(benchmarks.keys())
+
+    for name in names:
+        if name not in benchmarks:
+            print "Error: Unknown benchmark '{0}'.".format(name)
+            sys.exit()
+        benchmarks[name]()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,431 @@
+﻿# ---------------------------------------------------------------------------
+# Copyright 2017-2018  OMRON Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ---------------------------------------------------------------------------
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import argparse
+import timeit
+from struct import *
+import p2def
+from p2def import *
+from connector import Connector
+from grayscale_image import GrayscaleImage
+from hvc_result import HVCResult
+from hvc_result_c import C_FRAME_RESULT
+from hvc_tracking_result_c import C_FACE, C_BODY
+from hvc_tracking_result import HVCTrackingResult, HVCTrackingResultView
+from hvc_p2_api import HVCP2Api, WINDOWS_STB_LIB_NAME, LINUX_STB_LIB_NAME
+from hvc_p2_wrapper import SYNC_CODE
+from hvc_p2_emulator import make_frame_data, IMAGE_SIZES, make_image_data
+from result_serializer import JSONLinesWriter, BinaryResultEncoder, to_json
+from stb import STB, STB_EX_FUNC_ALL
+from py_stb import PySTB
+
+###############################################################################
+#  Benchmark Config. Please edit here if you need.                            #
+###############################################################################
+# Number of calls in one measurement, and number of measurements per case.
+number = 20
+repeat = 5
+
+# Functions flags of the matrix.
+exec_funcs = (('face',       EX_FACE),
+              ('detection',  EX_BODY | EX_HAND | EX_FACE),
+              ('estimation', EX_FACE | EX_DIRECTION | EX_AGE | EX_GENDER\
+                             | EX_EXPRESSION),
+              ('all',        EX_ALL))
+
+# Number of faces of the matrix. (Bodies and hands are the same number.)
+face_counts = (0, 1, 10, 35)
+
+# Output image types of the matrix.
+img_types = (('none',  OUT_IMG_TYPE_NONE),
+             ('qqvga', OUT_IMG_TYPE_QQVGA),
+             ('qvga',  OUT_IMG_TYPE_QVGA))
+
+# Seed of the synthetic frames.
+seed = 0
+
+# Relative slowdown reported as a regression when comparing to a baseline.
+default_tolerance = 0.2
+###############################################################################
+
+
+class FakeConnector(Connector):
+    """Connector returning the same response to any command."""
+    def __init__(self, response_code=RESPONSE_CODE_NORMAL, data=b''):
+        self.set_response(response_code, data)
+        self._offset = 0
+
+    def set_response(self, response_code, data):
+        self._response = pack('<BBI', SYNC_CODE, response_code, len(data)) + data
+        self._offset = len(self._response)
+
+    def connect(self, com_port, baudrate, timeout):
+        return True
+
+    def disconnect(self):
+        pass
+
+    def clear_recieve_buffer(self):
+        pass
+
+    def send_data(self, data):
+        self._offset = 0
+        return True
+
+    def receive_data(self, read_byte_size):
+        buf = self._response[self._offset:self._offset + read_byte_size]
+        self._offset += len(buf)
+        return buf
+
+
+class _NullFile(object):
+    """File discarding the written data."""
+    def write(self, data):
+        pass
+
+
+def _normalize(exec_func):
+    """Adds face flags like HVCP2Api does."""
+    if exec_func & (EX_DIRECTION | EX_AGE | EX_GENDER | EX_GAZE | EX_BLINK\
+                    | EX_EXPRESSION | EX_RECOGNITION):
+        exec_func |= EX_FACE | EX_DIRECTION
+    return exec_func
+
+def _frame_data(exec_func, face_count):
+    """Synthetic Execute response data of the fixed fixture."""
+    exec_func = _normalize(exec_func)
+    return make_frame_data(exec_func,\
+                           face_count if exec_func & EX_BODY else 0,\
+                           face_count if exec_func & EX_HAND else 0,\
+                           face_count if exec_func & EX_FACE else 0, seed)
+
+def _image_data(img_type):
+    if img_type == OUT_IMG_TYPE_NONE:
+        return b''
+    (width, height) = IMAGE_SIZES[img_type]
+    return pack('<HH', width, height) + make_image_data(width, height)
+
+def _stb_lib_name():
+    if sys.platform == 'win32':
+        return WINDOWS_STB_LIB_NAME
+    return LINUX_STB_LIB_NAME
+
+def _stb_available():
+    try:
+        STB(_stb_lib_name(), STB_EX_FUNC_ALL)
+    except OSError:
+        return False
+    return True
+
+def _measure(func):
+    """Returns (min, median, mean) elapsed time of func() in usec."""
+    times = []
+    for i in range(repeat):
+        start = timeit.default_timer()
+        for j in range(number):
+            func()
+        times.append((timeit.default_timer() - start) * 1e6 / number)
+    times.sort()
+    return (times[0], times[len(times) // 2], sum(times) / len(times))
+
+
+def case_decode():
+    """HVCResult.read_from_buffer()"""
+    for (func_name, exec_func) in exec_funcs:
+        exec_func = _normalize(exec_func)
+        for face_count in face_counts:
+            data = _frame_data(exec_func, face_count)
+            yield ({'exec_func':func_name, 'faces':face_count},\
+                   lambda: HVCResult().read_from_buffer(exec_func, len(data), data))
+
+def case_export():
+    """HVCResult.export_to_C_FRAME_RESULT()"""
+    frame_result = C_FRAME_RESULT()
+    for (func_name, exec_func) in exec_funcs:
+        exec_func = _normalize(exec_func)
+        for face_count in face_counts:
+            data = _frame_data(exec_func, face_count)
+            res = HVCResult()
+            res.read_from_buffer(exec_func, len(data), data)
+            yield ({'exec_func':func_name, 'faces':face_count},\
+                   lambda: res.export_to_C_FRAME_RESULT(frame_result))
+
+def _stb_cases(stb_class):
+    for (func_name, exec_func) in exec_funcs:
+        exec_func = _normalize(exec_func)
+        if exec_func == EX_HAND: # STB is not used.
+            continue
+        stb = stb_class(_stb_lib_name(), exec_func)
+        frame_result = C_FRAME_RESULT()
+        faces_res = (C_FACE * stb.get_max_output_count())()
+        bodies_res = (C_BODY * stb.get_max_output_count())()
+        for face_count in face_counts:
+            data = _frame_data(exec_func, face_count)
+            res = HVCResult()
+            res.read_from_buffer(exec_func, len(data), data)
+            res.export_to_C_FRAME_RESULT(frame_result)
+            yield ({'exec_func':func_name, 'faces':face_count},\
+                   lambda: stb.execute(frame_result, faces_res, bodies_res))
+
+def case_stb():
+    """STB.execute() round trip through the STB library"""
+    return _stb_cases(STB)
+
+def case_py_stb():
+    """PySTB.execute() (tracking and stabilization in Python/NumPy)"""
+    return _stb_cases(PySTB)
+
+def case_tracking_result():
+    """HVCTrackingResult construction from HVCResult (without STB)"""
+    for (func_name, exec_func) in exec_funcs:
+        exec_func = _normalize(exec_func)
+        for face_count in face_counts:
+            data = _frame_data(exec_func, face_count)
+            res = HVCResult()
+            res.read_from_buffer(exec_func, len(data), data)
+            yield ({'exec_func':func_name, 'faces':face_count},\
+                   lambda: HVCTrackingResult().appned_FRAME_RESULT(res))
+
+def case_tracking_decode():
+    """HVCTrackingResult.read_from_buffer() (without STB)"""
+    for (func_name, exec_func) in exec_funcs:
+        exec_func = _normalize(exec_func)
+        for face_count in face_counts:
+            data = _frame_data(exec_func, face_count)
+            yield ({'exec_func':func_name, 'faces':face_count},\
+                   lambda: HVCTrackingResult().read_from_buffer(exec_func,\
+                                                          len(data), data))
+
+def _format_cases(make_func):
+    for (func_name, exec_func) in exec_funcs:
+        exec_func = _normalize(exec_func)
+        for face_count in face_counts:
+            data = _frame_data(exec_func, face_count)
+            res = HVCTrackingResult()
+            res.read_from_buffer(exec_func, len(data), data)
+            yield ({'exec_func':func_name, 'faces':face_count}, make_func(res))
+
+def case_format_str():
+    """HVCTrackingResult.__str__()"""
+    return _format_cases(lambda res: res.__str__)
+
+def case_format_json():
+    """JSONLinesWriter.write() of HVCTrackingResult"""
+    writer = JSONLinesWriter(_NullFile())
+    return _format_cases(lambda res: lambda: writer.write(res))
+
+def case_format_binary():
+    """BinaryResultEncoder.encode() of HVCTrackingResult"""
+    encoder = BinaryResultEncoder()
+    return _format_cases(lambda res: lambda: encoder.encode(res))
+
+def _view_cases(make_func):
+    """HVCTrackingResultView of PySTB output, checked to serialize the same
+    as HVCTrackingResult of the same output
+    """
+    encoder = BinaryResultEncoder()
+    for (func_name, exec_func) in exec_funcs:
+        exec_func = _normalize(exec_func)
+        if exec_func == EX_HAND: # STB is not used.
+            continue
+        stb = PySTB(None, exec_func)
+        frame_result = C_FRAME_RESULT()
+        faces_res = (C_FACE * stb.get_max_output_count())()
+        bodies_res = (C_BODY * stb.get_max_output_count())()
+        for face_count in face_counts:
+            data = _frame_data(exec_func, face_count)
+            res = HVCResult()
+            res.read_from_buffer(exec_func, len(data), data)
+            res.export_to_C_FRAME_RESULT(frame_result)
+            (stb_ret, faces, bodies) = stb.execute(frame_result, faces_res,\
+                                                   bodies_res)
+            view = HVCTrackingResultView()
+            view.set_STB_RESULT(exec_func, faces, faces_res, bodies,\
+                                bodies_res, res)
+            expected = HVCTrackingResult()
+            expected.append_STB_RESULT(exec_func, faces, faces_res, bodies,\
+                                       bodies_res, res)
+            if to_json(view) != to_json(expected) or\
+               str(encoder.encode(view)) != str(encoder.encode(expected)):
+                raise ValueError("View serialization mismatch. "\
+                                 "exec_func:0x{0:03X}".format(exec_func))
+            yield ({'exec_func':func_name, 'faces':face_count}, make_func(view))
+
+def case_format_json_view():
+    """JSONLinesWriter.write() of HVCTrackingResultView (PySTB output)"""
+    writer = JSONLinesWriter(_NullFile())
+    return _view_cases(lambda res: lambda: writer.write(res))
+
+def case_format_binary_view():
+    """BinaryResultEncoder.encode() of HVCTrackingResultView (PySTB output)"""
+    encoder = BinaryResultEncoder()
+    return _view_cases(lambda res: lambda: encoder.encode(res))
+
+def case_image_save():
+    """GrayscaleImage.save() to JPEG file"""
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        fname = os.path.join(tmp_dir, 'img.jpg')
+        for (img_name, img_type) in img_types:
+            if img_type == OUT_IMG_TYPE_NONE:
+                continue
+            img = GrayscaleImage()
+            (img.width, img.height) = IMAGE_SIZES[img_type]
+            img.data = make_image_data(img.width, img.height)
+            yield ({'image':img_name}, lambda: img.save(fname))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+class _PySTBApi(HVCP2Api):
+    stb_class = PySTB
+
+def _case_api_execute(use_stb, api_class=HVCP2Api):
+    connector = FakeConnector()
+    img = GrayscaleImage()
+    for (func_name, exec_func) in exec_funcs:
+        api = api_class(connector, exec_func, use_stb)
+        api.connect('fake', DEFAULT_BAUD, 1)
+        for face_count in face_counts:
+            for (img_name, img_type) in img_types:
+                connector.set_response(RESPONSE_CODE_NORMAL,\
+                                       _frame_data(exec_func, face_count)\
+                                       + _image_data(img_type))
+                yield ({'exec_func':func_name, 'faces':face_count, 'image':img_name},\
+                       lambda: api.execute(img_type, HVCTrackingResult(), img))
+        api.disconnect()
+
+def case_api_execute():
+    """HVCP2Api.execute() over a fake connector (without STB)"""
+    return _case_api_execute(USE_STB_OFF)
+
+def case_api_execute_stb():
+    """HVCP2Api.execute() over a fake connector (with STB)"""
+    return _case_api_execute(USE_STB_ON)
+
+def case_api_execute_py_stb():
+    """HVCP2Api.execute() over a fake connector (with PySTB)"""
+    return _case_api_execute(USE_STB_ON, _PySTBApi)
+
+# name: (case generator, requires STB library)
+cases = {'decode':             (case_decode, False),
+         'export':             (case_export, False),
+         'stb':                (case_stb, True),
+         'py_stb':             (case_py_stb, False),
+         'tracking_result':    (case_tracking_result, False),
+         'tracking_decode':    (case_tracking_decode, False),
+         'format_str':         (case_format_str, False),
+         'format_json':        (case_format_json, False),
+         'format_binary':      (case_format_binary, False),
+         'format_json_view':   (case_format_json_view, False),
+         'format_binary_view': (case_format_binary_view, False),
+         'image_save':         (case_image_save, False),
+         'api_execute':        (case_api_execute, False),
+         'api_execute_stb':    (case_api_execute_stb, True),
+         'api_execute_py_stb': (case_api_execute_py_stb, False)}
+
+
+def _format_params(params):
+    return ' '.join('{0}={1}'.format(k, v) for (k, v) in sorted(params.items()))
+
+def _result_key(result):
+    return (result['name'], tuple(sorted(result['params'].items())))
+
+def run(names):
+    """Runs the cases and returns the report as a dict."""
+    stb_available = _stb_available()
+    results = []
+    skipped = []
+    for name in names:
+        (case, requires_stb) = cases[name]
+        if requires_stb and not stb_available:
+            skipped.append(name)
+            print "{0:<20} skipped (STB library is not available)".format(name)
+            continue
+        for (params, func) in case():
+            (min_usec, median_usec, mean_usec) = _measure(func)
+            results.append({'name':name, 'params':params,\
+                            'min_usec':round(min_usec, 3),\
+                            'median_usec':round(median_usec, 3),\
+                            'mean_usec':round(mean_usec, 3)})
+            print "{0:<20} {1:<48} {2:12.3f}[usec]".format(name,\
+                                                    _format_params(params), min_usec)
+    return {'timestamp':time.strftime('%Y-%m-%dT%H:%M:%S'),\
+            'python':platform.python_version(),\
+            'platform':platform.platform(),\
+            'number':number, 'repeat':repeat, 'seed':seed,\
+            'skipped':skipped,\
+            'results':results}
+
+def compare(report, baseline, tolerance):
+    """Compares the minimum time of each case with the baseline.
+
+    Returns:
+        list of (result, baseline result, ratio) slower than 1 + tolerance
+    """
+    base_results = dict((_result_key(r), r) for r in baseline['results'])
+    regressions = []
+    for result in report['results']:
+        base = base_results.get(_result_key(result))
+        if base is None or base['min_usec'] <= 0:
+            continue
+        ratio = result['min_usec'] / base['min_usec']
+        if ratio > 1 + tolerance:
+            regressions.append((result, base, ratio))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='HVC-P2 benchmark suite')
+    parser.add_argument('names', nargs='*', metavar='case',\
+                        help='cases to run: ' + ', '.join(sorted(cases)))
+    parser.add_argument('-o', '--output', help='writes the results as JSON')
+    parser.add_argument('-b', '--baseline',\
+                        help='JSON results to detect regressions against')
+    parser.add_argument('-t', '--tolerance', type=float, default=default_tolerance,\
+                        help='allowed slowdown ratio (default: %(default)s)')
+    args = parser.parse_args()
+
+    names = args.names or sorted(cases)
+    for name in names:
+        if name not in cases:
+            parser.error("Unknown case '{0}'.".format(name))
+
+    report = run(names)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        for (result, base, ratio) in regressions:
+            print "Regression: {0} {1} {2:.3f} -> {3:.3f}[usec] x{4:.2f}".format(\
+                  result['name'], _format_params(result['params']), base['min_usec'],\
+                  result['min_usec'], ratio)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+﻿# ---------------------------------------------------------------------------
+# Copyright 2017-2018  OMRON Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ---------------------------------------------------------------------------
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import threading
+from bisect import bisect_left
+
+# Command names by command code. (refer to hvc_p2_wrapper.py)
+COMMAND_NAMES = {0x00:'get_version',
+                 0x01:'set_camera_angle',
+                 0x02:'get_camera_angle',
+                 0x04:'execute',
+                 0x05:'set_threshold',
+                 0x06:'get_threshold',
+                 0x07:'set_detection_size',
+                 0x08:'get_detection_size',
+                 0x09:'set_face_angle',
+                 0x0A:'get_face_angle',
+                 0x0E:'set_uart_baudrate',
+                 0x10:'register_data',
+                 0x11:'delete_data',
+                 0x12:'delete_user',
+                 0x13:'delete_all_data',
+                 0x15:'get_user_data',
+                 0x20:'save_album',
+                 0x21:'load_album',
+                 0x22:'save_album_to_flash',
+                 0x30:'reformat_flash'}
+
+# Upper bounds of the histogram buckets.
+TIME_BUCKETS = (0.0001, 0.0002, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.02,\
+                0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0)  # seconds
+RATIO_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+
+# Bits per byte on UART. (start bit + 8 data bits + stop bit)
+UART_BITS_PER_BYTE = 10
+
+# Monotonic clock if available.
+clock = getattr(time, 'monotonic', time.time)
+
+
+class Histogram(object):
+    """Histogram with fixed buckets.
+
+    counts[i] is the number of values <= bounds[i] and > bounds[i - 1].
+    The last count is for the values over the last bound.
+    """
+    __slots__ = ['bounds', 'counts', 'count', 'sum']
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self):
+        return {'bounds':list(self.bounds), 'counts':list(self.counts),\
+                'count':self.count, 'sum':self.sum}
+
+
+_HISTOGRAM_NAMES = ('write', 'first_byte', 'payload', 'total', 'decode',\
+                    'utilization')
+
+
+class CommandStats(object):
+    """Measurements of one command code.
+
+    Counters:
+        count:       commands sent
+        errors:      responses of error code, and link errors
+        link_errors: commands without valid response (LinkError)
+        bytes_out:   bytes of the commands
+        bytes_in:    bytes of the responses
+
+    Histograms:
+        write:       time to write the command
+        first_byte:  time from the end of write to the first response byte
+                     (mostly the processing time on the device)
+        payload:     time to receive the rest of the response
+        total:       time from the start of write to the end of response
+        decode:      time to decode the response on the host (Execute only)
+        utilization: wire time of the response at the baudrate / payload time
+    """
+    __slots__ = ['count', 'errors', 'link_errors', 'bytes_out', 'bytes_in',\
+                 'write', 'first_byte', 'payload', 'total', 'decode',\
+                 'utilization']
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.link_errors = 0
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.write = Histogram(TIME_BUCKETS)
+        self.first_byte = Histogram(TIME_BUCKETS)
+        self.payload = Histogram(TIME_BUCKETS)
+        self.total = Histogram(TIME_BUCKETS)
+        self.decode = Histogram(TIME_BUCKETS)
+        self.utilization = Histogram(RATIO_BUCKETS)
+
+    def snapshot(self):
+        s = {'count':self.count, 'errors':self.errors,\
+             'link_errors':self.link_errors,\
+             'bytes_out':self.bytes_out, 'bytes_in':self.bytes_in}
+        for name in _HISTOGRAM_NAMES:
+            s[name] = getattr(self, name).snapshot()
+        return s
+
+
+class CommandMetrics(object):
+    """Latency and throughput metrics of the commands per command code.
+
+    Usage:
+        metrics = CommandMetrics()
+        hvc_p2_api.set_metrics(metrics)
+        ...
+        print metrics.exposition()
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _get_stats(self, code):
+        stats = self._stats.get(code)
+        if stats is None:
+            with self._lock:
+                stats = self._stats.setdefault(code, CommandStats())
+        return stats
+
+    def observe_command(self, code, baudrate, response_code, bytes_out, bytes_in,\
+                        start, written, first_byte, end):
+        """Records one command. (called by HVCP2Wrapper)
+
+        Args:
+            code (int): command code
+            baudrate (int): baudrate of the connection
+            response_code (int): response code
+            bytes_out (int): command size(bytes)
+            bytes_in (int): response size(bytes) including the header
+            start, written, first_byte, end (float): clock() at the start of
+                write, the end of write, the first response byte and the end
+                of response
+        """
+        stats = self._get_stats(code)
+        stats.count += 1
+        if response_code != 0:
+            stats.errors += 1
+        stats.bytes_out += bytes_out
+        stats.bytes_in += bytes_in
+        stats.write.observe(written - start)
+        stats.first_byte.observe(first_byte - written)
+        stats.payload.observe(end - first_byte)
+        stats.total.observe(end - start)
+        if baudrate and end > first_byte:
+            wire_time = (bytes_in - 1) * UART_BITS_PER_BYTE / float(baudrate)
+            stats.utilization.observe(wire_time / (end - first_byte))
+
+    def observe_link_error(self, code, bytes_out):
+        """Records one command failed by LinkError. (called by HVCP2Wrapper)
+
+        The times are not recorded since the response is incomplete.
+
+        Args:
+            code (int): command code
+            bytes_out (int): command size(bytes)
+        """
+        stats = self._get_stats(code)
+        stats.count += 1
+        stats.errors += 1
+        stats.link_errors += 1
+        stats.bytes_out += bytes_out
+
+    def observe_decode(self, code, seconds):
+        """Records the time to decode a response on the host."""
+        self._get_stats(code).decode.observe(seconds)
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+
+    def snapshot(self):
+        """Gets the metrics.
+
+        Returns:
+            dict of command name to dict of the counters and the histograms
+            (refer to CommandStats)
+        """
+        with self._lock:
+            items = list(self._stats.items())
+        return dict((_command_name(code), stats.snapshot())\
+                    for (code, stats) in items)
+
+    def exposition(self, prefix='hvc_p2_command'):
+        """Gets the metrics in the plain-text exposition format of Prometheus."""
+        lines = []
+        snapshot = self.snapshot()
+        for counter in ('count', 'errors', 'link_errors', 'bytes_out', 'bytes_in'):
+            name = '{0}_{1}_total'.format(prefix, counter)
+            lines.append('# TYPE {0} counter'.format(name))
+            for command in sorted(snapshot):
+                lines.append('{0}{{command="{1}"}} {2}'.format(name, command,\
+                                                    snapshot[command][counter]))
+        for hist_name in _HISTOGRAM_NAMES:
+            if hist_name == 'utilization':
+                name = '{0}_{1}_ratio'.format(prefix, hist_name)
+            else:
+                name = '{0}_{1}_seconds'.format(prefix, hist_name)
+            lines.append('# TYPE {0} histogram'.format(name))
+            for command in sorted(snapshot):
+                hist = snapshot[command][hist_name]
+                cumulative = 0
+                for (bound, count) in zip(hist['bounds'] + ['+Inf'], hist['counts']):
+                    cumulative += count
+                    lines.append('{0}_bucket{{command="{1}",le="{2}"}} {3}'\
+                                 .format(name, command, bound, cumulative))
+                lines.append('{0}_sum{{command="{1}"}} {2!r}'.format(name, command, hist['sum']))
+                lines.append('{0}_count{{command="{1}"}} {2}'.format(name, command, hist['count']))
+        return '\n'.join(lines) + '\n'
+
+def _command_name(code):
+    return COMMAND_NAMES.get(code, '0x{0:02X}'.format(code))
+
+if __name__ == '__main__':
+    pass
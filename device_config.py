@@ -0,0 +1,65 @@
+﻿# ---------------------------------------------------------------------------
+# Copyright 2017-2018  OMRON Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ---------------------------------------------------------------------------
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+class DeviceConfig(object):
+    """Configuration of HVC-P2 device.
+
+    None of an item means "not specified", i.e. HVCP2Api.apply_config()
+    leaves the item as it is.
+
+    Attributes:
+        camera_angle (int): camera angle (HVC_CAM_ANGLE_*)
+        threshold (tuple): (body, hand, face, recognition)
+        detection_size (tuple): (min_body, max_body, min_hand, max_hand,
+                                 min_face, max_face)
+        face_angle (tuple): (yaw_angle, roll_angle)
+    """
+    __slots__ = ['camera_angle', 'threshold', 'detection_size', 'face_angle']
+    def __init__(self, camera_angle=None, threshold=None, detection_size=None,\
+                 face_angle=None):
+        self.camera_angle = camera_angle
+        self.threshold = _as_tuple(threshold, 4, 'threshold')
+        self.detection_size = _as_tuple(detection_size, 6, 'detection_size')
+        self.face_angle = _as_tuple(face_angle, 2, 'face_angle')
+
+    def __eq__(self, other):
+        if not isinstance(other, DeviceConfig):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name)\
+                   for name in self.__slots__)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    def __repr__(self):
+        return 'DeviceConfig({0})'.format(', '.join('{0}={1!r}'.format(\
+                                name, getattr(self, name)) for name in self.__slots__))
+
+def _as_tuple(value, size, name):
+    if value is None:
+        return None
+    value = tuple(value)
+    if len(value) != size:
+        raise ValueError("Invalid {0}:{1!r}".format(name, value))
+    return value
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,121 @@
+﻿# ---------------------------------------------------------------------------
+# Copyright 2017-2018  OMRON Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ---------------------------------------------------------------------------
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from p2def import *
+from hvc_tracking_result_c import STB_STATUS_COMPLETE
+
+# Estimation functions stabilized by STB library, and the result of C_FACE.
+STB_ESTIMATIONS = ((EX_AGE, 'age'),
+                   (EX_GENDER, 'gender'),
+                   (EX_RECOGNITION, 'recognition'))
+
+DEFAULT_BASE_FUNC = EX_BODY | EX_HAND | EX_FACE
+DEFAULT_FULL_INTERVAL = 30
+
+_ESTIMATION_FUNC = EX_DIRECTION | EX_AGE | EX_GENDER | EX_GAZE | EX_BLINK\
+                 | EX_EXPRESSION | EX_RECOGNITION
+
+
+class ExecFuncScheduler(object):
+    """Scheduler selecting the functions executed on each frame.
+
+    The execution time on the device depends on the functions. This
+    scheduler executes the estimation functions only when they are needed:
+
+    - base_func (detection) is executed on every frame.
+    - Age, gender and recognition are executed while any face tracked by
+      STB library has not completed the estimation. (NO_DATA or
+      CALCULATING)
+    - All functions are executed every full_interval frames, e.g. for face
+      direction, gaze, blink and expression.
+
+    Without STB library, the estimation functions are executed only every
+    full_interval frames.
+
+    Usage:
+        hvc_p2_api.set_scheduler(ExecFuncScheduler(full_interval=15))
+    """
+    def __init__(self, base_func=DEFAULT_BASE_FUNC,\
+                       full_interval=DEFAULT_FULL_INTERVAL):
+        """Constructor
+
+        Args:
+            base_func (int): functions executed on every frame
+            full_interval (int): interval(frames) to execute all functions
+                                 (0: only the first frame)
+        """
+        self.base_func = base_func
+        self.full_interval = full_interval
+        self.reset()
+
+    def reset(self):
+        """Executes all functions on the next frame."""
+        self._frame = 0
+        self._pending = _ESTIMATION_FUNC
+        self.frame_count = 0
+        self.full_count = 0
+
+    def select(self, exec_func):
+        """Selects the functions of the next frame.
+
+        Args:
+            exec_func (int): all functions to be executed
+
+        Returns:
+            int: functions executed on the next frame
+        """
+        if self._frame == 0:
+            func = exec_func
+            self.full_count += 1
+        else:
+            func = exec_func & (self.base_func | self._pending)
+            if func & _ESTIMATION_FUNC:
+                func |= EX_FACE | EX_DIRECTION
+
+        self.frame_count += 1
+        self._frame += 1
+        if self._frame >= self.full_interval > 0:
+            self._frame = 0
+        self._pending = 0
+        return func
+
+    def invalidate(self):
+        """Executes the estimation functions on the next frame.
+
+        Called when the STB output of the frame is not available, since the
+        estimation status of the faces is unknown.
+        """
+        self._pending = _ESTIMATION_FUNC
+
+    def update(self, face_count, face_res35):
+        """Updates the pending estimations by the STB output.
+
+        Args:
+            face_count (int): number of faces
+            face_res35 (C_FACE_RES35): faces of STB output
+        """
+        pending = 0
+        for i in range(face_count):
+            face = face_res35[i]
+            for (flag, name) in STB_ESTIMATIONS:
+                if getattr(face, name).status < STB_STATUS_COMPLETE:
+                    pending |= flag
+        self._pending = pending
+
+if __name__ == '__main__':
+    pass
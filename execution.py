@@ -24,6 +24,7 @@ from serial_connector import SerialConnector
 from hvc_p2_api import HVCP2Api
 from hvc_tracking_result import HVCTrackingResult
 from grayscale_image import GrayscaleImage
+from image_sink import ImageSink
 
 ###############################################################################
 #  User Config. Please edit here if you need.                                 #
@@ -31,6 +32,11 @@ from grayscale_image import GrayscaleImage
 # Output image file name.
 img_fname = 'img.jpg'
 
+# Output image recording directory.
+# If specified, the images are recorded as Motion JPEG files with the
+# detection rectangles by a background thread instead of img_fname.
+img_record_dir = None
+
 # Read timeout value in seconds for serial communication.
 # If you use UART slow baudrate, please edit here.
 timeout = 30
@@ -240,6 +246,7 @@ def main():
     hvc_p2_api.connect(portinfo, baudrate, timeout)
     _check_connection(hvc_p2_api)
 
+    img_sink = None
     try:
         # Sets HVC-P2 parameters
         _set_hvc_p2_parameters(hvc_p2_api)
@@ -249,6 +256,8 @@ def main():
 
         hvc_tracking_result = HVCTrackingResult()
         img = GrayscaleImage()
+        if img_record_dir is not None and output_img_type != p2def.OUT_IMG_TYPE_NONE:
+            img_sink = ImageSink(img_record_dir, overlay=True)
 
         # Main loop
         while True:
@@ -257,7 +266,9 @@ def main():
                                                       hvc_tracking_result, img)
             elapsed_time = str(float(time.time() - start) * 1000)[0:6]
 
-            if output_img_type != p2def.OUT_IMG_TYPE_NONE:
+            if img_sink is not None:
+                img_sink.put(img, hvc_tracking_result)
+            elif output_img_type != p2def.OUT_IMG_TYPE_NONE:
                 img.save(img_fname)
 
             print ("==== Elapsed time:{0}".format(elapsed_time)) + "[msec] ===="
@@ -268,6 +279,8 @@ def main():
         time.sleep(1)
 
     finally:
+        if img_sink is not None:
+            img_sink.close()
         hvc_p2_api.set_uart_baudrate(p2def.DEFAULT_BAUD)
         hvc_p2_api.disconnect()
 
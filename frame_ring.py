@@ -0,0 +1,345 @@
+﻿# ---------------------------------------------------------------------------
+# Copyright 2017-2018  OMRON Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ---------------------------------------------------------------------------
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import mmap
+import time
+import tempfile
+from struct import *
+from grayscale_image import GrayscaleImage
+from result_serializer import BinaryResultEncoder, get_record_size,\
+                              decode_record
+
+# Ring buffer file format (native byte order, shared by local processes)
+#
+#     Header : magic(8 bytes) 'HVCRING1', slot count(I), slot size(I),
+#              head sequence number(Q), padding to RING_HEADER_SIZE
+#     Slot   : (slot count times)
+#              sequence number(Q), timestamp(d), response code(i),
+#              STB return(i), image width(H), image height(H),
+#              image size(I), result size(I), padding,
+#              image data, result record(result_serializer binary format)
+#
+# The frame of sequence number n (from 1) is written in the slot
+# (n - 1) % slot count. The writer clears the sequence number of the slot
+# before writing the frame, and sets it and the head after that.
+# A reader detects the overrun when the sequence number of the slot is not
+# the expected one.
+
+RING_MAGIC = b'HVCRING1'
+
+RING_HEADER = Struct('=8sII')
+RING_HEADER_SIZE = 64
+_HEAD = Struct('=Q')
+_HEAD_OFFSET = RING_HEADER.size
+
+SLOT_HEADER = Struct('=QdiiHHII')
+SLOT_DATA_OFFSET = 40
+_SEQ = Struct('=Q')
+
+DEFAULT_SLOT_COUNT = 16
+
+# Enough for QVGA image and 35 bodies, hands and faces.
+DEFAULT_SLOT_SIZE = SLOT_DATA_OFFSET + 320 * 240 + get_record_size(35, 35, 35)
+
+# Polling period(sec) of the subscriber waiting for a new frame.
+POLL_INTERVAL = 0.001
+
+# Directory of the ring buffer files. (tmpfs if available)
+if os.path.isdir('/dev/shm'):
+    RING_DIR = '/dev/shm'
+else:
+    RING_DIR = tempfile.gettempdir()
+
+def get_ring_path(name):
+    """Gets the file path of the ring buffer name."""
+    if os.path.dirname(name):
+        return name
+    return os.path.join(RING_DIR, name)
+
+
+class FrameRingPublisher(object):
+    """Publisher of frames to a ring buffer in shared memory.
+
+    Each frame (response code, STB return, tracking result and image) is
+    written into the next slot of a memory mapped file, so any number of
+    local processes can subscribe to the frames of one device.
+    The publisher never waits for the subscribers. A slow subscriber misses
+    the overwritten frames and counts them as overruns.
+
+    Usage:
+        publisher = FrameRingPublisher('hvc_p2')
+        for frame in hvc_p2_api.stream(OUT_IMG_TYPE_QVGA):
+            publisher.publish_frame(frame)
+        publisher.close()
+    """
+    def __init__(self, name, slot_count=DEFAULT_SLOT_COUNT,\
+                             slot_size=DEFAULT_SLOT_SIZE):
+        """Constructor
+
+        The ring buffer is created as a new file and renamed to the path.
+        So the subscribers of the previous ring buffer of the same name keep
+        reading it (no new frame), and never see a half initialized one.
+
+        Args:
+            name (str): name of the ring buffer (file name in RING_DIR),
+                        or path of the file
+            slot_count (int): number of frames kept in the ring buffer
+            slot_size (int): size(bytes) of one slot including the header
+        """
+        if slot_count < 1:
+            raise ValueError("Invalid slot_count:{0!r}".format(slot_count))
+        if slot_size <= SLOT_DATA_OFFSET:
+            raise ValueError("Invalid slot_size:{0!r}".format(slot_size))
+
+        self.path = get_ring_path(name)
+        self.slot_count = slot_count
+        self.slot_size = slot_size
+        self.seq = 0
+        size = RING_HEADER_SIZE + slot_count * slot_size
+        (dir_name, base_name) = os.path.split(os.path.abspath(self.path))
+        (fd, tmp_path) = tempfile.mkstemp(prefix='.' + base_name + '.',\
+                                          dir=dir_name)
+        self._file = os.fdopen(fd, 'w+b')
+        try:
+            self._file.truncate(size)
+            self._map = mmap.mmap(self._file.fileno(), size)
+            RING_HEADER.pack_into(self._map, 0, RING_MAGIC, slot_count,\
+                                  slot_size)
+            _HEAD.pack_into(self._map, _HEAD_OFFSET, 0)
+            os.rename(tmp_path, self.path)
+        except Exception:
+            self._file.close()
+            os.remove(tmp_path)
+            raise
+        self._encoder = BinaryResultEncoder()
+
+    def publish(self, response_code, stb_return, result, image, timestamp=None):
+        """Writes a frame into the next slot.
+
+        Args:
+            response_code (int): response code form B5T-007001
+            stb_return (int): return status of STB library
+            result (HVCTrackingResult or HVCResult): result of the frame
+            image (GrayscaleImage): output image (None: no image)
+                The data can be str or any buffer, e.g. bytearray or the
+                image of RingFrame.get_image().
+            timestamp (float): time of the frame (default: time.time())
+
+        Returns:
+            int: sequence number of the frame
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        if image is None or image.width == 0 or image.height == 0:
+            (width, height, data) = (0, 0, b'')
+        else:
+            (width, height, data) = (image.width, image.height, image.data)
+            # mmap accepts only str.
+            if isinstance(data, memoryview):
+                data = data.tobytes()
+            elif not isinstance(data, str):
+                data = bytes(data)
+        result_size = get_record_size(len(result.bodies), len(result.hands),\
+                                      len(result.faces))
+        if SLOT_DATA_OFFSET + len(data) + result_size > self.slot_size:
+            raise ValueError('Frame is larger than slot_size.')
+
+        seq = self.seq + 1
+        m = self._map
+        slot = RING_HEADER_SIZE + ((seq - 1) % self.slot_count) * self.slot_size
+        _SEQ.pack_into(m, slot, 0) # Invalidates the slot while writing.
+
+        cur = slot + SLOT_DATA_OFFSET
+        m[cur:cur + len(data)] = data
+        cur += len(data)
+        self._encoder.encode_into(result, m, cur)
+
+        SLOT_HEADER.pack_into(m, slot, seq, timestamp, response_code,\
+                              stb_return, width, height, len(data), result_size)
+        _HEAD.pack_into(m, _HEAD_OFFSET, seq)
+        self.seq = seq
+        return seq
+
+    def publish_frame(self, frame):
+        """Writes HVCFrame of HVCP2Api.stream().
+
+        Returns:
+            int: sequence number of the frame
+        """
+        return self.publish(frame.response_code, frame.stb_return,\
+                            frame.result, frame.image, frame.timestamp)
+
+    def close(self, unlink=True):
+        """Closes the ring buffer.
+
+        Args:
+            unlink (bool): removes the file unless it has been replaced by
+                           another publisher
+                           (the subscribers already opened can read the rest)
+        """
+        ino = os.fstat(self._file.fileno()).st_ino
+        self._map.close()
+        self._file.close()
+        if unlink:
+            try:
+                replaced = os.stat(self.path).st_ino != ino
+            except OSError: # Already removed.
+                return
+            if not replaced:
+                os.remove(self.path)
+
+
+class RingFrame(object):
+    """One frame read from the ring buffer.
+
+    The image and the result refer to the shared memory without copy.
+    They are valid until the publisher overwrites the slot, i.e. check
+    is_valid() after using them.
+    """
+    __slots__ = ['seq', 'timestamp', 'response_code', 'stb_return',\
+                 'width', 'height', 'image_data', 'result_data', '_map', '_slot']
+    def __init__(self, m, slot, seq, timestamp, response_code, stb_return,\
+                 width, height, image_size, result_size):
+        self._map = m
+        self._slot = slot
+        self.seq = seq
+        self.timestamp = timestamp
+        self.response_code = response_code
+        self.stb_return = stb_return
+        self.width = width
+        self.height = height
+        cur = slot + SLOT_DATA_OFFSET
+        self.image_data = buffer(m, cur, image_size)
+        self.result_data = buffer(m, cur + image_size, result_size)
+
+    def is_valid(self):
+        """Returns False if the slot has been overwritten."""
+        return _SEQ.unpack_from(self._map, self._slot)[0] == self.seq
+
+    def get_result(self):
+        """Decodes the result.
+
+        Returns:
+            HVCTrackingResult or HVCResult
+        """
+        return decode_record(self.result_data)[0]
+
+    def get_image(self):
+        """Gets the image referring to the shared memory.
+
+        Returns:
+            GrayscaleImage
+        """
+        img = GrayscaleImage()
+        img.width = self.width
+        img.height = self.height
+        img.data = self.image_data
+        return img
+
+
+class FrameRingSubscriber(object):
+    """Subscriber of the frames in the ring buffer of FrameRingPublisher.
+
+    Usage:
+        subscriber = FrameRingSubscriber('hvc_p2')
+        while True:
+            frame = subscriber.read(timeout=1)
+            if frame is None:
+                continue
+            result = frame.get_result()
+            if not frame.is_valid(): # Overwritten while reading
+                continue
+            ...
+    """
+    def __init__(self, name, latest=True):
+        """Constructor
+
+        Args:
+            name (str): name or path of the ring buffer
+            latest (bool): starts from the next frame(True) or the oldest
+                           frame in the ring buffer(False)
+        """
+        self._file = open(get_ring_path(name), 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+        (magic, self.slot_count, self.slot_size) =\
+                                        RING_HEADER.unpack_from(self._map, 0)
+        if magic != RING_MAGIC:
+            self.close()
+            raise ValueError("Invalid ring buffer:{0!r}".format(name))
+
+        head = self._head()
+        if latest:
+            self.next_seq = head + 1
+        else:
+            self.next_seq = max(1, head - self.slot_count + 1)
+        self.overruns = 0
+
+    def _head(self):
+        return _HEAD.unpack_from(self._map, _HEAD_OFFSET)[0]
+
+    def read(self, timeout=None):
+        """Reads the next frame.
+
+        Args:
+            timeout (float): timeout period(sec) to wait for a new frame
+                             (None: waits forever, 0: does not wait)
+
+        Returns:
+            RingFrame, or None if timeout.
+        """
+        m = self._map
+        deadline = None
+        while True:
+            head = self._head()
+            if head >= self.next_seq:
+                if head - self.next_seq >= self.slot_count:
+                    # Overwritten frames are skipped.
+                    skip = head - self.slot_count + 1
+                    self.overruns += skip - self.next_seq
+                    self.next_seq = skip
+
+                seq = self.next_seq
+                slot = RING_HEADER_SIZE\
+                     + ((seq - 1) % self.slot_count) * self.slot_size
+                header = SLOT_HEADER.unpack_from(m, slot)
+                if header[0] == seq:
+                    self.next_seq = seq + 1
+                    return RingFrame(m, slot, *header)
+                # Overwritten (or being written) after reading the head.
+                self.overruns += 1
+                self.next_seq = seq + 1
+                continue
+
+            if timeout is not None:
+                if deadline is None:
+                    deadline = time.time() + timeout
+                if time.time() >= deadline:
+                    return None
+            time.sleep(POLL_INTERVAL)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+if __name__ == '__main__':
+    pass
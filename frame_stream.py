@@ -0,0 +1,172 @@
+﻿# ---------------------------------------------------------------------------
+# Copyright 2017-2018  OMRON Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ---------------------------------------------------------------------------
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+import time
+import threading
+import Queue
+from collections import namedtuple
+from hvc_tracking_result import HVCTrackingResult
+from grayscale_image import GrayscaleImage
+
+# Policies when the queue is full.
+STREAM_DROP_OLDEST = 'drop_oldest'  # drops the oldest frame in the queue
+STREAM_DROP_NEWEST = 'drop_newest'  # drops the new frame
+STREAM_BLOCK       = 'block'        # waits for the consumer
+
+STREAM_POLICIES = (STREAM_DROP_OLDEST, STREAM_DROP_NEWEST, STREAM_BLOCK)
+
+DEFAULT_STREAM_QUEUE_SIZE = 2
+
+# Period(sec) of the producer thread to check the stop request.
+_POLL_TIMEOUT = 0.1
+
+
+class HVCFrame(namedtuple('HVCFrame', ['seq', 'timestamp', 'response_code',\
+                                       'stb_return', 'result', 'image'])):
+    """One frame of HVCFrameStream.
+
+    Attributes:
+        seq (int): sequence number of execute() from 0
+                   (dropped frames make gaps)
+        timestamp (float): time.time() when the response was received
+        response_code (int): response code form B5T-007001
+        stb_return (int): return status of STB library
+        result: tracking result of this frame only
+        image (GrayscaleImage): output image of this frame only
+    """
+    __slots__ = ()
+
+
+class FrameQueue(Queue.Queue):
+    """Bounded queue with a policy when it is full."""
+    def __init__(self, maxsize, policy=STREAM_DROP_OLDEST):
+        if maxsize < 1:
+            raise ValueError("Invalid queue size:{0!r}".format(maxsize))
+        if policy not in STREAM_POLICIES:
+            raise ValueError("Invalid policy:{0!r}".format(policy))
+        Queue.Queue.__init__(self, maxsize)
+        self.policy = policy
+        self.dropped = 0
+
+    def put_frame(self, item, timeout=None):
+        """Puts the item by the policy.
+
+        Returns:
+            bool: False if the item is not put
+                  (dropped, or timeout with STREAM_BLOCK)
+        """
+        if self.policy == STREAM_BLOCK:
+            try:
+                self.put(item, True, timeout)
+            except Queue.Full:
+                return False
+            return True
+
+        with self.mutex:
+            if len(self.queue) >= self.maxsize:
+                self.dropped += 1
+                if self.policy == STREAM_DROP_NEWEST:
+                    return False
+                self.queue.popleft()
+                self.unfinished_tasks -= 1
+            self.queue.append(item)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+        return True
+
+
+class HVCFrameStream(object):
+    """Iterator of the frames executed continuously.
+
+    A producer thread calls execute() with a new result and image object for
+    every frame, so each HVCFrame is a consistent snapshot that can be
+    handed to other threads without copy. The frames waiting for the
+    consumer are bounded by queue_size and the policy.
+
+    Note:
+        Do not call other methods of the API while streaming.
+        The frames must not be modified.
+        HVCTrackingResultView cannot be used as result_class since it refers
+        to the STB output buffers reused by the next frame.
+    """
+    def __init__(self, hvc_p2_api, out_img_type, queue_size=DEFAULT_STREAM_QUEUE_SIZE,\
+                 policy=STREAM_DROP_OLDEST, result_class=HVCTrackingResult):
+        self._api = hvc_p2_api
+        self._out_img_type = out_img_type
+        self._result_class = result_class
+        self._queue = FrameQueue(queue_size, policy)
+        self._error = None
+        self._stop_event = threading.Event()
+        self._producer = threading.Thread(target=self._produce, name='hvc-p2-stream')
+        self._producer.daemon = True
+        self._producer.start()
+
+    @property
+    def dropped(self):
+        """Number of frames dropped by the policy."""
+        return self._queue.dropped
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        while True:
+            try:
+                return self._queue.get(True, _POLL_TIMEOUT)
+            except Queue.Empty:
+                if self._producer.is_alive() or not self._queue.empty():
+                    continue
+            # The producer has stopped.
+            error = self._error
+            if error is not None:
+                self._error = None
+                raise error[0], error[1], error[2]
+            raise StopIteration
+
+    def close(self):
+        """Stops the producer thread after the current execute()."""
+        self._stop_event.set()
+        self._producer.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _produce(self):
+        seq = 0
+        try:
+            while not self._stop_event.is_set():
+                result = self._result_class()
+                image = GrayscaleImage()
+                (response_code, stb_return) = self._api.execute(\
+                                            self._out_img_type, result, image)
+                frame = HVCFrame(seq, time.time(), response_code, stb_return,\
+                                 result, image)
+                seq += 1
+                while not self._stop_event.is_set():
+                    if self._queue.put_frame(frame, _POLL_TIMEOUT)\
+                       or self._queue.policy != STREAM_BLOCK:
+                        break
+        except Exception:
+            self._error = sys.exc_info()
+
+if __name__ == '__main__':
+    pass
@@ -28,18 +28,41 @@ class GrayscaleImage(object):
         self.data = b''
 
     def save(self, fname):
+        # if no data, no save.
+        if self.width == 0 or self.height == 0:
+            return False
+
+        self.to_pil().save(fname)
+        return True
+
+    def to_pil(self):
+        """Returns the image as a PIL image sharing the data buffer.
+
+        Returns:
+            PIL.Image: 8 bit grayscale("L") image, or None if no data.
+        """
         w = self.width
         h = self.height
+        if w == 0 or h == 0:
+            return None
 
-        # if no data, no save.
+        return Image.frombuffer("L", (w, h), self.data, "raw", "L", 0, 1)
+
+    def to_numpy(self):
+        """Returns the image as a read-only numpy array sharing the data buffer.
+
+        Note:
+            NumPy is required only when this method is used.
+
+        Returns:
+            numpy.ndarray: uint8 array of shape (height, width), or None if
+                           no data.
+        """
+        import numpy
+
+        w = self.width
+        h = self.height
         if w == 0 or h == 0:
-            return False
+            return None
 
-        img = Image.new("L", (w, h), 0)
-        x = 0
-        y = 0
-        for y in range(h):
-            for x in range(w):
-                img.putpixel((x, y), ord(self.data[w * y + x]))
-        img.save(fname)
-        return True
+        return numpy.frombuffer(self.data, numpy.uint8, w * h).reshape((h, w))
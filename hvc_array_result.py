@@ -0,0 +1,124 @@
+﻿# ---------------------------------------------------------------------------
+# Copyright 2017-2018  OMRON Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ---------------------------------------------------------------------------
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy
+from struct import *
+from p2def import *
+from hvc_result import FACE_RECORD_LAYOUT, FACE_FUNC_MASK,\
+                       DETECTION_RECORD_FORMAT
+
+# NumPy type of each struct format character (little endian)
+_dtype_dic = {'B':'u1', 'b':'i1', 'H':'<u2', 'h':'<i2'}
+
+# Column names of each record part in the order of the response data.
+DETECTION_NAMES = ('pos_x', 'pos_y', 'size', 'conf')
+FACE_NAMES_DIC = {EX_DIRECTION  :('dir_LR', 'dir_UD', 'dir_roll', 'dir_conf'),
+                  EX_AGE        :('age', 'age_conf'),
+                  EX_GENDER     :('gender', 'gender_conf'),
+                  EX_GAZE       :('gaze_LR', 'gaze_UD'),
+                  EX_BLINK      :('blink_L', 'blink_R'),
+                  EX_EXPRESSION :('neutral', 'happiness', 'surprise',\
+                                  'anger', 'sadness', 'neg_pos'),
+                  EX_RECOGNITION:('uid', 'score')}
+
+def _make_dtype(names, fmt):
+    return numpy.dtype([(names[i], _dtype_dic[fmt[i]]) for i in range(len(fmt))])
+
+DETECTION_DTYPE = _make_dtype(DETECTION_NAMES, DETECTION_RECORD_FORMAT)
+
+_count_struct = Struct('<BBBx')
+_face_dtypes = {}
+
+def get_face_dtype(exec_func):
+    """Gets the structured dtype of one face record for exec_func.
+
+    The dtype has no padding, i.e. it is identical to the record layout in
+    the response of Execute command.
+    """
+    exec_func &= FACE_FUNC_MASK
+    dtype = _face_dtypes.get(exec_func)
+    if dtype is None:
+        names = DETECTION_NAMES
+        fmt = DETECTION_RECORD_FORMAT
+        for (flag, field_fmt, name, cls) in FACE_RECORD_LAYOUT:
+            if exec_func & flag:
+                names += FACE_NAMES_DIC[flag]
+                fmt += field_fmt
+        dtype = _make_dtype(names, fmt)
+        _face_dtypes[exec_func] = dtype
+    return dtype
+
+
+class HVCArrayResult(object):
+    """Class storing the detection/estimation result of HVC-P2 as NumPy
+    structured arrays.
+
+    Each of faces, bodies and hands is a read-only structured array viewing
+    the response data (no copy). e.g. faces['pos_x'], faces['age_conf']
+
+    Note:
+        The columns of faces depend on the executed functions.
+        (refer to FACE_NAMES_DIC)
+    """
+    __slots__ = ['faces', 'bodies', 'hands']
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.faces = numpy.empty(0, get_face_dtype(EX_NONE))
+        self.bodies = numpy.empty(0, DETECTION_DTYPE)
+        self.hands = numpy.empty(0, DETECTION_DTYPE)
+
+    def read_from_buffer(self, exec_func, data_len, data):
+        (body_count, hand_count, face_count) = _count_struct.unpack_from(data, 0)
+        cur = _count_struct.size
+
+        self.bodies = self._view(data, DETECTION_DTYPE, body_count, cur)
+        cur += DETECTION_DTYPE.itemsize * body_count
+
+        self.hands = self._view(data, DETECTION_DTYPE, hand_count, cur)
+        cur += DETECTION_DTYPE.itemsize * hand_count
+
+        face_dtype = get_face_dtype(exec_func)
+        self.faces = self._view(data, face_dtype, face_count, cur)
+        cur += face_dtype.itemsize * face_count
+        return cur
+
+    @staticmethod
+    def _view(data, dtype, count, offset):
+        if count == 0:
+            return numpy.empty(0, dtype)
+        return numpy.frombuffer(data, dtype, count, offset)
+
+    def __str__(self):
+        s = 'Face count= %s\n' % len(self.faces)
+        s += '\t%s\n' % (self.faces.dtype.names,)
+        for i in range(len(self.faces)):
+            s += '\t[%s]\t%s\n' % (i, self.faces[i])
+
+        s += 'Body count= %s\n' % len(self.bodies)
+        for i in range(len(self.bodies)):
+            s += '\t[%s]\t%s\n' % (i, self.bodies[i])
+
+        s += 'Hand count= %s\n' % len(self.hands)
+        for i in range(len(self.hands)):
+            s += '\t[%s]\t%s\n' % (i, self.hands[i])
+        return s
+
+if __name__ == '__main__':
+    pass
@@ -20,12 +20,18 @@ import sys
 import p2def
 from serial_connector import SerialConnector
 from hvc_p2_wrapper import HVCP2Wrapper
-from hvc_tracking_result import HVCTrackingResult
-from hvc_tracking_result_c import C_FACE_RES35, C_BODY_RES35
+from hvc_tracking_result import HVCTrackingResult, HVCTrackingResultView
+from hvc_tracking_result_c import C_FACE, C_BODY, C_FACE_RES35, C_BODY_RES35
 from hvc_result import HVCResult
 from hvc_result_c import C_FRAME_RESULT
 from stb import STB
 from grayscale_image import GrayscaleImage
+from frame_stream import HVCFrameStream, STREAM_DROP_OLDEST,\
+                         DEFAULT_STREAM_QUEUE_SIZE
+try:
+    from hvc_array_result import HVCArrayResult
+except ImportError: # NumPy is not installed.
+    HVCArrayResult = None
 
 WINDOWS_STB_LIB_NAME = 'libSTB.dll'
 LINUX_STB_LIB_NAME = './libSTB.so'
@@ -33,7 +39,15 @@ LINUX_STB_LIB_NAME = './libSTB.so'
 class HVCP2Api(object):
     """ This class provide python full API for HVC-P2(B5T-007001) with STB library.
     """
-    __slots__ = ['use_stb', '_stb', '_hvc_p2_wrapper', '_exec_func']
+    __slots__ = ['use_stb', '_stb', '_hvc_p2_wrapper', '_exec_func',\
+                 '_stb_in', '_stb_out_f', '_stb_out_b', '_scheduler']
+
+    # Command wrapper class. (HVCP2Wrapper or its sub-class)
+    wrapper_class = HVCP2Wrapper
+
+    # Stabilizer class. (STB, or PySTB in py_stb.py)
+    stb_class = STB
+
     def __init__(self, connector, exec_func, use_stabilizer):
         """Constructor
 
@@ -47,7 +61,7 @@ class HVCP2Api(object):
             void
 
         """
-        self._hvc_p2_wrapper = HVCP2Wrapper(connector)
+        self._hvc_p2_wrapper = self.wrapper_class(connector)
 
         # Disable to use STB if using Hand detection only.
         if use_stabilizer == p2def.USE_STB_ON and exec_func == p2def.EX_HAND:
@@ -67,6 +81,7 @@ class HVCP2Api(object):
             exec_func |= p2def.EX_FACE + p2def.EX_DIRECTION
 
         self._exec_func = exec_func
+        self._scheduler = None
 
         os = sys.platform
         if os == 'win32':
@@ -77,7 +92,12 @@ class HVCP2Api(object):
             raise 'Error: Unsupported OS.'
 
         if self.use_stb:
-            self._stb = STB(stb_lib_name, exec_func)
+            self._stb = self.stb_class(stb_lib_name, exec_func)
+
+            # Input/Output buffers for STB library reused for every frame.
+            self._stb_in = C_FRAME_RESULT()
+            self._stb_out_f = C_FACE_RES35()
+            self._stb_out_b = C_BODY_RES35()
 
     def connect(self, com_port, baudrate, timeout):
         """Connects to HVC-P2 by COM port via USB or UART interface.
@@ -105,6 +125,53 @@ class HVCP2Api(object):
         """
         return self._hvc_p2_wrapper.disconnect()
 
+    def set_recorder(self, recorder):
+        """Sets the recorder of raw commands and responses.
+
+        Args:
+            recorder (SessionRecorder): recorder (None: stops recording)
+
+        Returns:
+            void
+
+        """
+        self._hvc_p2_wrapper.set_recorder(recorder)
+
+    def set_scheduler(self, scheduler):
+        """Sets the scheduler selecting the functions executed on each frame.
+
+        Args:
+            scheduler (ExecFuncScheduler): scheduler
+                                           (None: executes all functions
+                                            specified in the constructor)
+
+        Returns:
+            void
+
+        Note:
+            The results of the functions not executed on a frame are None,
+            except age, gender and recognition stabilized by STB library.
+        """
+        if scheduler is not None:
+            scheduler.reset()
+        self._scheduler = scheduler
+
+    def set_metrics(self, metrics):
+        """Sets the metrics measuring the latency and throughput of each
+        command.
+
+        Args:
+            metrics (CommandMetrics): metrics (None: stops measurement)
+
+        Returns:
+            void
+
+        Note:
+            With PipelinedSerialConnector only the decoding time is measured
+            for the prefetched Execute commands.
+        """
+        self._hvc_p2_wrapper.set_metrics(metrics)
+
     def get_version(self):
         """Gets the device's model name, version and revision.
 
@@ -162,7 +229,13 @@ class HVCP2Api(object):
                 OUT_IMG_TYPE_NONE  (00h): no image output
                 OUT_IMG_TYPE_QVGA  (01h): 320x240 pixel resolution(QVGA)
                 OUT_IMG_TYPE_QQVGA (02h): 160x120 pixel resolution(QQVGA)
-            tracking_result (HVCTrackingResult): the tracking result is stored
+            tracking_result (HVCTrackingResult, HVCTrackingResultView or
+                             HVCArrayResult):
+                the tracking result is stored.
+                HVCTrackingResultView refers to the STB output buffers
+                which are reused by the next execution.
+                HVCArrayResult stores the result as NumPy structured arrays
+                without STB library.
             out_img (GrayscaleImage): output image
 
         Returns:
@@ -170,46 +243,107 @@ class HVCP2Api(object):
                 response_code (int): response code form B5T-007001
                 stb_return (bool): return status of STB library
 
+        Note:
+            With PipelinedSerialConnector the result is one frame late,
+            i.e. the frame was captured by the Execute command sent at the
+            end of the previous call (refer to PipelinedSerialConnector).
+            The functions executed on the frame are of the previous call
+            when they are changed by the scheduler.
+            The prefetched frame older than max_prefetch_age of the
+            connector is discarded and a new frame is captured.
+
         """
+        exec_func = self._exec_func
+        if self._scheduler is not None:
+            exec_func = self._scheduler.select(exec_func)
+
+        if HVCArrayResult is not None and\
+           isinstance(tracking_result, HVCArrayResult):
+            tracking_result.clear()
+            response_code = self._hvc_p2_wrapper.execute(exec_func,\
+                                       out_img_type, tracking_result, out_img)
+            return (response_code, 0)
+
+        if not self.use_stb or (self._exec_func == p2def.EX_NONE):
+            # Decodes directly into the tracking result. (no HVCResult)
+            tracking_result.clear()
+            response_code = self._hvc_p2_wrapper.execute(exec_func,\
+                                       out_img_type, tracking_result, out_img)
+            return (response_code, 0)
+
         frame_result = HVCResult()
-        response_code = self._hvc_p2_wrapper.execute(self._exec_func,\
+        response_code = self._hvc_p2_wrapper.execute(exec_func,\
                                            out_img_type, frame_result, out_img)
+        # The functions of the prefetched frame with the pipelining.
+        exec_func = self._hvc_p2_wrapper.get_executed_func()
 
         tracking_result.clear()
-        if self.use_stb and (self._exec_func != p2def.EX_NONE):
-            stb_in = C_FRAME_RESULT()
-            frame_result.export_to_C_FRAME_RESULT(stb_in)
-            stb_out_f = C_FACE_RES35()
-            stb_out_b = C_BODY_RES35()
-            (stb_return, face_count, body_count) = self._stb.execute(stb_in,\
-                                                                     stb_out_f,\
-                                                                     stb_out_b)
-            if stb_return < 0: # STB error
-                return (response_code, stb_return)
-
-            tracking_result.faces.append_C_FACE_RES35(self._exec_func,\
-                                                      face_count, stb_out_f)
-
-            if self._exec_func & p2def.EX_DIRECTION:
-                tracking_result.faces.append_direction_list(frame_result.faces)
-
-            if self._exec_func & p2def.EX_GAZE:
-                tracking_result.faces.append_gaze_list(frame_result.faces)
-
-            if self._exec_func & p2def.EX_BLINK:
-                tracking_result.faces.append_blink_list(frame_result.faces)
-
-            if self._exec_func & p2def.EX_EXPRESSION:
-                tracking_result.faces.append_expression_list(frame_result.faces)
-
-            tracking_result.bodies.append_BODY_RES35(self._exec_func,\
-                                                     body_count, stb_out_b)
-            tracking_result.hands.append_hand_list(frame_result.hands)
+        stb_in = self._stb_in
+        frame_result.export_to_C_FRAME_RESULT(stb_in)
+        max_count = self._stb.get_max_output_count()
+        if len(self._stb_out_f) < max_count:
+            # PySTB outputs the lost tracks being retried in addition.
+            self._stb_out_f = (C_FACE * max_count)()
+            self._stb_out_b = (C_BODY * max_count)()
+        stb_out_f = self._stb_out_f
+        stb_out_b = self._stb_out_b
+        (stb_return, face_count, body_count) = self._stb.execute(stb_in,\
+                                                                 stb_out_f,\
+                                                                 stb_out_b)
+        if stb_return < 0: # STB error
+            if self._scheduler is not None:
+                self._scheduler.invalidate()
+            return (response_code, stb_return)
+
+        if self._scheduler is not None:
+            self._scheduler.update(face_count, stb_out_f)
+
+        # The estimations stabilized by STB are of all functions, the others
+        # are of the functions executed on this frame.
+        if isinstance(tracking_result, HVCTrackingResultView):
+            tracking_result.set_STB_RESULT(self._exec_func,\
+                                           face_count, stb_out_f,\
+                                           body_count, stb_out_b,\
+                                           frame_result, exec_func)
         else:
-            tracking_result.appned_FRAME_RESULT(frame_result)
-            stb_return = 0
+            tracking_result.append_STB_RESULT(self._exec_func,\
+                                              face_count, stb_out_f,\
+                                              body_count, stb_out_b,\
+                                              frame_result, exec_func)
         return (response_code, stb_return)
 
+    def stream(self, out_img_type, queue_size=DEFAULT_STREAM_QUEUE_SIZE,\
+               policy=STREAM_DROP_OLDEST, result_class=HVCTrackingResult):
+        """Executes continuously on a producer thread and iterates the frames.
+
+        Each frame has its own result and image objects, i.e. it can be
+        handed to other threads without copy.
+
+        Args:
+            out_img_type (int): output image type (refer to execute())
+            queue_size (int): maximum number of frames waiting for the
+                              consumer
+            policy (str): policy when the queue is full
+                STREAM_DROP_OLDEST: drops the oldest frame in the queue
+                STREAM_DROP_NEWEST: drops the new frame
+                STREAM_BLOCK:       waits for the consumer
+            result_class (class): HVCTrackingResult or HVCArrayResult
+
+        Returns:
+            HVCFrameStream: iterator of HVCFrame
+                            (seq, timestamp, response_code, stb_return,
+                             result, image)
+
+        Usage:
+            with hvc_p2_api.stream(p2def.OUT_IMG_TYPE_QVGA) as frames:
+                for frame in frames:
+                    ...
+
+        """
+        if result_class is HVCTrackingResultView:
+            raise ValueError("HVCTrackingResultView cannot be streamed.")
+        return HVCFrameStream(self, out_img_type, queue_size, policy, result_class)
+
     def reset_tracking(self):
         """Resets tracking.
         Note:
@@ -223,6 +357,8 @@ class HVCP2Api(object):
             bool: return status
 
        """
+        if self._scheduler is not None:
+            self._scheduler.reset()
         return self._stb.clear_stb_frame_results()
 
 
@@ -342,6 +478,58 @@ class HVCP2Api(object):
       """
         return self._hvc_p2_wrapper.set_uart_baudrate(baudrate)
 
+    def apply_config(self, config):
+        """Applies the device configuration.
+
+        Only the items different from the configuration already applied or
+        read are sent to the device, i.e. applying the same configuration
+        again costs no communication.
+
+        Args:
+            config (DeviceConfig): device configuration.
+                                   The items of None are not changed.
+
+        Returns:
+            int: response_code form B5T-007001.
+                 (the first error if a command failed)
+
+        """
+        return self._hvc_p2_wrapper.apply_config(config)
+
+    def get_config(self):
+        """Gets the device configuration.
+
+        The camera angle, threshold, detection size and face angle are
+        answered from the configuration already applied or read, and only
+        the unknown items are read from the device.
+
+        Args:
+            void
+
+        Returns:
+            tuple of (response_code, config)
+                response_code (int): response code form B5T-007001
+                config (DeviceConfig): device configuration
+
+        """
+        return self._hvc_p2_wrapper.get_config()
+
+    def invalidate_config(self):
+        """Discards the configuration known by the host.
+
+        The configuration is discarded automatically on connect(),
+        disconnect() and set_uart_baudrate(). Call this if the device may be
+        changed in another way. (e.g. power cycle)
+
+        Args:
+            void
+
+        Returns:
+            void
+
+        """
+        self._hvc_p2_wrapper.invalidate_config()
+
    #==========================================================================
    # APIs for Album operation of Face recognition
    #==========================================================================
@@ -0,0 +1,626 @@
+﻿# ---------------------------------------------------------------------------
+# Copyright 2017-2018  OMRON Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ---------------------------------------------------------------------------
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import pty
+import tty
+import sys
+import time
+import random
+import select
+import termios
+import threading
+from struct import *
+from p2def import *
+from hvc_p2_wrapper import SYNC_CODE
+
+# Command codes (2nd byte of the command header, refer to hvc_p2_wrapper.py)
+CMD_GETVERSION          = 0x00
+CMD_SET_CAMERA_ANGLE    = 0x01
+CMD_GET_CAMERA_ANGLE    = 0x02
+CMD_EXECUTE             = 0x04
+CMD_SET_THRESHOLD       = 0x05
+CMD_GET_THRESHOLD       = 0x06
+CMD_SET_DETECTION_SIZE  = 0x07
+CMD_GET_DETECTION_SIZE  = 0x08
+CMD_SET_FACE_ANGLE      = 0x09
+CMD_GET_FACE_ANGLE      = 0x0A
+CMD_SET_UART_BAUDRATE   = 0x0E
+CMD_REGISTER_DATA       = 0x10
+CMD_DELETE_DATA         = 0x11
+CMD_DELETE_USER         = 0x12
+CMD_DELETE_ALL_DATA     = 0x13
+CMD_USER_DATA           = 0x15
+CMD_SAVE_ALBUM          = 0x20
+CMD_LOAD_ALBUM          = 0x21
+CMD_SAVE_ALBUM_ON_FLASH = 0x22
+CMD_REFORMAT_FLASH      = 0x30
+
+EMULATOR_MODEL = b'B5T-007001  '
+EMULATOR_VERSION = (1, 2, 3, 0)  # major, minor, release, revision
+
+# Image size of each output image type.
+IMAGE_SIZES = {OUT_IMG_TYPE_QVGA:(320, 240), OUT_IMG_TYPE_QQVGA:(160, 120)}
+
+# Size of the normalized face image of Register data command.
+REGISTER_IMAGE_SIZE = (64, 64)
+
+# Coordinate range of the detection results. (1600x1200 pixels)
+FRAME_WIDTH = 1600
+FRAME_HEIGHT = 1200
+
+MAX_USER_ID = 99
+MAX_DATA_ID = 9
+
+# Default settings of the device.
+DEFAULT_THRESHOLD = (500, 500, 500, 500)
+DEFAULT_DETECTION_SIZE = (30, 8192, 40, 8192, 64, 8192)
+DEFAULT_FACE_ANGLE = (HVC_FACE_ANGLE_YAW_30, HVC_FACE_ANGLE_ROLL_15)
+
+# Bits per byte on UART. (start bit + 8 data bits + stop bit)
+UART_BITS_PER_BYTE = 10
+
+# Period(sec) of the emulator thread to check the stop request.
+POLL_TIMEOUT = 0.1
+
+# Baudrate of each termios speed. (B921600 is missing in termios of Python 2)
+_TERMIOS_BAUD = dict((getattr(termios, 'B{0}'.format(b)), b)\
+                     for b in AVAILABLE_BAUD if hasattr(termios, 'B{0}'.format(b)))
+_TERMIOS_BAUD[0o010007] = 921600  # B921600 on Linux
+
+_album_header = Struct('<H')
+_album_entry = Struct('<HH')
+
+
+class _SceneObject(object):
+    """A body, hand or face moving in the synthetic scene."""
+    __slots__ = ['pos_x', 'pos_y', 'size', 'conf', 'vx', 'vy', 'attrs']
+    def __init__(self, rnd, min_size, max_size):
+        self.size = rnd.randint(min_size, max_size)
+        self.pos_x = rnd.randint(self.size // 2, FRAME_WIDTH - self.size // 2)
+        self.pos_y = rnd.randint(self.size // 2, FRAME_HEIGHT - self.size // 2)
+        self.conf = rnd.randint(500, 1000)
+        self.vx = rnd.randint(-20, 20)
+        self.vy = rnd.randint(-20, 20)
+        self.attrs = None
+
+    def move(self):
+        half = self.size // 2
+        self.pos_x += self.vx
+        self.pos_y += self.vy
+        if not half <= self.pos_x <= FRAME_WIDTH - half:
+            self.vx = -self.vx
+            self.pos_x = min(max(self.pos_x, half), FRAME_WIDTH - half)
+        if not half <= self.pos_y <= FRAME_HEIGHT - half:
+            self.vy = -self.vy
+            self.pos_y = min(max(self.pos_y, half), FRAME_HEIGHT - half)
+
+    def pack_detection(self):
+        return pack('<HHHH', self.pos_x, self.pos_y, self.size, self.conf)
+
+
+class SyntheticScene(object):
+    """Scene of bodies, hands and faces moving in the camera view.
+
+    Every object moves smoothly and keeps its attributes (age, gender, etc.)
+    between frames, so that the STB library can track and stabilize them.
+    """
+    def __init__(self, body_count=1, hand_count=1, face_count=1, seed=0):
+        self._rnd = random.Random(seed)
+        self.set_counts(body_count, hand_count, face_count)
+        self._frame = 0
+
+    def set_counts(self, body_count, hand_count, face_count):
+        """Changes the number of objects. (max. 35 each)"""
+        for count in (body_count, hand_count, face_count):
+            if not 0 <= count <= 35:
+                raise ValueError("Invalid count:{0!r}".format(count))
+        rnd = self._rnd
+        self.bodies = [_SceneObject(rnd, 100, 600) for i in range(body_count)]
+        self.hands = [_SceneObject(rnd, 40, 200) for i in range(hand_count)]
+        self.faces = [_SceneObject(rnd, 64, 400) for i in range(face_count)]
+        for face in self.faces:
+            expression = [rnd.randint(0, 10) for i in range(5)]
+            expression[rnd.randint(0, 4)] = rnd.randint(60, 100)
+            face.attrs = {'direction':[rnd.randint(-30, 30), rnd.randint(-20, 20),
+                                       rnd.randint(-15, 15), rnd.randint(300, 1000)],
+                          'age':(rnd.randint(5, 75), rnd.randint(300, 1000)),
+                          'gender':(rnd.randint(GENDER_FEMALE, GENDER_MALE),
+                                    rnd.randint(300, 1000)),
+                          'expression':expression + [rnd.randint(-100, 100)],
+                          'score':rnd.randint(300, 1000)}
+
+    def next_frame(self, exec_func, users=()):
+        """Moves the objects and makes the results of Execute command.
+
+        Args:
+            exec_func (int): functions flag to be executed
+            users (list): registered user IDs for Recognition
+
+        Returns:
+            str: response data of Execute command without the image
+        """
+        self._frame += 1
+        rnd = self._rnd
+        bodies = self.bodies if exec_func & EX_BODY else []
+        hands = self.hands if exec_func & EX_HAND else []
+        faces = self.faces if exec_func & EX_FACE else []
+
+        buf = [pack('<BBBx', len(bodies), len(hands), len(faces))]
+        for obj in bodies + hands:
+            obj.move()
+            buf.append(obj.pack_detection())
+        for (i, face) in enumerate(faces):
+            face.move()
+            buf.append(face.pack_detection())
+            attrs = face.attrs
+            if exec_func & EX_DIRECTION:
+                direction = attrs['direction']
+                direction[0] = min(max(direction[0] + rnd.randint(-2, 2), -90), 90)
+                direction[1] = min(max(direction[1] + rnd.randint(-2, 2), -90), 90)
+                buf.append(pack('<hhhH', *direction))
+            if exec_func & EX_AGE:
+                buf.append(pack('<bh', *attrs['age']))
+            if exec_func & EX_GENDER:
+                buf.append(pack('<bh', *attrs['gender']))
+            if exec_func & EX_GAZE:
+                buf.append(pack('<bb', rnd.randint(-10, 10), rnd.randint(-10, 10)))
+            if exec_func & EX_BLINK:
+                # Blinks once in 30 frames.
+                blink = 900 if (self._frame + i) % 30 == 0 else rnd.randint(100, 300)
+                buf.append(pack('<hh', blink, blink))
+            if exec_func & EX_EXPRESSION:
+                buf.append(pack('<bbbbbb', *attrs['expression']))
+            if exec_func & EX_RECOGNITION:
+                if users:
+                    buf.append(pack('<hh', users[i % len(users)], attrs['score']))
+                else:
+                    buf.append(pack('<hh', RECOG_NO_DATA_IN_ALBUM, 0))
+        return b''.join(buf)
+
+    def make_image(self, width, height):
+        """Makes a grayscale image scrolling by frame."""
+        image = make_image_data(width, height)
+        shift = (self._frame * 4) % width
+        return image[shift:] + image[:shift]
+
+
+_image_data_cache = {}
+
+def make_image_data(width, height):
+    """Makes the pixel data of a gradient grayscale image. (cached)"""
+    image = _image_data_cache.get((width, height))
+    if image is None:
+        image = b''.join(chr((x * 256 // width + y // 8) % 256)\
+                         for y in range(height) for x in range(width))
+        _image_data_cache[(width, height)] = image
+    return image
+
+
+def make_frame_data(exec_func, body_count, hand_count, face_count, seed=0):
+    """Makes the synthetic response data of Execute command.
+
+    Unlike SyntheticScene, the counts are used regardless of exec_func.
+    """
+    rnd = random.Random(seed)
+
+    def _detection():
+        return pack('<HHHH', rnd.randint(0, FRAME_WIDTH - 1),\
+                             rnd.randint(0, FRAME_HEIGHT - 1),\
+                             rnd.randint(20, 1200), rnd.randint(0, 1000))
+
+    data = pack('<BBBB', body_count, hand_count, face_count, 0)
+    for i in range(body_count + hand_count):
+        data += _detection()
+    for i in range(face_count):
+        data += _detection()
+        if exec_func & EX_DIRECTION:
+            data += pack('<hhhH', rnd.randint(-90, 90), rnd.randint(-90, 90),\
+                                  rnd.randint(-90, 90), rnd.randint(0, 1000))
+        if exec_func & EX_AGE:
+            data += pack('<bh', rnd.randint(0, 75), rnd.randint(0, 1000))
+        if exec_func & EX_GENDER:
+            data += pack('<bh', rnd.randint(0, 1), rnd.randint(0, 1000))
+        if exec_func & EX_GAZE:
+            data += pack('<bb', rnd.randint(-90, 90), rnd.randint(-90, 90))
+        if exec_func & EX_BLINK:
+            data += pack('<hh', rnd.randint(1, 1000), rnd.randint(1, 1000))
+        if exec_func & EX_EXPRESSION:
+            data += pack('<bbbbbb', *[rnd.randint(0, 100) for j in range(5)]\
+                                    + [rnd.randint(-100, 100)])
+        if exec_func & EX_RECOGNITION:
+            data += pack('<hh', rnd.randint(-1, 9), rnd.randint(0, 1000))
+    return data
+
+
+class HVCP2Emulator(object):
+    """HVC-P2(B5T-007001) device emulator on a pseudo terminal.
+
+    The emulator answers all commands of HVCP2Wrapper on the slave side of a
+    pty, so the unchanged SerialConnector stack can be run without a device.
+    The Execute command returns the results of SyntheticScene and the
+    optional image. The settings and the album are kept like the device.
+
+    Usage:
+        emulator = HVCP2Emulator(face_count=35)
+        port = emulator.start()
+        hvc_p2_api.connect(port, 9600, 30)
+        ...
+        emulator.stop()
+    """
+    def __init__(self, body_count=1, hand_count=1, face_count=1,\
+                 simulate_wire_time=True, execute_time=0, seed=0,\
+                 check_baudrate=False, error_rates=None):
+        """Constructor
+
+        Args:
+            body_count, hand_count, face_count (int): number of objects in
+                                                      the scene (max. 35)
+            simulate_wire_time (bool): transfers the data in the time of the
+                                       current baudrate
+            execute_time (float): processing time(sec) of Execute command
+            seed (int): seed of the scene
+            check_baudrate (bool): ignores the commands if the baudrate set
+                                   to the pty by the host is not the one of
+                                   the emulated device
+            error_rates (dict): baudrate to the probability of corrupting
+                                the sync code of a response
+        """
+        self.scene = SyntheticScene(body_count, hand_count, face_count, seed)
+        self.simulate_wire_time = simulate_wire_time
+        self.execute_time = execute_time
+        self.check_baudrate = check_baudrate
+        self.error_rates = error_rates or {}
+        self.command_count = 0
+        self.sync_errors = 0
+
+        self._master = None
+        self._slave = None
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._rnd = random.Random(seed)
+        self._buf = b''
+        self._baudrate = DEFAULT_BAUD
+        self._album = {}
+        self._flash_album = {}
+        self._handlers = {CMD_GETVERSION:self._get_version,
+                          CMD_SET_CAMERA_ANGLE:self._set_camera_angle,
+                          CMD_GET_CAMERA_ANGLE:self._get_camera_angle,
+                          CMD_EXECUTE:self._execute,
+                          CMD_SET_THRESHOLD:self._set_threshold,
+                          CMD_GET_THRESHOLD:self._get_threshold,
+                          CMD_SET_DETECTION_SIZE:self._set_detection_size,
+                          CMD_GET_DETECTION_SIZE:self._get_detection_size,
+                          CMD_SET_FACE_ANGLE:self._set_face_angle,
+                          CMD_GET_FACE_ANGLE:self._get_face_angle,
+                          CMD_SET_UART_BAUDRATE:self._set_uart_baudrate,
+                          CMD_REGISTER_DATA:self._register_data,
+                          CMD_DELETE_DATA:self._delete_data,
+                          CMD_DELETE_USER:self._delete_user,
+                          CMD_DELETE_ALL_DATA:self._delete_all_data,
+                          CMD_USER_DATA:self._get_user_data,
+                          CMD_SAVE_ALBUM:self._save_album,
+                          CMD_LOAD_ALBUM:self._load_album,
+                          CMD_SAVE_ALBUM_ON_FLASH:self._save_album_to_flash,
+                          CMD_REFORMAT_FLASH:self._reformat_flash}
+        self.reset()
+
+    def reset(self):
+        """Resets the settings to the defaults and the baudrate to 9600."""
+        self.camera_angle = HVC_CAM_ANGLE_0
+        self.threshold = DEFAULT_THRESHOLD
+        self.detection_size = DEFAULT_DETECTION_SIZE
+        self.face_angle = DEFAULT_FACE_ANGLE
+        self._baudrate = DEFAULT_BAUD
+        self._album = dict(self._flash_album)
+
+    @property
+    def baudrate(self):
+        return self._baudrate
+
+    def start(self):
+        """Opens the pty and starts the emulator thread.
+
+        Returns:
+            str: port name of the emulated device (pty slave)
+        """
+        (self._master, self._slave) = pty.openpty()
+        tty.setraw(self._slave)
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='hvc-p2-emulator')
+        self._thread.daemon = True
+        self._thread.start()
+        return self.port
+
+    def stop(self):
+        """Stops the emulator thread and closes the pty."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        # The slave is kept open until here, so that the host can
+        # disconnect and connect again.
+        os.close(self._master)
+        os.close(self._slave)
+        self._master = None
+        self._slave = None
+
+    @property
+    def port(self):
+        return os.ttyname(self._slave)
+
+    def _run(self):
+        try:
+            while not self._stop_event.is_set():
+                header = self._read_command_header()
+                if header is None:
+                    return
+                (code, data_len) = unpack('<xBH', header)
+                if code == CMD_LOAD_ALBUM:
+                    # Album data follows the album size.
+                    data = self._read(data_len)
+                    if data is None:
+                        return
+                    (album_len,) = unpack('<I', data)
+                    data += self._read(album_len) or b''
+                else:
+                    data = self._read(data_len)
+                    if data is None:
+                        return
+                self._wait_wire_time(len(header) + len(data))
+                if self.check_baudrate and self._host_baudrate() != self._baudrate:
+                    continue # Garbled on the wire
+                self.command_count += 1
+
+                handler = self._handlers.get(code)
+                if handler is None:
+                    self._send_response(RESPONSE_CODE_INVALID_CMD)
+                    continue
+                try:
+                    handler(data)
+                except error: # struct.error : invalid data size
+                    self._send_response(RESPONSE_CODE_INVALID_CMD)
+        except OSError:
+            if not self._stop_event.is_set():
+                raise
+
+    def _read(self, size):
+        """Reads size bytes from the host. (None: stop requested)"""
+        while len(self._buf) < size:
+            if self._stop_event.is_set():
+                return None
+            (readable, w, x) = select.select([self._master], [], [], POLL_TIMEOUT)
+            if readable:
+                self._buf += os.read(self._master, 4096)
+        data = self._buf[:size]
+        self._buf = self._buf[size:]
+        return data
+
+    def _read_command_header(self):
+        while True:
+            sync = self._read(1)
+            if sync is None:
+                return None
+            if ord(sync) == SYNC_CODE:
+                break
+            self.sync_errors += 1
+        rest = self._read(3)
+        if rest is None:
+            return None
+        return sync + rest
+
+    def _host_baudrate(self):
+        return _TERMIOS_BAUD.get(termios.tcgetattr(self._slave)[5])
+
+    def _wire_time(self, size):
+        return size * UART_BITS_PER_BYTE / float(self._baudrate)
+
+    def _wait_wire_time(self, size):
+        if self.simulate_wire_time:
+            time.sleep(self._wire_time(size))
+
+    def _send_response(self, response_code, data=b''):
+        response = pack('<BBI', SYNC_CODE, response_code, len(data)) + data
+        if self._rnd.random() < self.error_rates.get(self._baudrate, 0):
+            response = b'\x00' + response[1:]
+        if not self.simulate_wire_time:
+            os.write(self._master, response)
+            return
+
+        # Writes by 10msec chunks in the time of the current baudrate.
+        chunk_size = max(1, self._baudrate // (UART_BITS_PER_BYTE * 100))
+        start = time.time()
+        for offset in range(0, len(response), chunk_size):
+            os.write(self._master, response[offset:offset + chunk_size])
+            delay = start + self._wire_time(offset + chunk_size) - time.time()
+            if delay > 0:
+                time.sleep(delay)
+
+    def _users(self):
+        return sorted(user_id for (user_id, data_ids) in self._album.items()\
+                      if data_ids)
+
+    def _get_version(self, data):
+        (major, minor, release, revision) = EMULATOR_VERSION
+        self._send_response(RESPONSE_CODE_NORMAL,\
+                    EMULATOR_MODEL + pack('<BBBI', major, minor, release, revision))
+
+    def _set_camera_angle(self, data):
+        (camera_angle,) = unpack('<B', data)
+        if camera_angle > HVC_CAM_ANGLE_270:
+            return self._send_response(RESPONSE_CODE_INVALID_CMD)
+        self.camera_angle = camera_angle
+        self._send_response(RESPONSE_CODE_NORMAL)
+
+    def _get_camera_angle(self, data):
+        self._send_response(RESPONSE_CODE_NORMAL, pack('<B', self.camera_angle))
+
+    def _execute(self, data):
+        (exec_func, out_img_type) = unpack('<HB', data)
+        if exec_func & ~EX_ALL or out_img_type not in \
+                (OUT_IMG_TYPE_NONE, OUT_IMG_TYPE_QVGA, OUT_IMG_TYPE_QQVGA):
+            return self._send_response(RESPONSE_CODE_INVALID_CMD)
+        if self.execute_time > 0:
+            time.sleep(self.execute_time)
+
+        response = self.scene.next_frame(exec_func, self._users())
+        if out_img_type != OUT_IMG_TYPE_NONE:
+            (width, height) = IMAGE_SIZES[out_img_type]
+            response += pack('<HH', width, height)\
+                      + self.scene.make_image(width, height)
+        self._send_response(RESPONSE_CODE_NORMAL, response)
+
+    def _set_threshold(self, data):
+        threshold = unpack('<HHHH', data)
+        if not all(1 <= t <= 1000 for t in threshold[:3])\
+           or threshold[3] > 1000:
+            return self._send_response(RESPONSE_CODE_INVALID_CMD)
+        self.threshold = threshold
+        self._send_response(RESPONSE_CODE_NORMAL)
+
+    def _get_threshold(self, data):
+        self._send_response(RESPONSE_CODE_NORMAL, pack('<HHHH', *self.threshold))
+
+    def _set_detection_size(self, data):
+        size = unpack('<HHHHHH', data)
+        for i in range(0, 6, 2):
+            if not 20 <= size[i] <= size[i + 1] <= 8192:
+                return self._send_response(RESPONSE_CODE_INVALID_CMD)
+        self.detection_size = size
+        self._send_response(RESPONSE_CODE_NORMAL)
+
+    def _get_detection_size(self, data):
+        self._send_response(RESPONSE_CODE_NORMAL,\
+                            pack('<HHHHHH', *self.detection_size))
+
+    def _set_face_angle(self, data):
+        (yaw_angle, roll_angle) = unpack('<BB', data)
+        if yaw_angle > HVC_FACE_ANGLE_YAW_90 or roll_angle > HVC_FACE_ANGLE_ROLL_45:
+            return self._send_response(RESPONSE_CODE_INVALID_CMD)
+        self.face_angle = (yaw_angle, roll_angle)
+        self._send_response(RESPONSE_CODE_NORMAL)
+
+    def _get_face_angle(self, data):
+        self._send_response(RESPONSE_CODE_NORMAL, pack('<BB', *self.face_angle))
+
+    def _set_uart_baudrate(self, data):
+        (baud_index,) = unpack('<B', data)
+        if baud_index >= len(AVAILABLE_BAUD):
+            return self._send_response(RESPONSE_CODE_INVALID_CMD)
+        # Responds in the current baudrate, then changes it.
+        self._send_response(RESPONSE_CODE_NORMAL)
+        self._baudrate = AVAILABLE_BAUD[baud_index]
+
+    def _register_data(self, data):
+        (user_id, data_id) = unpack('<HB', data)
+        if user_id > MAX_USER_ID or data_id > MAX_DATA_ID:
+            return self._send_response(RESPONSE_CODE_INVALID_CMD)
+        face_count = len(self.scene.faces)
+        if face_count == 0:
+            return self._send_response(RESPONSE_CODE_NO_FACE)
+        if face_count > 1:
+            return self._send_response(RESPONSE_CODE_PLURAL_FACE)
+
+        self._album.setdefault(user_id, set()).add(data_id)
+        (width, height) = REGISTER_IMAGE_SIZE
+        self._send_response(RESPONSE_CODE_NORMAL, pack('<HH', width, height)\
+                            + self.scene.make_image(width, height))
+
+    def _delete_data(self, data):
+        (user_id, data_id) = unpack('<HB', data)
+        if user_id > MAX_USER_ID or data_id > MAX_DATA_ID:
+            return self._send_response(RESPONSE_CODE_INVALID_CMD)
+        self._album.get(user_id, set()).discard(data_id)
+        self._send_response(RESPONSE_CODE_NORMAL)
+
+    def _delete_user(self, data):
+        (user_id,) = unpack('<H', data)
+        if user_id > MAX_USER_ID:
+            return self._send_response(RESPONSE_CODE_INVALID_CMD)
+        self._album.pop(user_id, None)
+        self._send_response(RESPONSE_CODE_NORMAL)
+
+    def _delete_all_data(self, data):
+        self._album = {}
+        self._send_response(RESPONSE_CODE_NORMAL)
+
+    def _get_user_data(self, data):
+        (user_id,) = unpack('<H', data)
+        if user_id > MAX_USER_ID:
+            return self._send_response(RESPONSE_CODE_INVALID_CMD)
+        registration_info = 0
+        for data_id in self._album.get(user_id, ()):
+            registration_info |= 1 << data_id
+        self._send_response(RESPONSE_CODE_NORMAL, pack('<H', registration_info))
+
+    def _save_album(self, data):
+        users = self._users()
+        album = [_album_header.pack(len(users))]
+        for user_id in users:
+            registration_info = 0
+            for data_id in self._album[user_id]:
+                registration_info |= 1 << data_id
+            album.append(_album_entry.pack(user_id, registration_info))
+        self._send_response(RESPONSE_CODE_NORMAL, b''.join(album))
+
+    def _load_album(self, data):
+        (album_len,) = unpack_from('<I', data)
+        album = data[4:]
+        (user_count,) = _album_header.unpack_from(album)
+        if len(album) != album_len or \
+           album_len != _album_header.size + _album_entry.size * user_count:
+            return self._send_response(RESPONSE_CODE_INVALID_CMD)
+        self._album = {}
+        for i in range(user_count):
+            (user_id, registration_info) = _album_entry.unpack_from(album,\
+                                _album_header.size + _album_entry.size * i)
+            self._album[user_id] = set(data_id for data_id in range(MAX_DATA_ID + 1)\
+                                       if registration_info & (1 << data_id))
+        self._send_response(RESPONSE_CODE_NORMAL)
+
+    def _save_album_to_flash(self, data):
+        self._flash_album = dict((user_id, set(data_ids))\
+                                 for (user_id, data_ids) in self._album.items())
+        self._send_response(RESPONSE_CODE_NORMAL)
+
+    def _reformat_flash(self, data):
+        self._flash_album = {}
+        self._send_response(RESPONSE_CODE_NORMAL)
+
+
+def main():
+    """Runs the emulator until Ctrl-C.
+
+    Usage: hvc_p2_emulator.py [face_count [body_count [hand_count]]]
+    """
+    counts = [int(arg) for arg in sys.argv[1:4]]
+    counts += [1] * (3 - len(counts))
+    (face_count, body_count, hand_count) = counts
+    emulator = HVCP2Emulator(body_count, hand_count, face_count)
+    print 'HVC-P2 emulator is running on {0}'.format(emulator.start())
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    emulator.stop()
+    print 'Commands: {0}  Sync errors: {1}'.format(emulator.command_count,\
+                                                   emulator.sync_errors)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+﻿# ---------------------------------------------------------------------------
+# Copyright 2017-2018  OMRON Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ---------------------------------------------------------------------------
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import threading
+import Queue
+import p2def
+from serial_connector import SerialConnector
+from hvc_p2_api import HVCP2Api
+from hvc_tracking_result import HVCTrackingResult
+from grayscale_image import GrayscaleImage
+from frame_stream import FrameQueue, STREAM_DROP_OLDEST
+
+DEFAULT_TIMEOUT = 30
+DEFAULT_QUEUE_SIZE = 64
+
+# Interval(sec) to reconnect after an error, doubled up to the maximum
+# while the device fails.
+RECONNECT_INTERVAL = 1.0
+MAX_RECONNECT_INTERVAL = 30.0
+
+# Setter methods of HVCP2Api available in 'settings' of camera spec.
+# The device setters return response code, the STB setters return STB code.
+DEVICE_SETTERS = ('set_camera_angle', 'set_threshold', 'set_detection_size',
+                  'set_face_angle')
+STB_SETTERS = ('set_stb_tr_retry_count', 'set_stb_tr_steadiness_param',
+               'set_stb_pe_threshold_use', 'set_stb_pe_angle_use',
+               'set_stb_pe_complete_frame_count', 'set_stb_fr_threshold_use',
+               'set_stb_fr_angle_use', 'set_stb_fr_complete_frame_count',
+               'set_stb_fr_min_ratio')
+
+
+class _Camera(object):
+    """One HVC-P2 device driven by its own thread."""
+    def __init__(self, spec, results):
+        self.camera_id = spec['camera_id']
+        self.port = spec['port']
+        self.baudrate = spec.get('baudrate', p2def.DEFAULT_BAUD)
+        self.timeout = spec.get('timeout', DEFAULT_TIMEOUT)
+        self.settings = spec.get('settings', {})
+        for name in self.settings:
+            if name not in DEVICE_SETTERS and name not in STB_SETTERS:
+                raise ValueError("Invalid setting:{0!r}".format(name))
+
+        connector = spec.get('connector')
+        if connector is None:
+            connector = SerialConnector()
+        self.api = HVCP2Api(connector,\
+                            spec.get('exec_func', p2def.EX_FACE),\
+                            spec.get('use_stb', p2def.USE_STB_ON))
+        self.results = results
+        self.error = None
+        self.frame_count = 0
+        self.error_count = 0
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run,\
+                                  name='hvc-p2-{0}'.format(self.camera_id))
+        self._thread.daemon = True
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+
+    def _connect(self):
+        # The 1st connection. (It should be 9600 baud.)
+        self.api.connect(self.port, p2def.DEFAULT_BAUD, self.timeout)
+        try:
+            if self.baudrate != p2def.DEFAULT_BAUD:
+                ret = self.api.set_uart_baudrate(self.baudrate)
+                if ret != p2def.RESPONSE_CODE_NORMAL:
+                    raise IOError("Error: Invalid set_uart_baudrate(). "\
+                                  "response_code:{0}".format(ret))
+                self.api.disconnect()
+                # The 2nd connection in specified baudrate
+                self.api.connect(self.port, self.baudrate, self.timeout)
+        except Exception:
+            # Closes the port opened before the failure.
+            try:
+                self.api.disconnect()
+            except Exception:
+                pass
+            raise
+
+    def _configure(self):
+        for (name, args) in sorted(self.settings.items()):
+            if name in STB_SETTERS and not self.api.use_stb:
+                continue
+            ret = getattr(self.api, name)(*args)
+            if ret != 0:
+                raise ValueError("Error: Invalid parameter. {0}().".format(name))
+
+    def _run(self):
+        interval = RECONNECT_INTERVAL
+        while not self._stop_event.is_set():
+            try:
+                self._connect()
+            except Exception as e:
+                self.error = e
+            else:
+                interval = RECONNECT_INTERVAL
+                try:
+                    self._execute()
+                except Exception as e:
+                    self.error = e
+                finally:
+                    self._disconnect()
+
+            # Reconnects after the interval unless stopped.
+            if self._stop_event.wait(interval):
+                break
+            interval = min(interval * 2, MAX_RECONNECT_INTERVAL)
+
+    def _execute(self):
+        self._configure()
+        img = GrayscaleImage()
+        while not self._stop_event.is_set():
+            tracking_result = HVCTrackingResult()
+            (res_code, stb_return) = self.api.execute(\
+                         p2def.OUT_IMG_TYPE_NONE, tracking_result, img)
+            if res_code != p2def.RESPONSE_CODE_NORMAL or stb_return < 0:
+                self.error_count += 1
+                continue
+            self.frame_count += 1
+            self.results.put_frame((self.camera_id, time.time(),\
+                                    tracking_result))
+
+    def _disconnect(self):
+        try:
+            if self.baudrate != p2def.DEFAULT_BAUD:
+                self.api.set_uart_baudrate(p2def.DEFAULT_BAUD)
+        except Exception:
+            pass
+        finally:
+            self.api.disconnect()
+
+
+class HVCP2Manager(object):
+    """Drives many HVC-P2 devices concurrently.
+
+    Each device has its own HVCP2Api(SerialConnector and STB handle) and
+    thread, so a slow port does not delay the others. A device is
+    reconnected after an error with the interval doubled from
+    RECONNECT_INTERVAL up to MAX_RECONNECT_INTERVAL. The results of all
+    devices are merged into one queue as
+    (camera_id, timestamp, HVCTrackingResult) tuples.
+    When the queue is full the oldest result is dropped.
+
+    Camera spec (dict):
+        camera_id: any hashable id of the camera (required)
+        port:      COM port e.g. '/dev/ttyACM0' (required)
+        baudrate:  baudrate (default: 9600)
+        timeout:   timeout period(sec) for serial communication (default: 30)
+        exec_func: functions flag to be executed (default: EX_FACE)
+        use_stb:   use STB library (default: USE_STB_ON)
+        connector: connector (default: SerialConnector())
+        settings:  dict of HVCP2Api setter name and its arguments.
+                   e.g. {'set_threshold': (500, 500, 500, 500),
+                         'set_stb_tr_retry_count': (2,)}
+    """
+    def __init__(self, camera_specs, queue_size=DEFAULT_QUEUE_SIZE):
+        if queue_size < 1:
+            raise ValueError("Invalid queue_size:{0!r}".format(queue_size))
+        self._results = FrameQueue(queue_size, STREAM_DROP_OLDEST)
+        self._cameras = [_Camera(spec, self._results) for spec in camera_specs]
+        ids = [c.camera_id for c in self._cameras]
+        if len(set(ids)) != len(ids):
+            raise ValueError("Duplicated camera_id.")
+
+    def start(self):
+        """Connects to all devices and starts execution."""
+        for camera in self._cameras:
+            camera.start()
+
+    def stop(self, timeout=None):
+        """Stops execution and disconnects all devices."""
+        for camera in self._cameras:
+            camera.stop()
+        for camera in self._cameras:
+            camera.join(timeout)
+
+    def get(self, timeout=None):
+        """Gets the next result of any device.
+
+        Returns:
+            tuple of (camera_id, timestamp, tracking_result),
+            or None if timeout.
+        """
+        try:
+            return self._results.get(True, timeout)
+        except Queue.Empty:
+            return None
+
+    def status(self):
+        """Gets the status of every device.
+
+        Returns:
+            dict of camera_id to tuple of (frame_count, error_count, error)
+                frame_count (int): number of frames put into the queue
+                error_count (int): number of frames with an error response
+                                   code or STB error
+                error (Exception): last exception (None: no exception)
+        """
+        return dict((c.camera_id, (c.frame_count, c.error_count, c.error))\
+                    for c in self._cameras)
+
+    @property
+    def dropped(self):
+        """Number of results dropped since the queue was full."""
+        return self._results.dropped
+
+if __name__ == '__main__':
+    pass
@@ -22,6 +22,8 @@ from hvc_result import HVCResult
 from serial_connector import SerialConnector
 from hvc_result import HVCResult
 from grayscale_image import GrayscaleImage
+from command_metrics import clock
+from device_config import DeviceConfig
 
 RESPONSE_HEADER_SIZE = 6
 SYNC_CODE = 0xFE
@@ -57,26 +59,85 @@ HVC_CMD_HDR_SAVE_ALBUM_ON_FLASH = b'\xFE\x22\x00\x00'
 HVC_CMD_HDR_REFORMAT_FLASH      = b'\xFE\x30\x00\x00'
 
 
+class LinkError(Exception):
+    """Communication error on the serial link, i.e. invalid sync code or
+    not enough response size(timeout)."""
+    pass
+
+
 class HVCP2Wrapper(object):
     """HVC-P2(B5T-007001) command wrapper class.
 
     This class provides all commands of HVC-P2.
     """
-    __slots__ = ['_connector']
+    __slots__ = ['_connector', '_prefetched_cmd', '_prefetched_time',\
+                 '_executed_func', '_recorder', '_metrics', '_baudrate',\
+                 '_config']
     def __init__(self, connector):
         self._connector = connector
 
+        # Shadow copy of the device configuration applied or read.
+        # (name: tuple of values)
+        self._config = {}
+        self._recorder = None
+        self._metrics = None
+        self._baudrate = None
+
+        # Execute command already sent for the next frame (pipelining)
+        self._prefetched_cmd = None
+        self._prefetched_time = 0
+
+        # Functions executed on the frame of the last execute()
+        self._executed_func = EX_NONE
+
     def connect(self, com_port, baudrate, timeout):
         """Connects to HVC-P2 by COM port via USB or UART interface."""
         if baudrate not in AVAILABLE_BAUD:
             raise ValueError("Invalid baudrate:{0!r}".format(baudrate))
 
+        self._baudrate = baudrate
+        self._config = {}
         return self._connector.connect(com_port, baudrate, timeout)
 
+    def set_recorder(self, recorder):
+        """Sets the recorder of raw commands and responses(None: no recording)."""
+        self._recorder = recorder
+
+    def set_metrics(self, metrics):
+        """Sets the metrics of commands(None: no measurement)."""
+        self._metrics = metrics
+
     def disconnect(self):
         """Disconnects to HVC-P2."""
+        self._drain_prefetched_response()
+        self._config = {}
         return self._connector.disconnect()
 
+    def invalidate_config(self):
+        """Discards the shadow copy of the device configuration."""
+        self._config = {}
+
+    def _set_config(self, name, value, cmd):
+        """Sends the set command unless the value is already applied."""
+        if self._config.get(name) == value:
+            return 0x00
+        self._config.pop(name, None)
+        (response_code, data_len, data) = self._send_command(cmd)
+        if response_code == 0x00:
+            self._config[name] = value
+        return response_code
+
+    def _get_config(self, name, cmd, fmt):
+        """Gets the values from the shadow copy or by the get command."""
+        value = self._config.get(name)
+        if value is not None:
+            return (0x00, value)
+        (response_code, data_len, data) = self._send_command(cmd)
+        if response_code == 0x00:
+            value = unpack_from(fmt, data)
+            self._config[name] = value
+        return (response_code, value)
+
     def get_version(self):
         """Gets the device's model name, version and revision."""
         cmd = HVC_CMD_HDR_GETVERSION
@@ -92,16 +153,15 @@ class HVCP2Wrapper(object):
     def set_camera_angle(self, camera_angle):
         """Sets camera angle."""
         cmd = HVC_CMD_HDR_SET_CAMERA_ANGLE + pack('<B', camera_angle)
-        (response_code, data_len, data) = self._send_command(cmd)
-        return response_code
+        return self._set_config('camera_angle', (camera_angle,), cmd)
 
     def get_camera_angle(self):
         """Gets camera angle."""
         cmd = HVC_CMD_HDR_GET_CAMERA_ANGLE
-        (response_code, data_len, data) = self._send_command(cmd)
+        (response_code, value) = self._get_config('camera_angle', cmd, '<B')
 
         if response_code == 0x00: # Success
-            (camera_angle,) = unpack('<B', data)
+            (camera_angle,) = value
         else: #error
             camera_angle = None
         return (response_code, camera_angle)
@@ -114,17 +174,42 @@ class HVCP2Wrapper(object):
             exec_func |= EX_FACE + EX_DIRECTION
 
         cmd = HVC_CMD_HDR_EXECUTE + pack('<H', exec_func) + pack('<B', out_img_type)
-        (response_code, data_len, data) = self._send_command(cmd)
+        if getattr(self._connector, 'pipelined', False):
+            # The prefetched Execute command of other functions is used as
+            # well (e.g. with ExecFuncScheduler) if the image type is the
+            # same, and its response is decoded by its functions.
+            image_param = cmd[-1:]
+            (cmd, (response_code, data_len, data)) =\
+                self._send_command_pipelined(cmd, lambda prefetched_cmd:\
+                        prefetched_cmd.startswith(HVC_CMD_HDR_EXECUTE) and\
+                        prefetched_cmd[-1:] == image_param)
+            (exec_func,) = unpack_from('<H', cmd, len(HVC_CMD_HDR_EXECUTE))
+        else:
+            (response_code, data_len, data) = self._send_command(cmd)
+        self._executed_func = exec_func
 
         if response_code == 0x00: #Success
+            if self._metrics is not None:
+                start = clock()
             rc = frame_result.read_from_buffer(exec_func, data_len, data)
             if out_img_type != OUT_IMG_TYPE_NONE:
                 (width, height) = unpack_from('<HH', data, rc)
                 img.width = width
                 img.height = height
                 img.data = data[rc + 4:]
+            if self._metrics is not None:
+                self._metrics.observe_decode(ord(cmd[1]), clock() - start)
         return response_code
 
+    def get_executed_func(self):
+        """Gets the functions executed on the frame of the last execute().
+
+        With the pipelining this may differ from the functions specified,
+        since the response is of the Execute command prefetched by the
+        previous call.
+        """
+        return self._executed_func
+
     def set_threshold(self, body_thresh, hand_thresh, face_thresh,\
                             recognition_thresh):
         """Sets the thresholds value for Human body detection, Hand detection,
@@ -133,19 +218,18 @@ class HVCP2Wrapper(object):
         cmd = HVC_CMD_HDR_SET_THRESHOLD\
             + pack('<HHHH',body_thresh, hand_thresh, face_thresh, recognition_thresh)
 
-        response_code, data_len, data = self._send_command(cmd)
-        return response_code
+        return self._set_config('threshold', (body_thresh, hand_thresh,\
+                                              face_thresh, recognition_thresh), cmd)
 
     def get_threshold(self):
         """Gets the thresholds value for Human body detection, Hand detection,
            Face detection and/or Recongnition.
         """
         cmd = HVC_CMD_HDR_GET_THRESHOLD
-        (response_code, data_len, data) = self._send_command(cmd)
+        (response_code, value) = self._get_config('threshold', cmd, '<HHHH')
 
         if response_code == 0x00: # Success
-            (body_thresh, hand_thresh, face_thresh, recognition_thresh)\
-             = unpack_from('<HHHH', data)
+            (body_thresh, hand_thresh, face_thresh, recognition_thresh) = value
         else: #error
             (body_thresh, hand_thresh, face_thresh, recognition_thresh)\
              = None, None, None, None
@@ -162,20 +246,22 @@ class HVCP2Wrapper(object):
             pack('<HHHHHH', min_body, max_body,\
                             min_hand, max_hand,\
                             min_face, max_face)
-        (response_code, data_len, data) = self._send_command(cmd)
-        return response_code
+        return self._set_config('detection_size', (min_body, max_body,\
+                                                   min_hand, max_hand,\
+                                                   min_face, max_face), cmd)
 
     def get_detection_size(self):
         """Gets the detection size for Human body detection, Hand detection
            and/or Face detection
         """
         cmd = HVC_CMD_HDR_GET_DETECTION_SIZE
-        (response_code, data_len, data) = self._send_command(cmd)
+        (response_code, value) = self._get_config('detection_size', cmd,\
+                                                  '<HHHHHH')
 
         if response_code == 0x00: # Success
              (min_body, max_body,\
               min_hand, max_hand,\
-              min_face, max_face) = unpack_from('<HHHHHH', data)
+              min_face, max_face) = value
         else: #error
              (min_body, max_body,\
               min_hand, max_hand,\
@@ -190,16 +276,15 @@ class HVCP2Wrapper(object):
            range for Face detection.
         """
         cmd = HVC_CMD_HDR_SET_FACE_ANGLE + pack('<BB', yaw_angle, roll_angle)
-        (response_code, data_len, data) = self._send_command(cmd)
-        return response_code
+        return self._set_config('face_angle', (yaw_angle, roll_angle), cmd)
 
     def get_face_angle(self):
         """Gets the face angle range for Face detection."""
         cmd = HVC_CMD_HDR_GET_FACE_ANGLE
-        (response_code, data_len, data) = self._send_command(cmd)
+        (response_code, value) = self._get_config('face_angle', cmd, '<BB')
 
         if response_code == 0x00: # Success
-             (yaw_angle, roll_angle) = unpack_from('<BB', data)
+             (yaw_angle, roll_angle) = value
         else: #error
              (yaw_angle, roll_angle) = None, None
         return (response_code, yaw_angle, roll_angle)
@@ -211,9 +296,39 @@ class HVCP2Wrapper(object):
 
         baud_index = AVAILABLE_BAUD.index(baudrate)
         cmd = HVC_CMD_HDR_SET_UART_BAUDRATE + pack('<B', baud_index)
+        self._config = {}
         (response_code, data_len, data) = self._send_command(cmd)
         return response_code
 
+    def apply_config(self, config):
+        """Applies the configuration items different from the shadow copy."""
+        if config.camera_angle is not None:
+            camera_angle = (config.camera_angle,)
+        else:
+            camera_angle = None
+        for (value, setter) in ((camera_angle, self.set_camera_angle),\
+                                (config.threshold, self.set_threshold),\
+                                (config.detection_size, self.set_detection_size),\
+                                (config.face_angle, self.set_face_angle)):
+            if value is not None:
+                response_code = setter(*value)
+                if response_code != 0x00:
+                    return response_code
+        return 0x00
+
+    def get_config(self):
+        """Gets the whole configuration."""
+        config = DeviceConfig()
+        for (name, getter) in (('camera_angle', self.get_camera_angle),\
+                               ('threshold', self.get_threshold),\
+                               ('detection_size', self.get_detection_size),\
+                               ('face_angle', self.get_face_angle)):
+            ret = getter()
+            if ret[0] != 0x00:
+                return (ret[0], None)
+            setattr(config, name, ret[1] if len(ret) == 2 else ret[1:])
+        return (0x00, config)
+
     def register_data(self, user_id, data_id, img):
         """Registers data for Recognition and gets a normalized image."""
         cmd = HVC_CMD_HDR_REGISTER_DATA + pack('<HB', user_id, data_id)
@@ -281,33 +396,130 @@ class HVCP2Wrapper(object):
         (response_code, data_len, data) = self._send_command(cmd)
         return response_code
 
+    def _send_command_pipelined(self, data, accepts=None):
+        """Sends the command and receives the response like _send_command(),
+        and sends the same command again for the next call before returning.
+
+        The response of the prefetched command is used by the next call with
+        the same command or a command for which accepts(prefetched command)
+        is True, i.e. the response is one frame older than the call.
+        The prefetched command older than max_prefetch_age(sec) of the
+        connector is not used, and the command is sent again.
+
+        Returns:
+            tuple of (command, response)
+                command (str): command of the response
+                response (tuple): same as _send_command()
+        """
+        command = self._prefetched_cmd
+        max_age = getattr(self._connector, 'max_prefetch_age', None)
+        if command is not None and\
+           (command == data or (accepts is not None and accepts(command))) and\
+           (max_age is None or clock() - self._prefetched_time <= max_age):
+            self._prefetched_cmd = None
+            response = self._receive_response()
+        else:
+            command = data
+            response = self._send_command(data)
+
+        self._send_data(data)
+        self._prefetched_cmd = data
+        self._prefetched_time = clock()
+        return (command, response)
+
+    def _drain_prefetched_response(self):
+        """Receives and discards the response of the prefetched command."""
+        if self._prefetched_cmd is not None:
+            self._prefetched_cmd = None
+            try:
+                self._receive_response()
+            except Exception:
+                pass
+
     def _send_command(self, data):
+        self._drain_prefetched_response()
+        self._connector.clear_recieve_buffer()
+        if self._metrics is not None:
+            return self._send_command_measured(data)
+        self._send_data(data)
+        return self._receive_response()
+
+    def _send_command_measured(self, data):
+        """Sends the command and receives the response like _send_command(),
+        and records the times to the metrics.
+
+        LinkError is recorded as a failed command and raised again.
+        """
+        timestamps = [clock()]
+        self._send_data(data)
+        timestamps.append(clock())
+        try:
+            (response_code, data_len, response) =\
+                                        self._receive_response(timestamps)
+        except LinkError:
+            self._metrics.observe_link_error(ord(data[1]), len(data))
+            raise
+        timestamps.append(clock())
+
+        bytes_in = RESPONSE_HEADER_SIZE + (data_len if response is not None else 0)
+        self._metrics.observe_command(ord(data[1]), self._baudrate, response_code,\
+                                      len(data), bytes_in, *timestamps)
+        return (response_code, data_len, response)
+
+    def _send_data(self, data):
+        if self._recorder is not None:
+            self._recorder.record_command(data)
+        self._connector.send_data(data)
+
+    def _receive_response(self, timestamps=None):
+        # Raw bytes received for the recorder
+        received = []
+        def _receive(size):
+            buf = self._connector.receive_data(size)
+            if self._recorder is not None:
+                received.append(str(buf))
+            return buf
+
         def _receive_header():
-            buf = self._connector.receive_data(RESPONSE_HEADER_SIZE)
+            if timestamps is None:
+                buf = _receive(RESPONSE_HEADER_SIZE)
+            else:
+                # Receives the first byte separately to measure the time.
+                buf = _receive(1)
+                timestamps.append(clock())
+                buf += _receive(RESPONSE_HEADER_SIZE - 1)
             if len(buf) != RESPONSE_HEADER_SIZE:
-                raise Exception("Response header size is not enough.")
+                raise LinkError("Response header size is not enough.")
 
             (sync_code,) = unpack_from('<B', buf, 0)
             if sync_code != SYNC_CODE:
-                raise Exception("Invalid Sync code.")
+                raise LinkError("Invalid Sync code.")
 
             (response_code,) = unpack_from('<B', buf, 1)
             (data_len,)      = unpack_from('<I', buf, 2)
             return (response_code, data_len)
 
         def _receive_data(data_len):
-            buf = self._connector.receive_data(data_len)
+            buf = _receive(data_len)
             if len(buf) != data_len:
-                raise Exception("Response data size is not enough.")
+                raise LinkError("Response data size is not enough.")
             return buf
 
-        self._connector.clear_recieve_buffer()
-        self._connector.send_data(data)
-        (response_code, data_len) = _receive_header()
-        if response_code == 0x00 : # Success
-            data = _receive_data(data_len)
-        else: # error
-            data = None
+        try:
+            (response_code, data_len) = _receive_header()
+            if response_code == 0x00 : # Success
+                data = _receive_data(data_len)
+            else: # error
+                data = None
+        except LinkError:
+            # Records the bytes received until the error to keep the
+            # commands and responses paired in the log.
+            if self._recorder is not None:
+                self._recorder.record_response(b''.join(received))
+            raise
+
+        if self._recorder is not None:
+            self._recorder.record_response(b''.join(received))
         return (response_code, data_len, data)
 
 if __name__ == '__main__':
@@ -17,8 +17,73 @@
 # -*- coding: utf-8 -*-
 
 from struct import *
+from ctypes import addressof, memmove
 from p2def import *
 from okao_result import *
+from hvc_result_c import C_FRAME_RESULT, C_FRAME_RESULT_MAX
+
+# Face record layout following the detection part (X, Y, Size, Confidence)
+# in the response of Execute command.
+#   (execute function flag, struct format, attribute name, result class)
+FACE_RECORD_LAYOUT = ((EX_DIRECTION,   'hhhH',   'direction',   DirectionResult),
+                      (EX_AGE,         'bh',     'age',         AgeResult),
+                      (EX_GENDER,      'bh',     'gender',      GenderResult),
+                      (EX_GAZE,        'bb',     'gaze',        GazeResult),
+                      (EX_BLINK,       'hh',     'blink',       BlinkResult),
+                      (EX_EXPRESSION,  'bbbbbb', 'expression',  ExpressionResult),
+                      (EX_RECOGNITION, 'hh',     'recognition', RecognitionResult))
+
+FACE_FUNC_MASK = EX_DIRECTION | EX_AGE | EX_GENDER | EX_GAZE | EX_BLINK\
+               | EX_EXPRESSION | EX_RECOGNITION
+
+DETECTION_RECORD_FORMAT = 'HHHH'
+
+_count_struct = Struct('<BBBx')
+_detection_struct = Struct('<' + DETECTION_RECORD_FORMAT)
+_face_decode_plans = {}
+
+# Offsets and capacity of C_FRAME_RESULT for export_to_C_FRAME_RESULT()
+_C_BODYS_OFFSET = C_FRAME_RESULT.bodys.offset
+_C_FACES_OFFSET = C_FRAME_RESULT.faces.offset
+_C_ZERO2 = (0, 0)
+_C_EST_NOT_POSSIBLE = (EST_NOT_POSSIBLE, 0)
+_C_RECOG_NOT_POSSIBLE = (RECOG_NOT_POSSIBLE, 0)
+_C_ZERO4 = (0, 0, 0, 0)
+_C_ZERO6 = (0, 0, 0, 0, 0, 0)
+
+def _write_c_ints(frame_result, offset, values):
+    """Writes values to the c_int array at offset in frame_result at once."""
+    buf = pack('=%di' % len(values), *values)
+    memmove(addressof(frame_result) + offset, buf, len(buf))
+
+def get_face_decode_plan(exec_func):
+    """Gets the compiled decode plan of one face record.
+
+    The plan is compiled once per combination of facial estimation flags
+    and cached.
+
+    Args:
+        exec_func (int): functions flag executed
+
+    Returns:
+        tuple of (record, fields)
+            record (Struct): struct of one whole face record
+            fields (tuple): tuple of (attribute name, result class, start, end)
+                            i.e. the result is class(*values[start:end])
+    """
+    exec_func &= FACE_FUNC_MASK
+    plan = _face_decode_plans.get(exec_func)
+    if plan is None:
+        fmt = '<' + DETECTION_RECORD_FORMAT
+        fields = []
+        for (flag, field_fmt, name, cls) in FACE_RECORD_LAYOUT:
+            if exec_func & flag:
+                start = len(fmt) - 1
+                fmt += field_fmt
+                fields.append((name, cls, start, start + len(field_fmt)))
+        plan = (Struct(fmt), tuple(fields))
+        _face_decode_plans[exec_func] = plan
+    return plan
 
 
 class HVCResult(object):
@@ -30,134 +95,74 @@ class HVCResult(object):
         self.hands = []
 
     def read_from_buffer(self, exec_func, data_len, data):
-        cur = 0
-        body_count, = unpack_from('B',data, cur)
-        hand_count, = unpack_from('B',data, cur+1)
-        face_count, = unpack_from('B',data, cur+2)
-        cur+=4  # for reserved
+        (body_count, hand_count, face_count) = _count_struct.unpack_from(data, 0)
+        cur = _count_struct.size
 
         # Human body detection
+        unpack_detection = _detection_struct.unpack_from
         for i in range(body_count):
-            x, y, size, conf = unpack_from('<HHHH', data, cur)
-            res = DetectionResult(x,y,size,conf)
-            self.bodies.append(res)
+            self.bodies.append(DetectionResult(*unpack_detection(data, cur)))
             cur += 8
 
         # Hand detection
         for i in range(hand_count):
-            x, y, size, conf = unpack_from('<HHHH', data, cur)
-            res = DetectionResult(x,y,size,conf)
-            self.hands.append(res)
+            self.hands.append(DetectionResult(*unpack_detection(data, cur)))
             cur += 8
 
-        # Face detection
+        # Face detection and facial estimations
+        (record, fields) = get_face_decode_plan(exec_func)
+        unpack_face = record.unpack_from
         for i in range(face_count):
-            x, y, size, conf = unpack_from('<HHHH', data, cur)
-            res = FaceResult(x,y,size,conf)
-            cur +=8
-
-            # Face direction
-            if exec_func & EX_DIRECTION:
-                LR, UD, roll, conf = unpack_from('<hhhH', data, cur)
-                res.direction = DirectionResult(LR, UD, roll, conf)
-                cur += 8
-
-            # Age estimation
-            if exec_func & EX_AGE:
-                age, conf = unpack_from('<bh', data, cur)
-                res.age = AgeResult(age,conf)
-                cur += 3
-
-            # Gender estimation
-            if exec_func & EX_GENDER:
-                gen, conf = unpack_from('<bh', data, cur)
-                res.gender = GenderResult(gen,conf)
-                cur += 3
-
-            # Gaze estimation
-            if exec_func & EX_GAZE:
-                LR, UD = unpack_from('<bb', data, cur)
-                res.gaze = GazeResult(LR,UD)
-                cur += 2
-
-            # Blink estimation
-            if exec_func & EX_BLINK:
-                L, R = unpack_from('<hh', data, cur)
-                res.blink = BlinkResult(L, R)
-                cur += 4
-
-            # Expression estimation
-            if exec_func & EX_EXPRESSION:
-                neu, hap, sur, ang, sad, neg = unpack_from('<bbbbbb', data, cur)
-                res.expression = ExpressionResult(neu, hap, sur, ang, sad, neg)
-                cur += 6
-
-            # Face recognition
-            if exec_func & EX_RECOGNITION:
-                uid, score = unpack_from('<hh', data, cur)
-                res.recognition = RecognitionResult(uid, score)
-                cur += 4
-
+            v = unpack_face(data, cur)
+            res = FaceResult(v[0], v[1], v[2], v[3])
+            for (name, cls, start, end) in fields:
+                setattr(res, name, cls(*v[start:end]))
             self.faces.append(res)
+            cur += record.size
         return cur
 
     def export_to_C_FRAME_RESULT(self, frame_result):
-        # Human body detection result
-        frame_result.bodys.nCount = len(self.bodies)
-        for i in range(len(self.bodies)):
-            src_body = self.bodies[i]
-            dst_body = frame_result.bodys.body[i]
+        """Exports the result to C_FRAME_RESULT for STB library.
 
-            dst_body.center.nX = src_body.pos_x
-            dst_body.center.nY = src_body.pos_y
-            dst_body.nSize = src_body.size
-            dst_body.nConfidence = src_body.conf
+        Each of the body part and the face part of frame_result is written
+        at once, so frame_result can be reused for every frame.
+        """
+        # Human body detection result
+        bodies = self.bodies[:C_FRAME_RESULT_MAX]
+        values = [len(bodies)]
+        for b in bodies:
+            values += (b.pos_x, b.pos_y, b.size, b.conf)
+        _write_c_ints(frame_result, _C_BODYS_OFFSET, values)
 
         # Face detection result
-        frame_result.faces.nCount = len(self.faces)
-        for i in range(len(self.faces)):
-            src_face = self.faces[i]
-            dst_face = frame_result.faces.face[i]
-
-            dst_face.center.nX = src_face.pos_x
-            dst_face.center.nY = src_face.pos_y
-            dst_face.nSize = src_face.size
-            dst_face.nConfidence = src_face.conf
+        faces = self.faces[:C_FRAME_RESULT_MAX]
+        values = [len(faces)]
+        for f in faces:
+            values += (f.pos_x, f.pos_y, f.size, f.conf)
 
             # Face direction result
-            if src_face.direction is not None:
-                dst_face.direction.nLR = src_face.direction.LR
-                dst_face.direction.nUD = src_face.direction.UD
-                dst_face.direction.nRoll = src_face.direction.roll
-                dst_face.direction.nConfidence = src_face.direction.conf
-            # Age estimation result
-            if src_face.age is not None:
-                dst_face.age.nAge = src_face.age.age
-                dst_face.age.nConfidence = src_face.age.conf
-            # Gender estimation result
-            if src_face.gender is not None:
-                dst_face.gender.nGender = src_face.gender.gender
-                dst_face.gender.nConfidence = src_face.gender.conf
+            d = f.direction
+            values += _C_ZERO4 if d is None else (d.LR, d.UD, d.roll, d.conf)
+            # Age estimation result (not possible if not executed)
+            a = f.age
+            values += _C_EST_NOT_POSSIBLE if a is None else (a.age, a.conf)
+            # Gender estimation result (not possible if not executed)
+            g = f.gender
+            values += _C_EST_NOT_POSSIBLE if g is None else (g.gender, g.conf)
             # Gaze estimation result
-            if src_face.gaze is not None:
-                dst_face.gaze.nLR = src_face.gaze.gazeLR
-                dst_face.gaze.nUD = src_face.gaze.gazeUD
+            g = f.gaze
+            values += _C_ZERO2 if g is None else (g.gazeLR, g.gazeUD)
             # Blink estimation result
-            if src_face.blink is not None:
-                dst_face.blink.nLeftEye = src_face.blink.ratioL
-                dst_face.blink.nRightEye = src_face.blink.ratioR
+            b = f.blink
+            values += _C_ZERO2 if b is None else (b.ratioL, b.ratioR)
             # Expression estimation result
-            if src_face.expression is not None:
-                dst_face.expression.neutral = src_face.expression.neutral
-                dst_face.expression.happiness = src_face.expression.happiness
-                dst_face.expression.surprise = src_face.expression.surprise
-                dst_face.expression.anger = src_face.expression.anger
-                dst_face.expression.sadness = src_face.expression.sadness
-                dst_face.expression.neg_pos = src_face.expression.neg_pos
+            e = f.expression
+            values += _C_ZERO6 if e is None else (e.neutral, e.happiness,\
+                                  e.surprise, e.anger, e.sadness, e.neg_pos)
             # Recognition result
-            if src_face.recognition is not None:
-                dst_face.recognition.nUID = src_face.recognition.uid
-                dst_face.recognition.nScore = src_face.recognition.score
+            r = f.recognition
+            values += _C_RECOG_NOT_POSSIBLE if r is None else (r.uid, r.score)
+        _write_c_ints(frame_result, _C_FACES_OFFSET, values)
 
         return
 
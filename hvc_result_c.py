@@ -18,6 +18,9 @@
 
 from ctypes import *
 
+# Maximum number of bodies/faces in one frame result
+C_FRAME_RESULT_MAX = 35
+
 class C_POINT(Structure):
     _fields_ = [("nX", c_int),
                 ("nY", c_int)]
@@ -91,13 +94,13 @@ class C_FRAME_RESULT_FACE(Structure):
 class C_FRAME_RESULT_BODYS(Structure):
     """One Human body detection result"""
     _fields_ = [("nCount", c_int),
-                ("body", C_FRAME_RESULT_DETECTION * 35)]
+                ("body", C_FRAME_RESULT_DETECTION * C_FRAME_RESULT_MAX)]
 
 
 class C_FRAME_RESULT_FACES(Structure):
     """Face detection and post-processing result (1 frame)"""
     _fields_ = [("nCount", c_int),
-                ("face", C_FRAME_RESULT_FACE * 35)]
+                ("face", C_FRAME_RESULT_FACE * C_FRAME_RESULT_MAX)]
 
 
 class C_FRAME_RESULT(Structure):
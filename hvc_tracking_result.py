@@ -16,10 +16,14 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import abc
+from struct import *
 from hvc_result import *
 from okao_result import *
 from hvc_tracking_result_c import *
 
+_count_struct = Struct('<BBBx')
+_detection_struct = Struct('<' + DETECTION_RECORD_FORMAT)
 
 status_dic = {STB_STATUS_CALCULATING:"CALCULATING",\
               STB_STATUS_COMPLETE   :"COMPLETE",\
@@ -74,34 +78,43 @@ class TrackingRecognitionResult(RecognitionResult):
             str = 'Recognition   Uid:{0} Score:{1} Status:{2}'.format(self.uid,self.score,status_dic[self.tracking_status])
         return str
 
+def _make_tracking_face(exec_func, f):
+    """Makes TrackingFaceResult from one C_FACE of STB output."""
+    tr_f = TrackingFaceResult(f.center.x, f.center.y, f.nSize,\
+                              f.conf, f.nDetectID, f.nTrackingID)
+
+    if exec_func & EX_AGE:
+        age = f.age
+        tr_f.age = TrackingAgeResult(age.status, age.value, age.conf)
+
+    if exec_func & EX_GENDER:
+        g = f.gender
+        tr_f.gender = TrackingGenderResult(g.status, g.value, g.conf)
+
+    if exec_func & EX_RECOGNITION:
+        r = f.recognition
+        tr_f.recognition = TrackingRecognitionResult(r.status, r.value, r.conf)
+    """
+    Note:
+        We do not use the functions(Face direction, Gaze, Blink and
+        Expression estimation) for STBLib.
+        So the part of that functions is not implemented here.
+
+    """
+    return tr_f
+
+def _make_tracking_body(b):
+    """Makes TrackingResult from one C_BODY of STB output."""
+    return TrackingResult(b.center.x, b.center.y, b.nSize,\
+                          b.conf, b.nDetectID, b.nTrackingID)
+
+
 class FaceList(list):
 
     def append_C_FACE_RES35(self, exec_func, face_count, face_res35):
         """Appends the result of STB output to this face list."""
         for i in range(face_count):
-            f = face_res35[i]
-            tr_f = TrackingFaceResult(f.center.x, f.center.y, f.nSize,\
-                                      f.conf, f.nDetectID, f.nTrackingID);
-
-            if exec_func & EX_AGE:
-                age = f.age
-                tr_f.age = TrackingAgeResult(age.status, age.value, age.conf)
-
-            if exec_func & EX_GENDER:
-                g = f.gender
-                tr_f.gender = TrackingGenderResult(g.status, g.value, g.conf)
-
-            if exec_func & EX_RECOGNITION:
-                r = f.recognition
-                tr_f.recognition = TrackingRecognitionResult(r.status, r.value, r.conf)
-            """
-            Note:
-                We do not use the functions(Face direction, Gaze, Blink and
-                Expression estimation) for STBLib.
-                So the part of that functions is not implemented here.
-
-            """
-            self.append(tr_f)
+            self.append(_make_tracking_face(exec_func, face_res35[i]))
 
     def append_direction_list(self, faces):
         for i in range(len(faces)):
@@ -124,10 +137,7 @@ class BodyList(list):
 
     def append_BODY_RES35(self,exec_func, body_count, body_res35):
         for i in range(body_count):
-            b = body_res35[i]
-            tr_b = TrackingResult(b.center.x, b.center.y, b.nSize,\
-                                      b.conf, b.nDetectID, b.nTrackingID);
-            self.append(tr_b)
+            self.append(_make_tracking_body(body_res35[i]))
 
 
 class HandList(list):
@@ -228,8 +238,80 @@ class HVCTrackingResult(object):
         del(self.bodies[:])
         del(self.hands[:])
 
+    def append_STB_RESULT(self, exec_func, face_count, face_res35,\
+                                body_count, body_res35, frame_result,\
+                                frame_func=None):
+        """Appends the result of STB output.
+
+        The results not stabilized by STB library are taken from
+        frame_result only if they were executed on this frame.
+
+        Args:
+            exec_func (int): functions flag of STB library
+            frame_func (int): functions executed on this frame
+                              (default: exec_func)
+        """
+        if frame_func is None:
+            frame_func = exec_func
+        self.faces.append_C_FACE_RES35(exec_func, face_count, face_res35)
+
+        if frame_func & EX_DIRECTION:
+            self.faces.append_direction_list(frame_result.faces)
+
+        if frame_func & EX_GAZE:
+            self.faces.append_gaze_list(frame_result.faces)
+
+        if frame_func & EX_BLINK:
+            self.faces.append_blink_list(frame_result.faces)
+
+        if frame_func & EX_EXPRESSION:
+            self.faces.append_expression_list(frame_result.faces)
+
+        self.bodies.append_BODY_RES35(exec_func, body_count, body_res35)
+        self.hands.append_hand_list(frame_result.hands)
+
+    def read_from_buffer(self, exec_func, data_len, data):
+        """Decodes the response data of Execute command into this result.
+
+        This is used instead of HVCResult and appned_FRAME_RESULT() without
+        STB library, so that the results are created only once.
+        """
+        (body_count, hand_count, face_count) = _count_struct.unpack_from(data, 0)
+        cur = _count_struct.size
+
+        # Human body detection result
+        unpack_detection = _detection_struct.unpack_from
+        for i in range(body_count):
+            (x, y, size, conf) = unpack_detection(data, cur)
+            self.bodies.append(TrackingResult(x, y, size, conf, i,\
+                                              STB_TRID_NOT_TRACKED))
+            cur += _detection_struct.size
+
+        # Hand detection result
+        for i in range(hand_count):
+            (x, y, size, conf) = unpack_detection(data, cur)
+            self.hands.append(TrackingResult(x, y, size, conf, i,\
+                                             STB_TRID_NOT_TRACKED))
+            cur += _detection_struct.size
+
+        # Face detection and facial estimation results
+        (record, fields) = get_face_decode_plan(exec_func)
+        unpack_face = record.unpack_from
+        for i in range(face_count):
+            v = unpack_face(data, cur)
+            face_res = TrackingFaceResult(v[0], v[1], v[2], v[3], i,\
+                                          STB_TRID_NOT_TRACKED)
+            for (name, cls, start, end) in fields:
+                setattr(face_res, name, cls(*v[start:end]))
+            self.faces.append(face_res)
+            cur += record.size
+        return cur
+
     def appned_FRAME_RESULT(self, frame_result):
+        """Appends the result without STB library.
 
+        The facial estimation results of frame_result are shared, not copied.
+        """
         # Body detection result
         for i in range(len(frame_result.bodies)):
             b = frame_result.bodies[i]
@@ -249,39 +331,124 @@ class HVCTrackingResult(object):
             f = frame_result.faces[i]
             face_res = TrackingFaceResult(f.pos_x, f.pos_y, f.size,f.conf,i,\
                                     STB_TRID_NOT_TRACKED)
-            # Face direction result
-            if f.direction is not None:
-                face_res.direction = DirectionResult(f.direction.LR,\
-                                                     f.direction.UD,\
-                                                     f.direction.roll,\
-                                                     f.direction.conf)
-            # Age estimation result
-            if f.age is not None:
-                face_res.age = AgeResult(f.age.age, f.age.conf)
-            # Gender estimation result
-            if f.gender is not None:
-                face_res.gender = GenderResult(f.gender.gender, f.gender.conf)
-            # Gaze estimation result
-            if f.gaze is not None:
-                face_res.gaze = GazeResult(f.gaze.gazeLR, f.gaze.gazeUD)
-            # Blink estimation result
-            if f.blink is not None:
-                face_res.blink = BlinkResult(f.blink.ratioR, f.blink.ratioL)
-            # Expression estimation result
-            if f.expression is not None:
-                face_res.expression = ExpressionResult(f.expression.neutral,\
-                                         f.expression.happiness,\
-                                         f.expression.surprise,\
-                                         f.expression.anger,\
-                                         f.expression.sadness,\
-                                         f.expression.neg_pos)
-            # Face recognition result
-            if f.recognition is not None:
-                 face_res.recognition = RecognitionResult(f.recognition.uid,
-                                                          f.recognition.score)
+            face_res.direction = f.direction
+            face_res.age = f.age
+            face_res.gender = f.gender
+            face_res.gaze = f.gaze
+            face_res.blink = f.blink
+            face_res.expression = f.expression
+            face_res.recognition = f.recognition
 
             # Appends to face list.
             self.faces.append(face_res)
 
+class _STBResultView(object):
+    """Read-only sequence view of the STB output buffer.
+
+    The result object of an item is created only when it is accessed.
+    The view is valid until the next execution since the buffer is reused.
+    """
+    __metaclass__ = abc.ABCMeta
+    __slots__ = ['_count', '_res', '_items']
+    def __init__(self, count=0, res=None):
+        self._count = count
+        self._res = res
+        self._items = [None] * count
+
+    def __len__(self):
+        return self._count
+
+    def _check_index(self, i):
+        if i < 0:
+            i += self._count
+        if i < 0 or i >= self._count:
+            raise IndexError('STB result index out of range')
+        return i
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._count))]
+        i = self._check_index(i)
+
+        item = self._items[i]
+        if item is None:
+            item = self._make_item(i)
+            self._items[i] = item
+        return item
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self[i]
+
+    def raw(self, i):
+        """Gets the i-th C structure in the STB output buffer (no copy)."""
+        return self._res[self._check_index(i)]
+
+    @abc.abstractmethod
+    def _make_item(self, i):
+        """Makes the result object of the i-th item."""
+        pass
+
+
+class FaceView(_STBResultView):
+    """Read-only view of the stabilized faces (TrackingFaceResult)."""
+    __slots__ = ['_exec_func', '_frame_faces', '_frame_func']
+    def __init__(self, exec_func=EX_NONE, face_count=0, face_res35=None,\
+                                          frame_faces=(), frame_func=None):
+        _STBResultView.__init__(self, face_count, face_res35)
+        self._exec_func = exec_func
+        self._frame_faces = frame_faces
+        self._frame_func = exec_func if frame_func is None else frame_func
+
+    def _make_item(self, i):
+        tr_f = _make_tracking_face(self._exec_func, self._res[i])
+
+        # The results not stabilized by STB are taken from the frame result
+        # if they were executed on this frame.
+        if i < len(self._frame_faces):
+            f = self._frame_faces[i]
+            frame_func = self._frame_func
+            if frame_func & EX_DIRECTION:
+                tr_f.direction = f.direction
+            if frame_func & EX_GAZE:
+                tr_f.gaze = f.gaze
+            if frame_func & EX_BLINK:
+                tr_f.blink = f.blink
+            if frame_func & EX_EXPRESSION:
+                tr_f.expression = f.expression
+        return tr_f
+
+
+class BodyView(_STBResultView):
+    """Read-only view of the stabilized bodies (TrackingResult)."""
+    __slots__ = []
+    def _make_item(self, i):
+        return _make_tracking_body(self._res[i])
+
+
+class HVCTrackingResultView(HVCTrackingResult):
+    """Class storing tracking result as views of the STB output buffers.
+
+    With STB library, faces and bodies are read-only views and the result
+    objects are created only when they are accessed. Otherwise this is the
+    same as HVCTrackingResult.
+
+    Note:
+        The views are valid until the next execution.
+    """
+    __slots__ = []
+    def clear(self):
+        self.faces = FaceList()
+        self.bodies = BodyList()
+        self.hands = HandList()
+
+    def set_STB_RESULT(self, exec_func, face_count, face_res35,\
+                             body_count, body_res35, frame_result,\
+                             frame_func=None):
+        self.faces = FaceView(exec_func, face_count, face_res35,\
+                              frame_result.faces, frame_func)
+        self.bodies = BodyView(body_count, body_res35)
+        self.hands.append_hand_list(frame_result.hands)
+
 if __name__ == '__main__':
     pass
@@ -0,0 +1,233 @@
+﻿# ---------------------------------------------------------------------------
+# Copyright 2017-2018  OMRON Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ---------------------------------------------------------------------------
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import glob
+import threading
+import Queue
+from PIL import ImageDraw
+from grayscale_image import GrayscaleImage
+
+SINK_FORMAT_MJPEG = 'mjpeg'    # Motion JPEG stream file per segment
+SINK_FORMAT_FRAMES = 'frames'  # Numbered JPEG file per frame
+
+DEFAULT_QUEUE_SIZE = 8
+DEFAULT_SEGMENT_FRAMES = 300
+DEFAULT_JPEG_QUALITY = 75
+
+# Coordinate range of the detection results. (1600x1200 pixels)
+_RESULT_WIDTH = 1600.0
+
+# Gray level of the overlay of faces, bodies and hands.
+_OVERLAY_COLORS = (('faces', 255), ('bodies', 192), ('hands', 128))
+
+
+class ImageSink(object):
+    """Background writer of the output images of execute().
+
+    put() only queues the image (and the rectangles of the result for the
+    overlay), and a worker thread encodes and writes them to rotating
+    segment files. When the queue is full the frame is dropped, so the
+    acquisition loop is never blocked by the encoder.
+
+    Files:
+        SINK_FORMAT_MJPEG:  <prefix>_<segment>.mjpeg
+                            (concatenated JPEG frames, e.g. ffplay -f mjpeg)
+        SINK_FORMAT_FRAMES: <prefix>_<segment>_<frame>.jpg
+
+    Usage:
+        sink = ImageSink('video', overlay=True)
+        while ...:
+            hvc_p2_api.execute(OUT_IMG_TYPE_QVGA, tracking_result, img)
+            sink.put(img, tracking_result)
+        sink.close()
+    """
+    def __init__(self, directory, prefix='hvc', fmt=SINK_FORMAT_MJPEG,\
+                 segment_frames=DEFAULT_SEGMENT_FRAMES, max_segments=0,\
+                 overlay=False, quality=DEFAULT_JPEG_QUALITY,\
+                 queue_size=DEFAULT_QUEUE_SIZE):
+        """Constructor
+
+        Args:
+            directory (str): output directory (created if not exists)
+            prefix (str): prefix of the file names
+            fmt (str): SINK_FORMAT_MJPEG or SINK_FORMAT_FRAMES
+            segment_frames (int): number of frames in one segment
+            max_segments (int): number of segments kept, the older ones are
+                                deleted (0: keeps all)
+            overlay (bool): draws the rectangles of the detection result
+            quality (int): JPEG quality [1 to 95]
+            queue_size (int): maximum number of frames waiting for encoding
+        """
+        if fmt not in (SINK_FORMAT_MJPEG, SINK_FORMAT_FRAMES):
+            raise ValueError("Invalid fmt:{0!r}".format(fmt))
+        if segment_frames < 1:
+            raise ValueError("Invalid segment_frames:{0!r}".format(segment_frames))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self.directory = directory
+        self.prefix = prefix
+        self.fmt = fmt
+        self.segment_frames = segment_frames
+        self.max_segments = max_segments
+        self.overlay = overlay
+        self.quality = quality
+        self.written = 0
+        self.dropped = 0
+        self.error = None
+
+        # The segments written before are deleted first by max_segments.
+        segments = self._existing_segments()
+        self._segment = segments[-1] + 1 if segments else 1
+        self._segment_files = [self._segment_patterns(n) for n in segments]
+        self._frame = 0
+        self._file = None
+        self._queue = Queue.Queue(queue_size)
+        self._worker = threading.Thread(target=self._work, name='hvc-image-sink')
+        self._worker.daemon = True
+        self._worker.start()
+
+    def put(self, img, tracking_result=None):
+        """Queues the image to be written.
+
+        Args:
+            img (GrayscaleImage): output image of execute()
+            tracking_result: result of execute() drawn as the overlay
+
+        Returns:
+            bool: False if the frame is dropped
+        """
+        if img.width == 0 or img.height == 0:
+            return False
+        rects = None
+        if self.overlay and tracking_result is not None:
+            rects = _get_rects(tracking_result)
+        try:
+            # The image data is immutable, i.e. it is not copied here.
+            self._queue.put_nowait((img.width, img.height, img.data, rects))
+        except Queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def close(self):
+        """Writes the queued frames and stops the worker thread."""
+        self._queue.put(None)
+        self._worker.join()
+        self._close_segment()
+
+    def _existing_segments(self):
+        """Gets the sorted segment numbers in the directory to continue."""
+        segments = set()
+        for fname in glob.glob(os.path.join(self.directory, self.prefix + '_*')):
+            number = os.path.basename(fname)[len(self.prefix) + 1:].split('_')[0]
+            number = number.split('.')[0]
+            if number.isdigit():
+                segments.add(int(number))
+        return sorted(segments)
+
+    def _segment_patterns(self, segment):
+        """Gets the file name patterns of a segment of any format."""
+        pattern = os.path.join(self.directory, '{0}_{1:05d}'\
+                               .format(self.prefix, segment))
+        return [pattern + '.mjpeg', pattern + '_*.jpg']
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            try:
+                self._write(*item)
+            except Exception as e:
+                self.error = e
+
+    def _write(self, width, height, data, rects):
+        img = GrayscaleImage()
+        img.width = width
+        img.height = height
+        img.data = data
+        pil_img = img.to_pil()
+        if rects:
+            pil_img = pil_img.copy()
+            _draw_rects(pil_img, rects)
+
+        if self._frame == 0:
+            self._open_segment()
+        if self.fmt == SINK_FORMAT_MJPEG:
+            pil_img.save(self._file, 'JPEG', quality=self.quality)
+        else:
+            fname = os.path.join(self.directory, '{0}_{1:05d}_{2:05d}.jpg'\
+                                 .format(self.prefix, self._segment, self._frame))
+            pil_img.save(fname, 'JPEG', quality=self.quality)
+        self.written += 1
+
+        self._frame += 1
+        if self._frame >= self.segment_frames:
+            self._close_segment()
+            self._segment += 1
+            self._frame = 0
+
+    def _open_segment(self):
+        pattern = os.path.join(self.directory, '{0}_{1:05d}'\
+                               .format(self.prefix, self._segment))
+        if self.fmt == SINK_FORMAT_MJPEG:
+            self._file = open(pattern + '.mjpeg', 'wb')
+            self._segment_files.append([pattern + '.mjpeg'])
+        else:
+            self._segment_files.append([pattern + '_*.jpg'])
+        self._delete_old_segments()
+
+    def _close_segment(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _delete_old_segments(self):
+        if self.max_segments <= 0:
+            return
+        while len(self._segment_files) > self.max_segments:
+            for pattern in self._segment_files.pop(0):
+                for fname in glob.glob(pattern):
+                    os.remove(fname)
+
+
+def _get_rects(tracking_result):
+    """Gets the rectangles (gray level, center x, center y, size) of the result."""
+    rects = []
+    for (name, color) in _OVERLAY_COLORS:
+        objects = getattr(tracking_result, name, ())
+        if hasattr(objects, 'dtype'): # HVCArrayResult
+            rects.extend((color, x, y, size) for (x, y, size) in\
+                 zip(objects['pos_x'], objects['pos_y'], objects['size']))
+        else:
+            rects.extend((color, o.pos_x, o.pos_y, o.size) for o in objects)
+    return rects
+
+def _draw_rects(pil_img, rects):
+    scale = pil_img.size[0] / _RESULT_WIDTH
+    draw = ImageDraw.Draw(pil_img)
+    for (color, x, y, size) in rects:
+        half = size * scale / 2
+        x *= scale
+        y *= scale
+        draw.rectangle((x - half, y - half, x + half, y + half), outline=color)
+
+if __name__ == '__main__':
+    pass
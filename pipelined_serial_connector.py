@@ -0,0 +1,194 @@
+﻿# ---------------------------------------------------------------------------
+# Copyright 2017-2018  OMRON Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ---------------------------------------------------------------------------
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import threading
+import Queue
+from struct import *
+from serial_connector import SerialConnector
+from hvc_p2_wrapper import RESPONSE_HEADER_SIZE, SYNC_CODE, HVC_CMD_HDR_EXECUTE
+from hvc_result import FACE_RECORD_LAYOUT, DETECTION_RECORD_FORMAT
+
+# Polling period(sec) of the reader thread to check the stop request.
+READER_POLL_TIMEOUT = 0.1
+
+# Maximum number of responses queued by the reader thread.
+DEFAULT_QUEUE_SIZE = 8
+
+# Largest response data of Execute command, i.e. 35 bodies, hands and faces
+# with all estimations and QVGA image.
+MAX_RESPONSE_DATA_SIZE = calcsize('<BBBx')\
+        + 35 * calcsize('<' + DETECTION_RECORD_FORMAT) * 2\
+        + 35 * calcsize('<' + DETECTION_RECORD_FORMAT\
+                        + ''.join(fmt for (flag, fmt, name, cls)\
+                                  in FACE_RECORD_LAYOUT))\
+        + calcsize('<HH') + 320 * 240
+
+# Maximum age(sec) of the prefetched Execute command used for the next frame.
+DEFAULT_MAX_PREFETCH_AGE = 1.0
+
+
+class PipelinedSerialConnector(SerialConnector):
+    """Serial connector with a background reader thread.
+
+    The reader thread keeps reading from the serial port, reassembles each
+    response framed by the sync code(0xFE) and puts it into a queue.
+    receive_data() is served from the queued responses.
+
+    HVCP2Wrapper pipelines Execute command with this connector, i.e. the next
+    Execute command is sent before the current response is parsed, so that
+    the parsing and STB process on the host overlap with the next capture
+    on the device.
+
+    The prefetched Execute command older than max_prefetch_age is not used,
+    i.e. a frame captured before an idle period is not returned.
+
+    A response which is not received within the timeout, or a response of
+    Execute command whose data size exceeds max_data_size, is dropped as a
+    sync error, and the reader thread hunts for the next sync code.
+    (The responses of the other commands, e.g. Save Album, are not limited.)
+    """
+
+    pipelined = True
+
+    def __init__(self, queue_size=DEFAULT_QUEUE_SIZE,\
+                 max_data_size=MAX_RESPONSE_DATA_SIZE,\
+                 max_prefetch_age=DEFAULT_MAX_PREFETCH_AGE):
+        SerialConnector.__init__(self)
+        self._queue = Queue.Queue(queue_size)
+        self._max_data_size = max_data_size
+        self.max_prefetch_age = max_prefetch_age
+        self._execute_sent = True
+        self._cur = b''
+        self._timeout = None
+        self._reader = None
+        self._stop_event = threading.Event()
+        self._reader_error = None
+        self.sync_errors = 0
+
+    def connect(self, com_port, baudrate, timeout):
+        SerialConnector.connect(self, com_port, baudrate, READER_POLL_TIMEOUT)
+        self._timeout = timeout
+        self._cur = b''
+        self._execute_sent = True
+        self._reader_error = None
+        self._stop_event.clear()
+        self._reader = threading.Thread(target=self._read_loop,\
+                                        name='hvc-serial-reader')
+        self._reader.daemon = True
+        self._reader.start()
+        return True
+
+    def disconnect(self):
+        self._stop_event.set()
+        if self._reader is not None:
+            self._ser.cancel_read()
+            self._reader.join()
+            self._reader = None
+        SerialConnector.disconnect(self)
+        self._drop_responses()
+
+    def clear_recieve_buffer(self):
+        """Drops the responses already received."""
+        self._drop_responses()
+
+    def send_data(self, data):
+        # The responses are of the last command sent since HVCP2Wrapper
+        # receives the prefetched responses before sending other commands.
+        self._execute_sent = data.startswith(HVC_CMD_HDR_EXECUTE)
+        return SerialConnector.send_data(self, data)
+
+    def receive_data(self, read_byte_size):
+        if self._is_connected == False :
+            raise Exception('Serial port has not connected yet!')
+
+        buf = b''
+        while len(buf) < read_byte_size:
+            if len(self._cur) == 0:
+                if self._reader_error is not None:
+                    raise self._reader_error
+                try:
+                    self._cur = self._queue.get(True, self._timeout)
+                except Queue.Empty: # Timeout
+                    break
+            size = read_byte_size - len(buf)
+            buf += self._cur[:size]
+            self._cur = self._cur[size:]
+        return buf
+
+    def _drop_responses(self):
+        self._cur = b''
+        try:
+            while True:
+                self._queue.get_nowait()
+        except Queue.Empty:
+            pass
+
+    def _read_exactly(self, size, deadline):
+        """Reads size bytes until the deadline. (may be short)"""
+        buf = b''
+        while len(buf) < size and not self._stop_event.is_set():
+            if time.time() > deadline:
+                break
+            buf += self._ser.read(size - len(buf))
+        return buf
+
+    def _read_loop(self):
+        try:
+            while not self._stop_event.is_set():
+                sync = self._ser.read(1)
+                if len(sync) == 0: # Timeout
+                    continue
+                if ord(sync) != SYNC_CODE:
+                    self.sync_errors += 1
+                    continue
+
+                # Each response must be received within the timeout.
+                deadline = time.time() + self._timeout
+                header = sync + self._read_exactly(RESPONSE_HEADER_SIZE - 1,\
+                                                   deadline)
+                if len(header) != RESPONSE_HEADER_SIZE:
+                    self.sync_errors += 1
+                    continue
+                (response_code, data_len) = unpack_from('<BI', header, 1)
+
+                # The data follows the header only in the normal end.
+                if response_code == 0x00:
+                    if self._execute_sent and\
+                       data_len > self._max_data_size: # Not a response
+                        self.sync_errors += 1
+                        continue
+                    data = self._read_exactly(data_len, deadline)
+                    if len(data) != data_len:
+                        self.sync_errors += 1
+                        continue
+                else:
+                    data = b''
+
+                while not self._stop_event.is_set():
+                    try:
+                        self._queue.put(header + data, True, READER_POLL_TIMEOUT)
+                        break
+                    except Queue.Full:
+                        pass
+        except Exception as e:
+            if not self._stop_event.is_set():
+                self._reader_error = e
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,722 @@
+﻿# ---------------------------------------------------------------------------
+# Copyright 2017-2018  OMRON Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ---------------------------------------------------------------------------
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+from ctypes import c_int, sizeof
+from collections import deque
+from itertools import izip
+from operator import itemgetter
+import numpy
+from p2def import EST_NOT_POSSIBLE, RECOG_NOT_POSSIBLE, RECOG_NO_DATA_IN_ALBUM
+from hvc_result_c import C_FRAME_RESULT, C_FRAME_RESULT_FACE,\
+                         C_FRAME_RESULT_DETECTION, C_FRAME_RESULT_MAX
+from hvc_tracking_result_c import *
+from stb import STB_EX_BODY, STB_EX_FACE, STB_EX_AGE, STB_EX_GENDER,\
+                STB_EX_RECOGNITION, STB_EX_FUNC_ALL,\
+                STB_RET_NORMAL, STB_RET_ERR_INVALIDPARAM
+
+# Version number of this engine. (major, minor)
+PY_STB_VERSION = (1, 0)
+
+# Default parameters (same as the sample settings of execution.py)
+DEFAULT_TR_RETRY_COUNT = 2
+DEFAULT_TR_STEADINESS_PARAM = (30, 30)
+DEFAULT_PE_THRESHOLD_USE = 300
+DEFAULT_PE_ANGLE_USE = (-15, 20, -30, 30)
+DEFAULT_PE_COMPLETE_FRAME_COUNT = 5
+DEFAULT_FR_THRESHOLD_USE = 300
+DEFAULT_FR_ANGLE_USE = (-15, 20, -30, 30)
+DEFAULT_FR_COMPLETE_FRAME_COUNT = 5
+DEFAULT_FR_MIN_RATIO = 60
+
+# Gating of the detection-to-track association.
+# A detection can be associated with a track only if its center is within
+# TRACK_MAX_DISTANCE times the track size from the track, and its size is
+# within TRACK_MAX_SIZE_RATIO times the track size.
+TRACK_MAX_DISTANCE = 1.0
+TRACK_MAX_SIZE_RATIO = 2.0
+
+# Cost of the pairs out of the gate. (larger than any cost in the gate)
+_GATED_COST = 1e6
+
+_NO_TRACKS = numpy.empty(0, numpy.intp)
+
+def _index(cls, *names):
+    """Gets the index of a field in the structure viewed as c_int array."""
+    offset = 0
+    for name in names:
+        offset += getattr(cls, name).offset
+        cls = dict(cls._fields_)[name]
+    return offset // sizeof(c_int)
+
+# Indexes in C_FRAME_RESULT
+_BODY_COUNT = _index(C_FRAME_RESULT, 'bodys', 'nCount')
+_BODY_START = _index(C_FRAME_RESULT, 'bodys', 'body')
+_BODY_INTS = sizeof(C_FRAME_RESULT_DETECTION) // sizeof(c_int)
+_FACE_COUNT = _index(C_FRAME_RESULT, 'faces', 'nCount')
+_FACE_START = _index(C_FRAME_RESULT, 'faces', 'face')
+_FACE_INTS = sizeof(C_FRAME_RESULT_FACE) // sizeof(c_int)
+
+# Indexes in C_FRAME_RESULT_FACE (the detection part is common with bodies.)
+_IN_DETECTION = slice(0, 4) # center.nX, center.nY, nSize, nConfidence
+_IN_DIR_LR = _index(C_FRAME_RESULT_FACE, 'direction', 'nLR')
+_IN_DIR_UD = _index(C_FRAME_RESULT_FACE, 'direction', 'nUD')
+_IN_DIR_CONF = _index(C_FRAME_RESULT_FACE, 'direction', 'nConfidence')
+_IN_AGE = _index(C_FRAME_RESULT_FACE, 'age', 'nAge')
+_IN_AGE_CONF = _index(C_FRAME_RESULT_FACE, 'age', 'nConfidence')
+_IN_GENDER = _index(C_FRAME_RESULT_FACE, 'gender', 'nGender')
+_IN_GENDER_CONF = _index(C_FRAME_RESULT_FACE, 'gender', 'nConfidence')
+_IN_UID = _index(C_FRAME_RESULT_FACE, 'recognition', 'nUID')
+_IN_SCORE = _index(C_FRAME_RESULT_FACE, 'recognition', 'nScore')
+
+# Indexes in C_FACE and C_BODY (the first part is common.)
+_OUT_DETECT_ID = _index(C_FACE, 'nDetectID')
+_OUT_TRACKING_ID = _index(C_FACE, 'nTrackingID')
+_OUT_POS = slice(_index(C_FACE, 'center', 'x'), _index(C_FACE, 'nSize') + 1)
+_OUT_CONF = _index(C_FACE, 'conf')
+_OUT_AGE = _index(C_FACE, 'age')
+_OUT_GENDER = _index(C_FACE, 'gender')
+_OUT_RECOGNITION = _index(C_FACE, 'recognition')
+_OUT_NOT_STABILIZED = (_index(C_FACE, 'direction', 'status'),\
+                       _index(C_FACE, 'gaze', 'status'),\
+                       _index(C_FACE, 'blink', 'status'),\
+                       _index(C_FACE, 'expression', 'status'))
+_FACE_OUT_INTS = sizeof(C_FACE) // sizeof(c_int)
+_BODY_OUT_INTS = sizeof(C_BODY) // sizeof(c_int)
+
+# Indexes in C_RES
+_RES_STATUS = _index(C_RES, 'status')
+_RES_CONF = _index(C_RES, 'conf')
+_RES_VALUE = _index(C_RES, 'value')
+
+def _as_ints(obj):
+    """Views a ctypes object as NumPy array of c_int. (no copy)"""
+    return numpy.frombuffer(obj, numpy.int32)
+
+def _resize(array, keep, new_count, value):
+    """Keeps the elements of array in keep, and appends new_count values."""
+    return numpy.concatenate((array[keep],\
+                              numpy.full(new_count, value, array.dtype)))
+
+def solve_assignment(cost):
+    """Solves the linear assignment problem.
+
+    Shortest augmenting path method (Hungarian algorithm) with the search
+    over the columns vectorized.
+    If every row has its own minimum column, it is the optimal assignment
+    and returned without the search.
+
+    Args:
+        cost (ndarray): cost matrix of (rows, columns), rows <= columns
+
+    Returns:
+        ndarray: column assigned to each row minimizing the total cost
+    """
+    (n, m) = cost.shape
+    cols = cost.argmin(1)
+    if len(set(cols.tolist())) == n:
+        return cols
+
+    u = numpy.zeros(n + 1)
+    v = numpy.zeros(m + 1)
+    p = numpy.zeros(m + 1, numpy.intp)   # row(1-origin) assigned to column
+    way = numpy.zeros(m + 1, numpy.intp)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = numpy.full(m, numpy.inf)
+        used = numpy.zeros(m + 1, bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+            cur = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (cur < minv)
+            minv[better] = cur[better]
+            way[1:][better] = j0
+            masked = numpy.where(free, minv, numpy.inf)
+            j1 = int(masked.argmin())
+            delta = masked[j1]
+            u[p[used]] += delta
+            v[used] -= delta
+            minv[free] -= delta
+            j0 = j1 + 1
+            if p[j0] == 0:
+                break
+        while j0: # Augments the path.
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    assigned = numpy.nonzero(p[1:])[0]
+    cols[p[1:][assigned] - 1] = assigned
+    return cols
+
+def _associate(track_pos, det_pos):
+    """Associates the detections with the tracks.
+
+    The cost of a pair is the squared distance of the centers and the
+    squared size change, both relative to the track size.
+
+    Args:
+        track_pos (ndarray): (x, y, size) of each track
+        det_pos (ndarray): (x, y, size) of each detection
+
+    Returns:
+        tuple of (tracks, dets): indexes of the associated pairs
+    """
+    size = numpy.maximum(track_pos[:, 2, None], 1)
+    dx = (det_pos[:, 0] - track_pos[:, 0, None]) / size
+    dy = (det_pos[:, 1] - track_pos[:, 1, None]) / size
+    ratio = det_pos[:, 2] / size
+    dist = dx * dx
+    dist += dy * dy
+    gated = dist > TRACK_MAX_DISTANCE ** 2
+    gated |= ratio > TRACK_MAX_SIZE_RATIO
+    gated |= ratio < 1.0 / TRACK_MAX_SIZE_RATIO
+    ratio -= 1
+    cost = ratio * ratio
+    cost += dist
+    cost[gated] = _GATED_COST
+
+    if len(track_pos) <= len(det_pos):
+        tracks = numpy.arange(len(track_pos))
+        dets = solve_assignment(cost)
+    else:
+        tracks = solve_assignment(cost.T)
+        dets = numpy.arange(len(det_pos))
+    valid = ~gated[tracks, dets]
+    return (tracks[valid], dets[valid])
+
+
+class _Tracker(object):
+    """Tracker of faces or bodies.
+
+    The tracks are stored as arrays in the order of creation.
+    """
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.ids = numpy.empty(0, numpy.int32)
+        self.pos = numpy.empty((0, 3))   # detected (x, y, size)
+        self.out = numpy.empty((0, 3))   # steadied (x, y, size)
+        self.conf = numpy.empty(0, numpy.int32)
+        self.retry = numpy.empty(0, numpy.int32)
+        self._next_id = 1
+
+    def update(self, dets, max_retry_count, pos_param, size_param):
+        """Updates the tracks by the detections of one frame.
+
+        Args:
+            dets (ndarray): (x, y, size, conf) of each detection
+
+        Returns:
+            tuple of (keep, new_count, det_tracks, order)
+                keep (ndarray): mask of the previous tracks kept
+                new_count (int): number of tracks appended for new detections
+                det_tracks (ndarray): track of each detection
+                order (ndarray): tracks to be output, i.e. det_tracks and
+                                 then the lost tracks being retried
+        """
+        det_count = len(dets)
+        if det_count == 0 and len(self.ids) == 0:
+            return (_NO_TRACKS, 0, _NO_TRACKS, _NO_TRACKS)
+        det_pos = dets[:, :3].astype(float)
+        det_tracks = numpy.full(det_count, -1, numpy.intp)
+        if len(self.ids) and det_count:
+            (tracks, cols) = _associate(self.pos, det_pos)
+            det_tracks[cols] = tracks
+        matched = det_tracks >= 0
+        found = det_tracks[matched]
+
+        # Tracks found again
+        self.retry += 1
+        self.retry[found] = 0
+        new_pos = det_pos[matched]
+        self.pos[found] = new_pos
+        self.conf[found] = dets[matched, 3]
+
+        # Outputs the previous position/size while the shift is within the
+        # steadiness parameter(%) of the size.
+        out = self.out[found]
+        moved = numpy.hypot(new_pos[:, 0] - out[:, 0], new_pos[:, 1] - out[:, 1])\
+              > out[:, 2] * (pos_param / 100.0)
+        out[moved, :2] = new_pos[moved, :2]
+        resized = numpy.abs(new_pos[:, 2] - out[:, 2])\
+                > out[:, 2] * (size_param / 100.0)
+        out[resized, 2] = new_pos[resized, 2]
+        self.out[found] = out
+
+        # Drops the tracks lost more than the retry count, and appends the
+        # new tracks.
+        keep = self.retry <= max_retry_count
+        kept_count = int(keep.sum())
+        new = ~matched
+        new_count = det_count - len(found)
+        new_ids = numpy.arange(self._next_id, self._next_id + new_count,\
+                               dtype=numpy.int32)
+        self._next_id += new_count
+
+        det_tracks[matched] = (numpy.cumsum(keep) - 1)[found]
+        det_tracks[new] = kept_count + numpy.arange(new_count)
+
+        if new_count or kept_count < len(keep):
+            self.ids = numpy.concatenate((self.ids[keep], new_ids))
+            self.pos = numpy.concatenate((self.pos[keep], det_pos[new]))
+            self.out = numpy.concatenate((self.out[keep], det_pos[new]))
+            self.conf = numpy.concatenate((self.conf[keep], dets[new, 3]))
+            self.retry = _resize(self.retry, keep, new_count, 0)
+
+        lost = numpy.nonzero(self.retry)[0]
+        return (keep, new_count, det_tracks,\
+                numpy.concatenate((det_tracks, lost)))
+
+    def write(self, rows, order, det_count):
+        """Writes the tracks in order to rows of C_FACE or C_BODY."""
+        rows[:, _OUT_DETECT_ID] = -1
+        rows[:det_count, _OUT_DETECT_ID] = numpy.arange(det_count)
+        rows[:, _OUT_TRACKING_ID] = self.ids[order]
+        rows[:, _OUT_POS] = numpy.rint(self.out[order])
+        rows[:, _OUT_CONF] = self.conf[order]
+
+
+class _AverageStabilizer(object):
+    """Confidence weighted average of age or gender of the face tracks.
+
+    The status is STB_STATUS_CALCULATING until complete_count samples are
+    averaged, STB_STATUS_COMPLETE at the frame completed, and then
+    STB_STATUS_FIXED with the fixed value.
+    """
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._wsum = numpy.empty(0)
+        self._csum = numpy.empty(0)
+        self._count = numpy.empty(0, numpy.int32)
+        self._status = numpy.empty(0, numpy.int32)
+
+    def resize(self, keep, new_count):
+        self._wsum = _resize(self._wsum, keep, new_count, 0)
+        self._csum = _resize(self._csum, keep, new_count, 0)
+        self._count = _resize(self._count, keep, new_count, 0)
+        self._status = _resize(self._status, keep, new_count, STB_STATUS_NO_DATA)
+
+    def update(self, tracks, values, confs, complete_count):
+        """Adds the samples of the tracks.
+
+        Args:
+            tracks (ndarray): track of each sample (no duplication)
+            values (ndarray): estimated value of each sample
+            confs (ndarray): confidence of each sample
+            complete_count (int): number of samples to complete
+        """
+        status = self._status
+        fixed = status >= STB_STATUS_COMPLETE
+        status[fixed] = STB_STATUS_FIXED
+
+        valid = ~fixed[tracks]
+        tracks = tracks[valid]
+        weights = numpy.maximum(confs[valid], 1)
+        self._wsum[tracks] += values[valid] * weights
+        self._csum[tracks] += weights
+        self._count[tracks] += 1
+
+        status[tracks] = numpy.where(self._count[tracks] >= complete_count,\
+                                     STB_STATUS_COMPLETE, STB_STATUS_CALCULATING)
+
+    def get(self, order):
+        """Gets (status, conf, average) of the tracks in order."""
+        count = self._count[order]
+        csum = self._csum[order]
+        return (self._status[order],\
+                numpy.rint(csum / numpy.maximum(count, 1)),\
+                self._wsum[order] / numpy.maximum(csum, 1))
+
+
+class _RecognitionStabilizer(object):
+    """Score weighted voting of the user ID of the face tracks.
+
+    The votes of the last complete_count samples are counted, and the status
+    is STB_STATUS_COMPLETE when the top user ID has min_ratio(%) of them.
+    """
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._windows = []
+        self._status = numpy.empty(0, numpy.int32)
+        self._uid = numpy.empty(0, numpy.int32)
+        self._score = numpy.empty(0, numpy.int32)
+
+    def resize(self, keep, new_count):
+        self._windows = [w for (w, k) in izip(self._windows, keep) if k]\
+                      + [deque() for i in range(new_count)]
+        self._status = _resize(self._status, keep, new_count, STB_STATUS_NO_DATA)
+        self._uid = _resize(self._uid, keep, new_count, 0)
+        self._score = _resize(self._score, keep, new_count, 0)
+
+    def update(self, tracks, uids, scores, complete_count, min_ratio):
+        status = self._status
+        fixed = status >= STB_STATUS_COMPLETE
+        status[fixed] = STB_STATUS_FIXED
+
+        complete_count = max(complete_count, 1)
+        for (t, uid, score) in izip(tracks.tolist(), uids.tolist(),\
+                                    scores.tolist()):
+            if fixed[t]:
+                continue
+            window = self._windows[t]
+            window.append((uid, score))
+            while len(window) > complete_count:
+                window.popleft()
+
+            votes = {}
+            for (u, s) in window:
+                votes[u] = votes.get(u, 0) + max(s, 1)
+            (uid, weight) = max(votes.iteritems(), key=itemgetter(1))
+            uid_scores = [s for (u, s) in window if u == uid]
+
+            self._uid[t] = uid
+            self._score[t] = int(round(float(sum(uid_scores)) / len(uid_scores)))
+            if len(window) >= complete_count and\
+               weight * 100 >= min_ratio * sum(votes.itervalues()):
+                status[t] = STB_STATUS_COMPLETE
+            else:
+                status[t] = STB_STATUS_CALCULATING
+
+    def get(self, order):
+        """Gets (status, score, uid) of the tracks in order."""
+        return (self._status[order], self._score[order], self._uid[order])
+
+
+def _write_res(rows, index, result, raw_values, raw_confs):
+    """Writes (status, conf, value) to C_RES at index of rows.
+
+    The raw values of the frame are written if the status is
+    STB_STATUS_NO_DATA, or -1 for the lost tracks.
+    """
+    (status, conf, value) = result
+    no_data = status == STB_STATUS_NO_DATA
+    rows[:, index + _RES_STATUS] = status
+    rows[:, index + _RES_CONF] = conf
+    rows[:, index + _RES_VALUE] = value
+    if no_data.any():
+        det_count = len(raw_values)
+        raw = numpy.full((len(rows), 2), -1, numpy.int32)
+        raw[:det_count, 0] = raw_values
+        raw[:det_count, 1] = raw_confs
+        rows[no_data, index + _RES_VALUE] = raw[no_data, 0]
+        rows[no_data, index + _RES_CONF] = raw[no_data, 1]
+
+
+class PySTB(object):
+    """Tracking and stabilization engine in Python and NumPy.
+
+    Alternative of STB class (STB library) with the same interface, i.e.
+    execute() takes C_FRAME_RESULT and writes C_FACE_RES35 and C_BODY_RES35,
+    and the parameters are the same as STB library.
+
+    - Tracking:
+        The detections are associated with the tracks by the optimal
+        assignment minimizing the total of the center distance and the size
+        change relative to the track size. The pairs out of the gate
+        (TRACK_MAX_DISTANCE, TRACK_MAX_SIZE_RATIO) are not associated.
+        The outputs are in the order of the detections (nDetectID), and then
+        the lost tracks being retried (nDetectID is -1). So there can be
+        more outputs than C_FACE_RES35, see get_max_output_count().
+    - Age/Gender:
+        Confidence weighted average of the samples whose face direction
+        fulfills set_stb_pe_threshold_use() and set_stb_pe_angle_use().
+        The gender is the weighted vote.
+    - Recognition:
+        Score weighted voting of the samples whose face direction fulfills
+        set_stb_fr_threshold_use() and set_stb_fr_angle_use().
+
+    The face direction, gaze, blink and expression are not stabilized.
+    (status is STB_STATUS_NO_DATA)
+
+    Usage:
+        class PySTBApi(HVCP2Api):
+            stb_class = PySTB
+    """
+    def __init__(self, library_name, exec_func):
+        """Constructor
+
+        Args:
+            library_name (str): not used (compatibility with STB class)
+            exec_func (int): functions flag to be stabilized
+        """
+        self._exec_func = exec_func & STB_EX_FUNC_ALL
+        self._faces = _Tracker()
+        self._bodies = _Tracker()
+        self._age = _AverageStabilizer()
+        self._gender = _AverageStabilizer()
+        self._recognition = _RecognitionStabilizer()
+
+        self._max_retry_count = DEFAULT_TR_RETRY_COUNT
+        (self._pos_steadiness_param,\
+         self._size_steadiness_param) = DEFAULT_TR_STEADINESS_PARAM
+        self._pe_threshold = DEFAULT_PE_THRESHOLD_USE
+        self._pe_angle = DEFAULT_PE_ANGLE_USE
+        self._pe_complete_frame_count = DEFAULT_PE_COMPLETE_FRAME_COUNT
+        self._fr_threshold = DEFAULT_FR_THRESHOLD_USE
+        self._fr_angle = DEFAULT_FR_ANGLE_USE
+        self._fr_complete_frame_count = DEFAULT_FR_COMPLETE_FRAME_COUNT
+        self._fr_min_ratio = DEFAULT_FR_MIN_RATIO
+
+    def execute(self, frame_res, faces_res, bodies_res):
+        """Executes stabilization process.
+
+        Args:
+            frame_res (C_FRAME_RESULT): input one frame result
+            faces_res (C_FACE array): output result stabilized face data.
+            bodies_res (C_BODY array): output result stabilized body data.
+                The outputs exceeding the size of the arrays are dropped.
+                (C_FACE * get_max_output_count() keeps all of them)
+
+        Returns:
+            tuple of (stb_return, face_count, body_count)
+                stb_return (int): STB_RET_NORMAL or STB error code
+                face_count (int): face count
+                body_count (int): body count
+        """
+        ints = _as_ints(frame_res)
+        body_count = int(ints[_BODY_COUNT])
+        face_count = int(ints[_FACE_COUNT])
+        if not (0 <= body_count <= C_FRAME_RESULT_MAX\
+                and 0 <= face_count <= C_FRAME_RESULT_MAX):
+            return (STB_RET_ERR_INVALIDPARAM, 0, 0)
+
+        face_out_count = 0
+        if self._exec_func & STB_EX_FACE:
+            faces = ints[_FACE_START:_FACE_START + _FACE_INTS * face_count]
+            face_out_count = self._execute_faces(\
+                                   faces.reshape(face_count, _FACE_INTS),\
+                                   _as_ints(faces_res).reshape(-1, _FACE_OUT_INTS))
+
+        body_out_count = 0
+        if self._exec_func & STB_EX_BODY:
+            bodies = ints[_BODY_START:_BODY_START + _BODY_INTS * body_count]
+            body_out_count = self._execute_bodies(\
+                                   bodies.reshape(body_count, _BODY_INTS),\
+                                   _as_ints(bodies_res).reshape(-1, _BODY_OUT_INTS))
+
+        return (STB_RET_NORMAL, face_out_count, body_out_count)
+
+    def _execute_bodies(self, bodies, out):
+        (keep, new_count, det_tracks, order) = self._bodies.update(\
+                                        bodies[:, _IN_DETECTION],\
+                                        self._max_retry_count,\
+                                        self._pos_steadiness_param,\
+                                        self._size_steadiness_param)
+        order = order[:len(out)]
+        rows = out[:len(order)]
+        self._bodies.write(rows, order, len(bodies))
+        return len(order)
+
+    def _execute_faces(self, faces, out):
+        (keep, new_count, det_tracks, order) = self._faces.update(\
+                                        faces[:, _IN_DETECTION],\
+                                        self._max_retry_count,\
+                                        self._pos_steadiness_param,\
+                                        self._size_steadiness_param)
+        if len(order) == 0: # No tracks.
+            self._age.clear()
+            self._gender.clear()
+            self._recognition.clear()
+            return 0
+        resized = new_count or not keep.all()
+
+        order = order[:len(out)]
+        rows = out[:len(order)]
+        rows.fill(0)
+        self._faces.write(rows, order, len(faces))
+        for index in _OUT_NOT_STABILIZED:
+            rows[:, index] = STB_STATUS_NO_DATA
+
+        exec_func = self._exec_func
+        if exec_func & (STB_EX_AGE | STB_EX_GENDER):
+            usable = self._usable(faces, self._pe_threshold, self._pe_angle)
+            for (flag, stb, index, value_index, conf_index, round_func) in (\
+                  (STB_EX_AGE, self._age, _OUT_AGE, _IN_AGE, _IN_AGE_CONF,\
+                   numpy.rint),\
+                  (STB_EX_GENDER, self._gender, _OUT_GENDER, _IN_GENDER,\
+                   _IN_GENDER_CONF, lambda v: v > 0.5)):
+                if not exec_func & flag:
+                    rows[:, index + _RES_STATUS] = STB_STATUS_NO_DATA
+                    continue
+                values = faces[:, value_index]
+                confs = faces[:, conf_index]
+                valid = usable & (values != EST_NOT_POSSIBLE)
+                if resized:
+                    stb.resize(keep, new_count)
+                stb.update(det_tracks[valid], values[valid], confs[valid],\
+                           self._pe_complete_frame_count)
+                (status, conf, value) = stb.get(order)
+                _write_res(rows, index, (status, conf, round_func(value)),\
+                           values, confs)
+        else:
+            rows[:, _OUT_AGE + _RES_STATUS] = STB_STATUS_NO_DATA
+            rows[:, _OUT_GENDER + _RES_STATUS] = STB_STATUS_NO_DATA
+
+        if exec_func & STB_EX_RECOGNITION:
+            uids = faces[:, _IN_UID]
+            scores = faces[:, _IN_SCORE]
+            valid = self._usable(faces, self._fr_threshold, self._fr_angle)\
+                  & (uids != RECOG_NOT_POSSIBLE)\
+                  & (uids != RECOG_NO_DATA_IN_ALBUM)
+            stb = self._recognition
+            if resized:
+                stb.resize(keep, new_count)
+            stb.update(det_tracks[valid], uids[valid], scores[valid],\
+                       self._fr_complete_frame_count, self._fr_min_ratio)
+            _write_res(rows, _OUT_RECOGNITION, stb.get(order), uids, scores)
+        else:
+            rows[:, _OUT_RECOGNITION + _RES_STATUS] = STB_STATUS_NO_DATA
+        return len(order)
+
+    @staticmethod
+    def _usable(faces, threshold, angle):
+        """Gets the mask of the faces usable for stabilizing."""
+        (min_UD_angle, max_UD_angle, min_LR_angle, max_LR_angle) = angle
+        UD = faces[:, _IN_DIR_UD]
+        LR = faces[:, _IN_DIR_LR]
+        return (faces[:, _IN_DIR_CONF] >= threshold)\
+             & (UD >= min_UD_angle) & (UD <= max_UD_angle)\
+             & (LR >= min_LR_angle) & (LR <= max_LR_angle)
+
+    def get_max_output_count(self):
+        """Gets the maximum face/body count of execute() output.
+
+        The detections of one frame and the lost tracks being retried. A track
+        is retried for the retry count frames, and at most
+        C_FRAME_RESULT_MAX tracks are found on each frame.
+
+        Returns:
+            int: the size of faces_res and bodies_res to keep all outputs
+        """
+        return C_FRAME_RESULT_MAX * (self._max_retry_count + 1)
+
+    def get_stb_version(self):
+        return (STB_RET_NORMAL,) + PY_STB_VERSION
+
+    def clear_stb_frame_results(self):
+        self._faces.clear()
+        self._bodies.clear()
+        self._age.clear()
+        self._gender.clear()
+        self._recognition.clear()
+        return STB_RET_NORMAL
+
+    def set_stb_tr_retry_count(self, max_retry_count):
+        if not 0 <= max_retry_count <= 300:
+            return STB_RET_ERR_INVALIDPARAM
+        self._max_retry_count = max_retry_count
+        return STB_RET_NORMAL
+
+    def get_stb_tr_retry_count(self):
+        return (STB_RET_NORMAL, self._max_retry_count)
+
+    def set_stb_tr_steadiness_param(self, pos_steadiness_param,\
+                                          size_steadiness_param):
+        if not (0 <= pos_steadiness_param <= 100\
+                and 0 <= size_steadiness_param <= 100):
+            return STB_RET_ERR_INVALIDPARAM
+        self._pos_steadiness_param = pos_steadiness_param
+        self._size_steadiness_param = size_steadiness_param
+        return STB_RET_NORMAL
+
+    def get_stb_tr_steadiness_param(self):
+        return (STB_RET_NORMAL, self._pos_steadiness_param,\
+                self._size_steadiness_param)
+
+    def set_stb_pe_threshold_use(self, threshold):
+        if not 0 <= threshold <= 1000:
+            return STB_RET_ERR_INVALIDPARAM
+        self._pe_threshold = threshold
+        return STB_RET_NORMAL
+
+    def get_stb_pe_threshold_use(self):
+        return (STB_RET_NORMAL, self._pe_threshold)
+
+    def set_stb_pe_angle_use(self, min_UD_angle, max_UD_angle,\
+                                   min_LR_angle, max_LR_angle):
+        if not _valid_angle(min_UD_angle, max_UD_angle,\
+                            min_LR_angle, max_LR_angle):
+            return STB_RET_ERR_INVALIDPARAM
+        self._pe_angle = (min_UD_angle, max_UD_angle, min_LR_angle, max_LR_angle)
+        return STB_RET_NORMAL
+
+    def get_stb_pe_angle_use(self):
+        return (STB_RET_NORMAL,) + self._pe_angle
+
+    def set_stb_pe_complete_frame_count(self, frame_count):
+        if not 1 <= frame_count <= 20:
+            return STB_RET_ERR_INVALIDPARAM
+        self._pe_complete_frame_count = frame_count
+        return STB_RET_NORMAL
+
+    def get_stb_pe_complete_frame_count(self):
+        return (STB_RET_NORMAL, self._pe_complete_frame_count)
+
+    def set_stb_fr_threshold_use(self, threshold):
+        if not 0 <= threshold <= 1000:
+            return STB_RET_ERR_INVALIDPARAM
+        self._fr_threshold = threshold
+        return STB_RET_NORMAL
+
+    def get_stb_fr_threshold_use(self):
+        return (STB_RET_NORMAL, self._fr_threshold)
+
+    def set_stb_fr_angle_use(self, min_UD_angle, max_UD_angle, min_LR_angle,\
+                                                                max_LR_angle):
+        if not _valid_angle(min_UD_angle, max_UD_angle,\
+                            min_LR_angle, max_LR_angle):
+            return STB_RET_ERR_INVALIDPARAM
+        self._fr_angle = (min_UD_angle, max_UD_angle, min_LR_angle, max_LR_angle)
+        return STB_RET_NORMAL
+
+    def get_stb_fr_angle_use(self):
+        return (STB_RET_NORMAL,) + self._fr_angle
+
+    def set_stb_fr_complete_frame_count(self, frame_count):
+        if not 0 <= frame_count <= 20:
+            return STB_RET_ERR_INVALIDPARAM
+        self._fr_complete_frame_count = frame_count
+        return STB_RET_NORMAL
+
+    def get_stb_fr_complete_frame_count(self):
+        return (STB_RET_NORMAL, self._fr_complete_frame_count)
+
+    def set_stb_fr_min_ratio(self, min_ratio):
+        if not 0 <= min_ratio <= 100:
+            return STB_RET_ERR_INVALIDPARAM
+        self._fr_min_ratio = min_ratio
+        return STB_RET_NORMAL
+
+    def get_stb_fr_min_ratio(self):
+        return (STB_RET_NORMAL, self._fr_min_ratio)
+
+def _valid_angle(min_UD_angle, max_UD_angle, min_LR_angle, max_LR_angle):
+    return -90 <= min_UD_angle <= max_UD_angle <= 90\
+       and -90 <= min_LR_angle <= max_LR_angle <= 90
+
+if __name__ == '__main__':
+    pass
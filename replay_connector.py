@@ -0,0 +1,140 @@
+﻿# ---------------------------------------------------------------------------
+# Copyright 2017-2018  OMRON Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ---------------------------------------------------------------------------
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+from connector import Connector
+from hvc_p2_wrapper import HVC_CMD_HDR_EXECUTE
+from session_recorder import SessionReader, pair_commands
+
+
+class ReplayConnector(Connector):
+    """Connector replaying a session log recorded by SessionRecorder.
+
+    Each command sent is looked up in the log from the position of the last
+    command found, and the recorded response of that command is returned by
+    receive_data(). The log is read through mmap and the Execute responses
+    are returned as buffers of the log without copy, so an uncompressed log
+    larger than the memory can be replayed. (The buffers are valid until
+    disconnect().)
+    The responses of the other commands (e.g. Save Album) are returned as
+    str copies since they may be kept by the caller.
+
+    Usage:
+        hvc_p2_api = HVCP2Api(ReplayConnector('session.log'), exec_func, use_stb)
+        hvc_p2_api.connect('replay', 9600, 30)  # com_port and baudrate are ignored
+    """
+    def __init__(self, fname, realtime=False, loop=False):
+        """Constructor
+
+        Args:
+            fname (str): session log file name
+            realtime (bool): False: returns the responses as fast as possible
+                             True:  returns the responses with the original
+                                    timing, i.e. the time between the commands
+                                    (frames) and the delay from the command
+                                    to its response
+            loop (bool): replays the log from the beginning after the end
+        """
+        self._fname = fname
+        self._realtime = realtime
+        self._loop = loop
+        self._reader = None
+        self._pairs = None
+        self._index = 0
+        self._response = b''
+        self._offset = 0
+        self._response_time = 0
+        self._command_ts = None
+        self._command_time = 0
+        self._is_connected = False
+
+    def connect(self, com_port, baudrate, timeout):
+        self._reader = SessionReader(self._fname)
+        self._pairs = list(pair_commands(self._reader.records()))
+        self._index = 0
+        self._response = b''
+        self._command_ts = None
+        self._is_connected = True
+        return True
+
+    def disconnect(self):
+        self._is_connected = False
+        self._response = b''
+        self._pairs = None
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+    def clear_recieve_buffer(self):
+        self._response = b''
+        self._offset = 0
+
+    def send_data(self, data):
+        if self._is_connected == False:
+            raise Exception('Replay log has not connected yet!')
+
+        sent_time = time.time()
+        i = self._find(data, self._index, len(self._pairs))
+        if i is None and self._loop:
+            i = self._find(data, 0, self._index)
+        if i is None:
+            # The position is kept for the next command.
+            raise Exception('Command not found in the replay log.')
+        self._index = i + 1
+
+        (command, command_ts, response, response_ts) = self._pairs[i]
+        if not data.startswith(HVC_CMD_HDR_EXECUTE):
+            response = str(response)
+        self._response = response
+        self._offset = 0
+
+        # Keeps the recorded time from the previous command.
+        # (not before the actual time)
+        if self._command_ts is not None and command_ts >= self._command_ts:
+            sent_time = max(sent_time,\
+                            self._command_time + (command_ts - self._command_ts))
+        self._command_ts = command_ts
+        self._command_time = sent_time
+        self._response_time = sent_time + (response_ts - command_ts)
+        return True
+
+    def receive_data(self, read_byte_size):
+        if self._is_connected == False:
+            raise Exception('Replay log has not connected yet!')
+
+        if self._realtime:
+            delay = self._response_time - time.time()
+            if delay > 0:
+                time.sleep(delay)
+
+        if isinstance(self._response, str):
+            buf = self._response[self._offset:self._offset + read_byte_size]
+        else:
+            buf = buffer(self._response, self._offset, read_byte_size)
+        self._offset += len(buf)
+        return buf
+
+    def _find(self, data, start, end):
+        pairs = self._pairs
+        for i in xrange(start, end):
+            if str(pairs[i][0]) == data:
+                return i
+        return None
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,538 @@
+﻿# ---------------------------------------------------------------------------
+# Copyright 2017-2018  OMRON Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ---------------------------------------------------------------------------
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+from itertools import izip, chain, count, repeat, groupby, islice
+from operator import attrgetter
+from struct import *
+from p2def import *
+from okao_result import DetectionResult, FaceResult
+from hvc_result import HVCResult, FACE_RECORD_LAYOUT
+from hvc_tracking_result_c import STB_TRID_NOT_TRACKED
+from hvc_tracking_result import HVCTrackingResult, TrackingResult,\
+                                TrackingFaceResult, TrackingAgeResult,\
+                                TrackingGenderResult, TrackingRecognitionResult
+
+# Binary record format (little endian)
+#
+#     Header : record type(B), pad(x), body count(H), hand count(H),
+#              face count(H)
+#              record type : RECORD_FRAME    (HVCResult)
+#                            RECORD_TRACKING (HVCTrackingResult)
+#     Body/Hand entry (fixed size):
+#              X(H), Y(H), Size(H), Confidence(H), detection ID(h),
+#              tracking ID(i)
+#     Face entry (fixed size):
+#              the same detection part as Body/Hand entry,
+#              all estimation results in the order of FACE_RECORD_LAYOUT,
+#              each followed by STB status(b) if it can be tracked.
+#              (the results not present are filled with 0)
+#              present flags(H) : EX_XXX flag of each estimation result
+#              tracked flags(H) : EX_XXX flag of each result with STB status
+
+RECORD_FRAME    = 0x01
+RECORD_TRACKING = 0x02
+
+RECORD_HEADER = Struct('<BxHHH')
+
+_DETECTION_FORMAT = 'HHHHhi'
+
+DETECTION_ENTRY = Struct('<' + _DETECTION_FORMAT)
+
+# Result class with STB status of each estimation stabilized by STB library.
+TRACKING_CLASSES = {EX_AGE:         TrackingAgeResult,
+                    EX_GENDER:      TrackingGenderResult,
+                    EX_RECOGNITION: TrackingRecognitionResult}
+
+# Attributes of face results which are estimation results.
+_ESTIMATION_ORDER = tuple(name for (flag, fmt, name, cls) in FACE_RECORD_LAYOUT)
+_ESTIMATION_NAMES = frozenset(_ESTIMATION_ORDER)
+
+def _make_face_layout():
+    fmt = '<' + _DETECTION_FORMAT
+    layout = []
+    for (flag, field_fmt, name, cls) in FACE_RECORD_LAYOUT:
+        start = len(fmt) - 1
+        fmt += field_fmt
+        tracking_cls = TRACKING_CLASSES.get(flag)
+        if tracking_cls is not None:
+            fmt += 'b'
+        layout.append((flag, name, field_fmt, cls, tracking_cls,\
+                       start, start + len(field_fmt)))
+    return (Struct(fmt + 'HH'), tuple(layout))
+
+# Face entry struct, and tuple of
+#   (flag, attribute name, struct format, result class,
+#    tracking result class or None, start, end)
+# in the order of FACE_RECORD_LAYOUT.
+# The values of the result are values[start:end] of the face entry, and
+# STB status is values[end] if the result can be tracked.
+# The present flags and the tracked flags are values[-2] and values[-1].
+(FACE_ENTRY, _FACE_LAYOUT) = _make_face_layout()
+
+_get_detection = attrgetter('pos_x', 'pos_y', 'size', 'conf')
+_get_tracking = attrgetter('pos_x', 'pos_y', 'size', 'conf',\
+                           'detection_id', 'tracking_id')
+_get_estimations = attrgetter(*_ESTIMATION_ORDER)
+_face_encode_plans = {}
+_block_structs = {}
+
+def _get_block_struct(fmt, n):
+    """Gets the cached struct of the consecutive entries of the same format."""
+    key = (fmt, n)
+    st = _block_structs.get(key)
+    if st is None:
+        st = Struct('<' + fmt * n)
+        _block_structs[key] = st
+    return st
+
+def _frame_ids(start=0):
+    """Iterates the IDs of the entries of HVCResult. (index, not tracked)"""
+    return izip(count(start), repeat(STB_TRID_NOT_TRACKED))
+
+def _group_faces(faces):
+    """Groups the consecutive faces by the class of the face and the classes
+    of its estimation results.
+
+    Returns:
+        list of (key, start, end)
+            key (tuple): (face class, classes of estimation results in the
+                          order of FACE_RECORD_LAYOUT (NoneType if None))
+            start, end (int): the faces of the group are faces[start:end]
+                              (get them with _get_group())
+    """
+    if len(faces) == 0:
+        return []
+    n = len(_ESTIMATION_ORDER)
+    types = map(type, chain.from_iterable(map(_get_estimations, faces)))
+    classes = types[:n]
+    face_classes = set(map(type, faces))
+    if len(face_classes) == 1 and types == classes * len(faces):
+        return [((face_classes.pop(), tuple(classes)), 0, len(faces))]
+
+    keys = [(type(f), tuple(types[i * n:(i + 1) * n]))\
+            for (i, f) in enumerate(faces)]
+    groups = []
+    start = 0
+    for (key, group) in groupby(keys):
+        end = start + len(list(group))
+        groups.append((key, start, end))
+        start = end
+    return groups
+
+def _get_group(faces, start, end):
+    """Gets faces[start:end] without slicing.
+    (FaceView of HVCTrackingResultView is not sliceable)
+    """
+    if start == 0 and end == len(faces):
+        return faces
+    return list(islice(faces, start, end))
+
+def _get_face_encode_plan(tracking, classes):
+    """Gets the compiled encode plan of one face entry.
+
+    The plan is compiled once per combination of the classes of estimation
+    results and cached.
+
+    Args:
+        tracking (bool): True for TrackingFaceResult
+        classes (tuple): class of each estimation result (NoneType if None)
+                         in the order of FACE_RECORD_LAYOUT
+
+    Returns:
+        tuple of (fmt, get_values, flags)
+            fmt (str): struct format of the face entry without byte order.
+                       The results not present are padded with 0.
+            get_values: gets the values from the face result at once.
+                        (for FaceResult, the values of the estimation
+                         results only, or None if no result is present)
+            flags (tuple): present flags and tracked flags
+    """
+    key = (tracking, classes)
+    plan = _face_encode_plans.get(key)
+    if plan is None:
+        if tracking:
+            names = ['pos_x', 'pos_y', 'size', 'conf',\
+                     'detection_id', 'tracking_id']
+        else:
+            names = []
+        fmt = _DETECTION_FORMAT
+
+        present = 0
+        tracked = 0
+        for ((flag, name, field_fmt, cls, tracking_cls, start, end),\
+             res_cls) in zip(_FACE_LAYOUT, classes):
+            if res_cls is type(None):
+                fmt += 'x' * calcsize('<' + field_fmt)
+                if tracking_cls is not None:
+                    fmt += 'x'
+                continue
+            present |= flag
+            fmt += field_fmt
+            names += [name + '.' + attr for attr in cls.__slots__]
+            if tracking_cls is None:
+                continue
+            if issubclass(res_cls, tracking_cls):
+                tracked |= flag
+                fmt += 'b'
+                names.append(name + '.tracking_status')
+            else:
+                fmt += 'x'
+        fmt += 'HH'
+
+        get_values = attrgetter(*names) if names else None
+        plan = (fmt, get_values, (present, tracked))
+        _face_encode_plans[key] = plan
+    return plan
+
+_TRACKING_STATUS_CLASSES = tuple(TRACKING_CLASSES.values())
+_entry_plans = {}
+_face_json_plans = {}
+_json_encoder = json.JSONEncoder(separators=(',', ':'))
+
+
+def _json_template(names):
+    return '{' + ','.join('"{0}":%s'.format(name) for name in names) + '}'
+
+def _get_entry_plan(cls):
+    """Gets the attribute names of a result class, their getter and the
+    JSON template of the values.
+
+    Estimation results of a face are excluded.
+    """
+    plan = _entry_plans.get(cls)
+    if plan is None:
+        if issubclass(cls, (FaceResult, TrackingFaceResult)):
+            excluded = _ESTIMATION_NAMES
+        else:
+            excluded = ()
+        names = []
+        for c in reversed(cls.__mro__):
+            for name in c.__dict__.get('__slots__', ()):
+                if name not in names and name not in excluded:
+                    names.append(name)
+        if issubclass(cls, _TRACKING_STATUS_CLASSES):
+            names.append('tracking_status')
+        plan = (tuple(names), attrgetter(*names), _json_template(names))
+        _entry_plans[cls] = plan
+    return plan
+
+def _entry_to_dict(obj):
+    (names, get_values, template) = _get_entry_plan(obj.__class__)
+    return dict(izip(names, get_values(obj)))
+
+def _face_to_dict(face):
+    d = _entry_to_dict(face)
+    for (name, res) in izip(_ESTIMATION_ORDER, _get_estimations(face)):
+        if res is not None:
+            d[name] = _entry_to_dict(res)
+    return d
+
+def to_dict(result):
+    """Converts a result to dict of the built-in types.
+
+    Args:
+        result: HVCResult, HVCTrackingResult or one of their entries
+                (e.g. FaceResult, TrackingFaceResult, AgeResult)
+
+    Returns:
+        dict: e.g. {'faces': [{'pos_x': 800, 'pos_y': 600, 'size': 200,
+                               'conf': 700, 'age': {'age': 30, ...}}, ...],
+                    'bodies': [...], 'hands': [...]}
+              The estimation results of None are omitted.
+    """
+    if isinstance(result, (HVCResult, HVCTrackingResult)):
+        return {'faces': [_face_to_dict(f) for f in result.faces],
+                'bodies': [_entry_to_dict(b) for b in result.bodies],
+                'hands': [_entry_to_dict(h) for h in result.hands]}
+    if isinstance(result, (FaceResult, TrackingFaceResult)):
+        return _face_to_dict(result)
+    return _entry_to_dict(result)
+
+
+def _get_face_json_plan(cls, classes):
+    """Gets the compiled JSON template of one face and the getter of its
+    values, per combination of the face class and the estimation classes.
+    """
+    key = (cls, classes)
+    plan = _face_json_plans.get(key)
+    if plan is None:
+        (names, get_values, template) = _get_entry_plan(cls)
+        parts = [template[:-1]]
+        names = list(names)
+        for (name, res_cls) in izip(_ESTIMATION_ORDER, classes):
+            if res_cls is type(None):
+                continue
+            (fields, get_values, template) = _get_entry_plan(res_cls)
+            parts.append('"{0}":{1}'.format(name, template))
+            names += [name + '.' + field for field in fields]
+        plan = (','.join(parts) + '}', attrgetter(*names))
+        _face_json_plans[key] = plan
+    return plan
+
+def _format_json(template, get_values, entries):
+    """Formats the entries of the same template at once.
+
+    Returns:
+        str: the formatted entries, or None if any value is None
+             (the values of the results are integers or None)
+    """
+    values = tuple(chain.from_iterable(map(get_values, entries)))
+    s = ','.join([template] * len(entries)) % values
+    if 'None' in s:
+        return None
+    return s
+
+def _entries_to_json(entries):
+    if len(entries) == 0:
+        return ''
+    classes = set(map(type, entries))
+    if len(classes) == 1:
+        (names, get_values, template) = _get_entry_plan(classes.pop())
+        s = _format_json(template, get_values, entries)
+        if s is not None:
+            return s
+    return ','.join(_json_encoder.encode(_entry_to_dict(e)) for e in entries)
+
+def _faces_to_json(faces):
+    s = []
+    for (key, start, end) in _group_faces(faces):
+        (template, get_values) = _get_face_json_plan(*key)
+        group = _get_group(faces, start, end)
+        line = _format_json(template, get_values, group)
+        if line is None:
+            line = ','.join(_json_encoder.encode(_face_to_dict(f))\
+                            for f in group)
+        s.append(line)
+    return ','.join(s)
+
+def to_json(result, **extra):
+    """Converts a result to one line of JSON.
+
+    The line is formatted by the templates compiled per class of the
+    entries, i.e. json.loads(to_json(result)) == to_dict(result).
+
+    Args:
+        result: HVCResult or HVCTrackingResult
+        extra: additional items of the line (e.g. timestamp, camera_id)
+
+    Returns:
+        str: JSON object without line feed
+    """
+    s = '{"faces":[' + _faces_to_json(result.faces)\
+      + '],"bodies":[' + _entries_to_json(result.bodies)\
+      + '],"hands":[' + _entries_to_json(result.hands) + ']'
+    if extra:
+        s += ',' + _json_encoder.encode(extra)[1:-1]
+    return s + '}'
+
+
+class JSONLinesWriter(object):
+    """Writer of results in JSON Lines format. (one JSON object per line)
+
+    Usage:
+        writer = JSONLinesWriter(open('result.jsonl', 'w'))
+        writer.write(tracking_result, timestamp=time.time())
+    """
+    def __init__(self, fileobj):
+        self._file = fileobj
+
+    def write(self, result, **extra):
+        """Writes one result as one line.
+
+        Args:
+            result: HVCResult or HVCTrackingResult
+            extra: additional items of the line (e.g. timestamp, camera_id)
+        """
+        self._file.write(to_json(result, **extra) + '\n')
+
+    def flush(self):
+        self._file.flush()
+
+
+def read_json_lines(fileobj):
+    """Reads the lines written by JSONLinesWriter.
+
+    Yields:
+        dict of each line
+    """
+    for line in fileobj:
+        if line.strip():
+            yield json.loads(line)
+
+
+def get_record_size(body_count, hand_count, face_count):
+    """Gets the size(bytes) of one binary record."""
+    return RECORD_HEADER.size + DETECTION_ENTRY.size * (body_count + hand_count)\
+                              + FACE_ENTRY.size * face_count
+
+
+class BinaryResultEncoder(object):
+    """Encoder of results to fixed layout binary records.
+
+    Each record is written into the buffer owned by the encoder, which is
+    reused for every record. So no memory is allocated for a record
+    unless it is larger than the previous ones.
+
+    Usage:
+        encoder = BinaryResultEncoder()
+        f.write(encoder.encode(tracking_result))
+    """
+    def __init__(self, initial_size=4096):
+        self._buf = bytearray(initial_size)
+
+    def encode(self, result):
+        """Encodes a result into the reused buffer.
+
+        Args:
+            result: HVCResult or HVCTrackingResult
+
+        Returns:
+            buffer: the record, valid until the next encode()
+        """
+        size = get_record_size(len(result.bodies), len(result.hands),\
+                               len(result.faces))
+        if size > len(self._buf):
+            self._buf = bytearray(size * 2)
+        self.encode_into(result, self._buf, 0)
+        return buffer(self._buf, 0, size)
+
+    @staticmethod
+    def encode_into(result, buf, offset=0):
+        """Encodes a result into a writable buffer.
+
+        Args:
+            result: HVCResult or HVCTrackingResult
+            buf: writable buffer (e.g. bytearray, mmap) large enough for
+                 get_record_size()
+            offset (int): offset in buf
+
+        Returns:
+            int: offset next to the record
+        """
+        tracking = isinstance(result, HVCTrackingResult)
+        bodies = result.bodies
+        hands = result.hands
+        faces = result.faces
+        RECORD_HEADER.pack_into(buf, offset,\
+                                RECORD_TRACKING if tracking else RECORD_FRAME,\
+                                len(bodies), len(hands), len(faces))
+        offset += RECORD_HEADER.size
+
+        # Packs each block of consecutive entries of the same format at once.
+        # (bodies and hands are one block)
+        n = len(bodies) + len(hands)
+        if n > 0:
+            if tracking:
+                values = chain.from_iterable(chain(map(_get_tracking, bodies),\
+                                                   map(_get_tracking, hands)))
+            else:
+                values = chain.from_iterable(chain.from_iterable(chain(\
+                            izip(map(_get_detection, bodies), _frame_ids()),\
+                            izip(map(_get_detection, hands), _frame_ids()))))
+            _get_block_struct(_DETECTION_FORMAT, n).pack_into(buf, offset,\
+                                                              *values)
+            offset += DETECTION_ENTRY.size * n
+
+        for ((cls, classes), start, end) in _group_faces(faces):
+            (fmt, get_values, flags) = _get_face_encode_plan(tracking, classes)
+            group = _get_group(faces, start, end)
+            n = end - start
+            if tracking:
+                items = izip(map(get_values, group), repeat(flags, n))
+            else:
+                items = izip(map(_get_detection, group),\
+                             _frame_ids(start),\
+                             map(get_values, group) if get_values\
+                                                    else repeat((), n),\
+                             repeat(flags, n))
+            values = chain.from_iterable(chain.from_iterable(items))
+            _get_block_struct(fmt, n).pack_into(buf, offset, *values)
+            offset += FACE_ENTRY.size * n
+        return offset
+
+
+def decode_record(data, offset=0):
+    """Decodes one binary record.
+
+    Args:
+        data: buffer of the records
+        offset (int): offset of the record in data
+
+    Returns:
+        tuple of (result, offset)
+            result: HVCResult or HVCTrackingResult
+            offset (int): offset next to the record
+    """
+    (record_type, body_count, hand_count, face_count) =\
+                                    RECORD_HEADER.unpack_from(data, offset)
+    offset += RECORD_HEADER.size
+    if record_type == RECORD_TRACKING:
+        tracking = True
+        result = HVCTrackingResult()
+    elif record_type == RECORD_FRAME:
+        tracking = False
+        result = HVCResult()
+    else:
+        raise ValueError("Invalid record type:{0!r}".format(record_type))
+
+    unpack_detection = DETECTION_ENTRY.unpack_from
+    for (entries, count) in ((result.bodies, body_count),\
+                             (result.hands, hand_count)):
+        for i in range(count):
+            v = unpack_detection(data, offset)
+            if tracking:
+                entries.append(TrackingResult(*v))
+            else:
+                entries.append(DetectionResult(v[0], v[1], v[2], v[3]))
+            offset += DETECTION_ENTRY.size
+
+    unpack_face = FACE_ENTRY.unpack_from
+    for i in range(face_count):
+        v = unpack_face(data, offset)
+        if tracking:
+            f = TrackingFaceResult(v[0], v[1], v[2], v[3], v[4], v[5])
+        else:
+            f = FaceResult(v[0], v[1], v[2], v[3])
+        present = v[-2]
+        tracked = v[-1]
+        for (flag, name, field_fmt, cls, tracking_cls, start, end)\
+                                                          in _FACE_LAYOUT:
+            if present & flag:
+                if tracked & flag:
+                    res = tracking_cls(v[end], *v[start:end])
+                else:
+                    res = cls(*v[start:end])
+                setattr(f, name, res)
+        result.faces.append(f)
+        offset += FACE_ENTRY.size
+    return (result, offset)
+
+def iter_records(data):
+    """Decodes the concatenated binary records.
+
+    Yields:
+        HVCResult or HVCTrackingResult
+    """
+    offset = 0
+    while offset < len(data):
+        (result, offset) = decode_record(data, offset)
+        yield result
+
+if __name__ == '__main__':
+    pass
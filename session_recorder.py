@@ -0,0 +1,209 @@
+﻿# ---------------------------------------------------------------------------
+# Copyright 2017-2018  OMRON Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ---------------------------------------------------------------------------
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import mmap
+import time
+import zlib
+from collections import deque
+from struct import *
+
+# Session log format (little endian)
+#
+#     File header : magic(8 bytes) 'HVCSLOG1'
+#     Segment     : flags(B), raw size(I), stored size(I), stored data
+#                   The stored data is zlib compressed if SEGMENT_COMPRESSED is
+#                   set in flags.
+#     Record      : (in raw segment data)
+#                   type(B), timestamp(d), data size(I), data
+#                   type      : RECORD_COMMAND or RECORD_RESPONSE
+#                   timestamp : monotonic time in seconds
+#                   data      : raw command, or raw response(header + data)
+
+SESSION_MAGIC = b'HVCSLOG1'
+
+SEGMENT_COMPRESSED = 0x01
+
+RECORD_COMMAND  = 0x01
+RECORD_RESPONSE = 0x02
+
+SEGMENT_HEADER = Struct('<BII')
+RECORD_HEADER = Struct('<BdI')
+
+DEFAULT_SEGMENT_SIZE = 1024 * 1024
+
+# Monotonic clock if available.
+_clock = getattr(time, 'monotonic', time.time)
+
+
+class SessionRecorder(object):
+    """Recorder of raw commands and responses to a session log file.
+
+    Records are buffered in memory and written by segment, so recording
+    costs only a few memory copies per command at full frame rate.
+
+    Usage:
+        recorder = SessionRecorder('session.log', compress=True)
+        hvc_p2_api.set_recorder(recorder)
+        ...
+        hvc_p2_api.set_recorder(None)
+        recorder.close()
+    """
+    def __init__(self, fname, compress=False, segment_size=DEFAULT_SEGMENT_SIZE):
+        """Constructor
+
+        Args:
+            fname (str): session log file name
+            compress (bool): compresses each segment with zlib
+            segment_size (int): raw size(bytes) of one segment
+        """
+        self._file = open(fname, 'wb')
+        self._file.write(SESSION_MAGIC)
+        self._compress = compress
+        self._segment_size = segment_size
+        self._records = []
+        self._size = 0
+
+    def record_command(self, data):
+        """Records a raw command sent to the device."""
+        self._record(RECORD_COMMAND, data)
+
+    def record_response(self, data):
+        """Records a raw response(header + data) received from the device."""
+        self._record(RECORD_RESPONSE, data)
+
+    def _record(self, record_type, data):
+        header = RECORD_HEADER.pack(record_type, _clock(), len(data))
+        self._records.append(header)
+        self._records.append(data)
+        self._size += len(header) + len(data)
+        if self._size >= self._segment_size:
+            self.flush()
+
+    def flush(self):
+        """Writes the buffered records as one segment."""
+        if self._size == 0:
+            return
+
+        raw = b''.join(self._records)
+        if self._compress:
+            flags = SEGMENT_COMPRESSED
+            stored = zlib.compress(raw, 1)
+        else:
+            flags = 0
+            stored = raw
+        self._file.write(SEGMENT_HEADER.pack(flags, len(raw), len(stored)))
+        self._file.write(stored)
+        self._file.flush()
+        self._records = []
+        self._size = 0
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+
+class SessionReader(object):
+    """Reader of a session log file.
+
+    The file is mapped by mmap, so a large log is not loaded into memory and
+    the data of uncompressed segments is returned without copy.
+    """
+    def __init__(self, fname):
+        self._file = open(fname, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+        if self._map[:len(SESSION_MAGIC)] != SESSION_MAGIC:
+            self.close()
+            raise ValueError("Invalid session log:{0!r}".format(fname))
+
+    def records(self):
+        """Reads all records from the beginning.
+
+        Yields:
+            tuple of (record_type, timestamp, data)
+                data (buffer): read-only buffer valid until close()
+        """
+        m = self._map
+        cur = len(SESSION_MAGIC)
+        while cur + SEGMENT_HEADER.size <= len(m):
+            (flags, raw_size, stored_size) = SEGMENT_HEADER.unpack_from(m, cur)
+            cur += SEGMENT_HEADER.size
+            if cur + stored_size > len(m): # Truncated segment
+                return
+            if flags & SEGMENT_COMPRESSED:
+                raw = zlib.decompress(m[cur:cur + stored_size])
+                offset = 0
+            else:
+                raw = m
+                offset = cur
+            cur += stored_size
+
+            end = offset + raw_size
+            while offset < end:
+                (record_type, timestamp, size) = RECORD_HEADER.unpack_from(raw, offset)
+                offset += RECORD_HEADER.size
+                yield (record_type, timestamp, buffer(raw, offset, size))
+                offset += size
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+def pair_commands(records):
+    """Pairs each recorded command with its response.
+
+    A pipelined session sends the next command before the response of
+    the current one, so the responses are paired in the order of the
+    commands.
+
+    Args:
+        records: records of SessionReader.records() or read_session()
+
+    Yields:
+        tuple of (command, command_ts, response, response_ts)
+    """
+    commands = deque()
+    for (record_type, timestamp, data) in records:
+        if record_type == RECORD_COMMAND:
+            commands.append((data, timestamp))
+        elif record_type == RECORD_RESPONSE and commands:
+            (command, command_ts) = commands.popleft()
+            yield (command, command_ts, data, timestamp)
+
+def read_session(fname):
+    """Reads all records in a session log file.
+
+    Args:
+        fname (str): session log file name
+
+    Yields:
+        tuple of (record_type, timestamp, data)
+    """
+    reader = SessionReader(fname)
+    try:
+        for (record_type, timestamp, data) in reader.records():
+            yield (record_type, timestamp, str(data))
+    finally:
+        reader.close()
+
+if __name__ == '__main__':
+    pass
@@ -39,14 +39,63 @@ STB_RET_ERR_NOHANDLE     = -0x07  # Handle error
 STB_RET_ERR_PROCESSCONDITION = -0x08 # Processing condition error
 
 
+_P_INT = POINTER(c_int)
+
+# Prototypes of STB library functions: (name, restype, argtypes)
+# The handle(HSTB) is a pointer.
+_STB_PROTOTYPES = (
+    ('STB_GetVersion',              c_int,    (POINTER(c_byte), POINTER(c_byte))),
+    ('STB_CreateHandle',            c_void_p, (c_uint,)),
+    ('STB_DeleteHandle',            c_int,    (c_void_p,)),
+    ('STB_SetFrameResult',          c_int,    (c_void_p, POINTER(C_FRAME_RESULT))),
+    ('STB_ClearFrameResults',       c_int,    (c_void_p,)),
+    ('STB_Execute',                 c_int,    (c_void_p,)),
+    ('STB_GetFaces',                c_int,    (c_void_p, POINTER(c_uint), POINTER(C_FACE))),
+    ('STB_GetBodies',               c_int,    (c_void_p, POINTER(c_uint), POINTER(C_BODY))),
+    ('STB_SetTrRetryCount',         c_int,    (c_void_p, c_int)),
+    ('STB_GetTrRetryCount',         c_int,    (c_void_p, _P_INT)),
+    ('STB_SetTrSteadinessParam',    c_int,    (c_void_p, c_int, c_int)),
+    ('STB_GetTrSteadinessParam',    c_int,    (c_void_p, _P_INT, _P_INT)),
+    ('STB_SetPeThresholdUse',       c_int,    (c_void_p, c_int)),
+    ('STB_GetPeThresholdUse',       c_int,    (c_void_p, _P_INT)),
+    ('STB_SetPeAngleUse',           c_int,    (c_void_p, c_int, c_int, c_int, c_int)),
+    ('STB_GetPeAngleUse',           c_int,    (c_void_p, _P_INT, _P_INT, _P_INT, _P_INT)),
+    ('STB_SetPeCompleteFrameCount', c_int,    (c_void_p, c_int)),
+    ('STB_GetPeCompleteFrameCount', c_int,    (c_void_p, _P_INT)),
+    ('STB_SetFrThresholdUse',       c_int,    (c_void_p, c_int)),
+    ('STB_GetFrThresholdUse',       c_int,    (c_void_p, _P_INT)),
+    ('STB_SetFrAngleUse',           c_int,    (c_void_p, c_int, c_int, c_int, c_int)),
+    ('STB_GetFrAngleUse',           c_int,    (c_void_p, _P_INT, _P_INT, _P_INT, _P_INT)),
+    ('STB_SetFrCompleteFrameCount', c_int,    (c_void_p, c_int)),
+    ('STB_GetFrCompleteFrameCount', c_int,    (c_void_p, _P_INT)),
+    ('STB_SetFrMinRatio',           c_int,    (c_void_p, c_int)),
+    ('STB_GetFrMinRatio',           c_int,    (c_void_p, _P_INT)))
+
+
 class STB(object):
     """Python wrapper class for STB library(dll) in C language."""
     hSTB = c_void_p()
 
     def __init__(self, library_name, exec_func):
-        # Load shared library
+        # Load shared library and declare the prototypes of all functions.
         self.stbDLL = cdll.LoadLibrary(library_name)
-        self.hSTB = self.stbDLL.STB_CreateHandle(exec_func)
+        for (name, restype, argtypes) in _STB_PROTOTYPES:
+            func = getattr(self.stbDLL, name)
+            func.restype = restype
+            func.argtypes = argtypes
+
+        handle = self.stbDLL.STB_CreateHandle(exec_func)
+        if handle is None:
+            raise Exception('Failed to create STB handle.')
+        self.hSTB = c_void_p(handle)
+
+        # Functions and output arguments used for every frame.
+        self._set_frame_result = self.stbDLL.STB_SetFrameResult
+        self._execute = self.stbDLL.STB_Execute
+        self._get_faces = self.stbDLL.STB_GetFaces
+        self._get_bodies = self.stbDLL.STB_GetBodies
+        self._face_count = c_uint(0)
+        self._body_count = c_uint(0)
 
     def execute(self, frame_res, faces_res, bodies_res):
         """Executes stabilization process.
@@ -73,29 +122,36 @@ class STB(object):
                 body_count (int): body count
 
         """
-        _face_count = c_uint(0)
-        _body_count = c_uint(0)
+        hSTB = self.hSTB
+        _face_count = self._face_count
+        _body_count = self._body_count
 
-        ret = self.stbDLL.STB_SetFrameResult(self.hSTB, byref(frame_res))
+        ret = self._set_frame_result(hSTB, frame_res)
         if ret != STB_RET_NORMAL:
             return (ret, 0, 0)
 
-        ret = self.stbDLL.STB_Execute(self.hSTB)
+        ret = self._execute(hSTB)
         if ret != STB_RET_NORMAL:
             return (ret, 0, 0)
 
-        ret = self.stbDLL.STB_GetFaces(self.hSTB, byref(_face_count),\
-                                                  byref(faces_res))
+        ret = self._get_faces(hSTB, _face_count, faces_res)
         if ret != STB_RET_NORMAL:
             return (ret, 0, 0)
 
-        ret = self.stbDLL.STB_GetBodies(self.hSTB, byref(_body_count),\
-                                                   byref(bodies_res))
+        ret = self._get_bodies(hSTB, _body_count, bodies_res)
         if ret != STB_RET_NORMAL:
             return (ret, 0, 0)
 
         return (STB_RET_NORMAL, _face_count.value, _body_count.value)
 
+    def get_max_output_count(self):
+        """Gets the maximum face/body count of execute() output.
+
+        Returns:
+            int: the size of faces_res and bodies_res needed
+        """
+        return C_FACE_RES35._length_
+
     def get_stb_version(self):
         _major_version = c_byte(0)
         _minor_version = c_byte(0)
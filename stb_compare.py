@@ -0,0 +1,190 @@
+﻿# ---------------------------------------------------------------------------
+# Copyright 2017-2018  OMRON Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ---------------------------------------------------------------------------
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import argparse
+from itertools import izip
+from hvc_tracking_result_c import STB_STATUS_COMPLETE
+from result_serializer import read_json_lines
+from stb_reprocess import STBReprocessor, DEFAULT_STB_LIB_NAME, OUTPUT_EXT,\
+                          PySTB, parse_setting
+from stb import STB
+
+# Estimations stabilized by STB, and the key of their values.
+STABILIZED_ESTIMATIONS = (('age', 'age'), ('gender', 'gender'),\
+                          ('recognition', 'uid'))
+
+
+class STBComparison(object):
+    """Differences between the outputs of two STB engines of one session.
+
+    The engines get the same detections, so the faces and the bodies of a
+    frame are paired by the detection ID. The tracking IDs are numbered by
+    each engine, so a track is compared by the pairing of its IDs, i.e. an
+    ID change is counted when a track of one engine is paired with another
+    track of the other engine than before.
+    """
+    def __init__(self):
+        self.frame_count = 0
+        self.stb_return_diffs = 0
+        # counts of faces and bodies
+        self.detections = {'faces': 0, 'bodies': 0}
+        self.id_changes = {'faces': 0, 'bodies': 0}
+        self.retrying = {'faces': [0, 0], 'bodies': [0, 0]}
+        # counts of each estimation of the paired faces
+        self.status_diffs = dict((name, 0) for (name, key)\
+                                              in STABILIZED_ESTIMATIONS)
+        self.value_diffs = dict((name, 0) for (name, key)\
+                                             in STABILIZED_ESTIMATIONS)
+        self._pairs = {'faces': ({}, {}), 'bodies': ({}, {})}
+
+    def add_frame(self, line_a, line_b):
+        """Compares the lines of the same frame written by STBReprocessor."""
+        self.frame_count += 1
+        if line_a['stb_return'] != line_b['stb_return']:
+            self.stb_return_diffs += 1
+        for kind in ('faces', 'bodies'):
+            entries_a = line_a[kind]
+            entries_b = line_b[kind]
+            retrying = self.retrying[kind]
+            retrying[0] += sum(1 for e in entries_a if e['detection_id'] < 0)
+            retrying[1] += sum(1 for e in entries_b if e['detection_id'] < 0)
+
+            detected_b = dict((e['detection_id'], e) for e in entries_b\
+                                                      if e['detection_id'] >= 0)
+            (a_to_b, b_to_a) = self._pairs[kind]
+            for a in entries_a:
+                b = detected_b.get(a['detection_id'])
+                if b is None:
+                    continue
+                self.detections[kind] += 1
+                (id_a, id_b) = (a['tracking_id'], b['tracking_id'])
+                if a_to_b.get(id_a, id_b) != id_b or\
+                   b_to_a.get(id_b, id_a) != id_a:
+                    self.id_changes[kind] += 1
+                a_to_b[id_a] = id_b
+                b_to_a[id_b] = id_a
+                if kind == 'faces':
+                    self._compare_estimations(a, b)
+
+    def _compare_estimations(self, a, b):
+        for (name, key) in STABILIZED_ESTIMATIONS:
+            if name not in a or name not in b:
+                continue
+            (res_a, res_b) = (a[name], b[name])
+            if res_a['tracking_status'] != res_b['tracking_status']:
+                self.status_diffs[name] += 1
+            elif res_a['tracking_status'] >= STB_STATUS_COMPLETE and\
+                 res_a[key] != res_b[key]:
+                self.value_diffs[name] += 1
+
+    def format(self, names=('A', 'B')):
+        """Formats the differences as lines of text."""
+        lines = ['{0} frames, {1} frames of different STB return'.format(\
+                 self.frame_count, self.stb_return_diffs)]
+        for kind in ('faces', 'bodies'):
+            lines.append('{0:<6}: {1} detections, {2} tracking ID changes, '\
+                         'retrying {3} {4} / {5} {6}'.format(kind,\
+                         self.detections[kind], self.id_changes[kind],\
+                         names[0], self.retrying[kind][0],\
+                         names[1], self.retrying[kind][1]))
+        lines.append('status/value differences: ' + ', '.join(\
+                     '{0} {1}/{2}'.format(name, self.status_diffs[name],\
+                                          self.value_diffs[name])\
+                     for (name, key) in STABILIZED_ESTIMATIONS))
+        return lines
+
+
+def compare_outputs(fname_a, fname_b):
+    """Compares two outputs of STBReprocessor of the same session.
+
+    Returns:
+        STBComparison
+    """
+    comparison = STBComparison()
+    with open(fname_a) as file_a:
+        with open(fname_b) as file_b:
+            for (line_a, line_b) in izip(read_json_lines(file_a),\
+                                         read_json_lines(file_b)):
+                comparison.add_frame(line_a, line_b)
+    return comparison
+
+def compare_session(fname, reprocessors, out_dir):
+    """Reprocesses a session log by two engines and compares the outputs.
+
+    Args:
+        fname (str): session log file name
+        reprocessors (tuple): two STBReprocessor
+        out_dir (str): directory of the outputs
+
+    Returns:
+        tuple of (comparison, seconds)
+            comparison (STBComparison): differences of the outputs
+            seconds (tuple): reprocessing time of each engine
+    """
+    base = os.path.splitext(os.path.basename(fname))[0]
+    out_fnames = []
+    seconds = []
+    for (i, reprocessor) in enumerate(reprocessors):
+        out_fname = os.path.join(out_dir, '{0}.{1}{2}'.format(base, i,\
+                                                              OUTPUT_EXT))
+        start = time.time()
+        reprocessor.reprocess(fname, out_fname)
+        seconds.append(time.time() - start)
+        out_fnames.append(out_fname)
+    return (compare_outputs(*out_fnames), tuple(seconds))
+
+def main():
+    parser = argparse.ArgumentParser(\
+                description='Compares STB library and PySTB on session logs')
+    parser.add_argument('sessions', nargs='+', metavar='session',\
+                        help='session log files recorded by SessionRecorder')
+    parser.add_argument('-o', '--output-dir', default=None,\
+                        help='directory to keep the outputs of the engines '\
+                             '(default: not kept)')
+    parser.add_argument('-l', '--library', default=DEFAULT_STB_LIB_NAME,\
+                        help='STB library (default: %(default)s)')
+    parser.add_argument('-s', '--setting', type=parse_setting, action='append',\
+                        default=[], metavar='NAME=V1[,V2...]',\
+                        help='STB setting of both engines '\
+                             'e.g. set_stb_tr_retry_count=3')
+    args = parser.parse_args()
+    if PySTB is None:
+        parser.error('PySTB requires NumPy.')
+
+    settings = dict(args.setting)
+    reprocessors = (STBReprocessor(args.library, settings, STB),\
+                    STBReprocessor(args.library, settings, PySTB))
+    out_dir = args.output_dir or tempfile.mkdtemp()
+    try:
+        for fname in args.sessions:
+            (comparison, seconds) = compare_session(fname, reprocessors, out_dir)
+            print '{0}: lib {1:.3f}[sec] python {2:.3f}[sec]'.format(fname,\
+                                                                   *seconds)
+            for line in comparison.format(('lib', 'python')):
+                print '  ' + line
+    finally:
+        if args.output_dir is None:
+            shutil.rmtree(out_dir)
+
+if __name__ == '__main__':
+    main()
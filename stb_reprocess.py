@@ -0,0 +1,299 @@
+﻿# ---------------------------------------------------------------------------
+# Copyright 2017-2018  OMRON Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ---------------------------------------------------------------------------
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import argparse
+import multiprocessing
+from struct import *
+from p2def import *
+from hvc_p2_wrapper import HVC_CMD_HDR_EXECUTE, RESPONSE_HEADER_SIZE
+from hvc_p2_api import WINDOWS_STB_LIB_NAME, LINUX_STB_LIB_NAME
+from hvc_p2_manager import STB_SETTERS
+from hvc_result import HVCResult
+from hvc_result_c import C_FRAME_RESULT
+from hvc_tracking_result_c import C_FACE, C_BODY, C_FACE_RES35, C_BODY_RES35
+from hvc_tracking_result import HVCTrackingResult
+from session_recorder import SessionReader, pair_commands
+from result_serializer import JSONLinesWriter
+from stb import STB
+try:
+    from py_stb import PySTB
+except ImportError: # NumPy is not installed.
+    PySTB = None
+
+if sys.platform == 'win32':
+    DEFAULT_STB_LIB_NAME = WINDOWS_STB_LIB_NAME
+else:
+    DEFAULT_STB_LIB_NAME = LINUX_STB_LIB_NAME
+
+OUTPUT_EXT = '.jsonl'
+
+# Stabilizer classes selectable by the command line.
+ENGINE_LIB = 'lib'
+ENGINE_PYTHON = 'python'
+
+def iter_executions(fname):
+    """Reads the Execute commands and their responses in a session log.
+
+    Args:
+        fname (str): session log file name
+
+    Yields:
+        tuple of (exec_func, timestamp, response_code, data)
+            exec_func (int): functions flag executed
+            timestamp (float): time when the response was received
+            response_code (int): response code from B5T-007001
+            data (buffer): response data (valid only in the iteration)
+    """
+    reader = SessionReader(fname)
+    try:
+        for (command, command_ts, response, response_ts)\
+                                          in pair_commands(reader.records()):
+            if command[:len(HVC_CMD_HDR_EXECUTE)] != HVC_CMD_HDR_EXECUTE:
+                continue
+            exec_func = unpack_from('<H', command, len(HVC_CMD_HDR_EXECUTE))[0]
+            (response_code, data_len) = unpack_from('<BI', response, 1)
+            data = buffer(response, RESPONSE_HEADER_SIZE, data_len)
+            yield (exec_func, response_ts, response_code, data)
+    finally:
+        reader.close()
+
+def get_session_exec_func(fname):
+    """Gets all functions executed in a session log."""
+    exec_func = EX_NONE
+    for (func, timestamp, response_code, data) in iter_executions(fname):
+        exec_func |= func
+    return exec_func
+
+
+class STBReprocessor(object):
+    """Re-executes STB library over the Execute responses of session logs.
+
+    The detection results recorded by SessionRecorder are stabilized again
+    with the given STB parameters, and the tracking results are written in
+    JSON Lines format (refer to result_serializer.to_json()) with seq,
+    timestamp, response_code and stb_return of each frame.
+
+    One STB handle is created per functions flag and reused for the
+    sessions of the same functions after clearing the frame results.
+
+    Usage:
+        reprocessor = STBReprocessor(settings={'set_stb_tr_retry_count': (3,)})
+        reprocessor.reprocess('session.log', 'session.jsonl')
+    """
+    def __init__(self, lib_name=DEFAULT_STB_LIB_NAME, settings=None,\
+                 stb_class=STB):
+        """Constructor
+
+        Args:
+            lib_name (str): STB library name
+            settings (dict): STB setter name of HVCP2Api and its arguments.
+                             e.g. {'set_stb_tr_retry_count': (3,),
+                                   'set_stb_fr_angle_use': (-15, 15, -20, 20)}
+            stb_class (class): STB, or PySTB in py_stb.py
+        """
+        self._lib_name = lib_name
+        self._stb_class = stb_class
+        self._settings = settings or {}
+        for name in self._settings:
+            if name not in STB_SETTERS:
+                raise ValueError("Invalid setting:{0!r}".format(name))
+        self._stb_dic = {}
+        self._stb_in = C_FRAME_RESULT()
+        self._stb_out_f = C_FACE_RES35()
+        self._stb_out_b = C_BODY_RES35()
+
+    def _get_stb(self, exec_func):
+        stb = self._stb_dic.get(exec_func)
+        if stb is not None:
+            stb.clear_stb_frame_results()
+            return stb
+
+        stb = self._stb_class(self._lib_name, exec_func)
+        for (name, args) in sorted(self._settings.items()):
+            ret = getattr(stb, name)(*args)
+            if ret != 0:
+                raise ValueError("Error: Invalid parameter. {0}().".format(name))
+        self._stb_dic[exec_func] = stb
+        return stb
+
+    def reprocess(self, fname, out_fname):
+        """Reprocesses one session log.
+
+        Args:
+            fname (str): session log file name
+            out_fname (str): output file name (JSON Lines)
+
+        Returns:
+            tuple of (frame_count, error_count)
+                frame_count (int): number of Execute responses
+                error_count (int): number of frames of STB error
+        """
+        exec_func = get_session_exec_func(fname)
+        stb = self._get_stb(exec_func)
+        max_count = stb.get_max_output_count()
+        if len(self._stb_out_f) < max_count:
+            # PySTB outputs the lost tracks being retried in addition.
+            self._stb_out_f = (C_FACE * max_count)()
+            self._stb_out_b = (C_BODY * max_count)()
+        stb_in = self._stb_in
+        stb_out_f = self._stb_out_f
+        stb_out_b = self._stb_out_b
+
+        frame_count = 0
+        error_count = 0
+        with open(out_fname, 'w') as f:
+            writer = JSONLinesWriter(f)
+            for (func, timestamp, response_code, data) in iter_executions(fname):
+                frame_result = HVCResult()
+                if response_code == RESPONSE_CODE_NORMAL:
+                    frame_result.read_from_buffer(func, len(data), data)
+
+                tracking_result = HVCTrackingResult()
+                # The estimations not executed on this frame are exported
+                # as not possible, as HVCP2Api.execute() does.
+                frame_result.export_to_C_FRAME_RESULT(stb_in)
+                (stb_return, face_count, body_count) = stb.execute(stb_in,\
+                                                       stb_out_f, stb_out_b)
+                if stb_return < 0: # STB error
+                    error_count += 1
+                else:
+                    # The estimations stabilized by STB are of all functions,
+                    # the others are of the functions executed on this frame.
+                    tracking_result.append_STB_RESULT(exec_func,\
+                                                      face_count, stb_out_f,\
+                                                      body_count, stb_out_b,\
+                                                      frame_result, func)
+                writer.write(tracking_result, seq=frame_count,\
+                             timestamp=timestamp, response_code=response_code,\
+                             stb_return=stb_return)
+                frame_count += 1
+        return (frame_count, error_count)
+
+
+# STBReprocessor of each worker process.
+_worker_reprocessor = None
+
+def _init_worker(lib_name, settings, stb_class):
+    global _worker_reprocessor
+    _worker_reprocessor = STBReprocessor(lib_name, settings, stb_class)
+
+def _reprocess_job(job):
+    (fname, out_fname) = job
+    try:
+        (frame_count, error_count) = _worker_reprocessor.reprocess(fname, out_fname)
+    except Exception as e:
+        return (fname, out_fname, 0, 0, '{0}: {1}'.format(type(e).__name__, e))
+    return (fname, out_fname, frame_count, error_count, None)
+
+def reprocess_sessions(jobs, lib_name=DEFAULT_STB_LIB_NAME, settings=None,\
+                       processes=None, stb_class=STB):
+    """Reprocesses session logs in parallel by a process pool.
+
+    Each worker process has its own STB handles, and the sessions are
+    distributed to the workers one by one.
+
+    Args:
+        jobs (list): list of tuple of (session log file name, output file name)
+        lib_name (str): STB library name
+        settings (dict): STB setter name of HVCP2Api and its arguments
+        processes (int): number of worker processes
+                         (None: number of CPUs, 1: in this process)
+        stb_class (class): STB, or PySTB in py_stb.py
+
+    Yields:
+        tuple of (fname, out_fname, frame_count, error_count, error) in the
+        order of completion.
+            error (str): error message if the session failed, or None.
+    """
+    if processes == 1:
+        _init_worker(lib_name, settings, stb_class)
+        for job in jobs:
+            yield _reprocess_job(job)
+        return
+
+    pool = multiprocessing.Pool(processes, _init_worker,\
+                                (lib_name, settings, stb_class))
+    try:
+        for ret in pool.imap_unordered(_reprocess_job, jobs):
+            yield ret
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+def parse_setting(s):
+    """Parses the STB setting of the command line. (NAME=V1[,V2...])"""
+    (name, sep, values) = s.partition('=')
+    if name not in STB_SETTERS or not sep:
+        raise argparse.ArgumentTypeError("invalid setting '{0}'".format(s))
+    try:
+        return (name, tuple(int(v) for v in values.split(',')))
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid setting '{0}'".format(s))
+
+def main():
+    parser = argparse.ArgumentParser(\
+                description='Reprocesses session logs by STB library')
+    parser.add_argument('sessions', nargs='+', metavar='session',\
+                        help='session log files recorded by SessionRecorder')
+    parser.add_argument('-o', '--output-dir', default='.',\
+                        help='directory of the results (default: %(default)s)')
+    parser.add_argument('-j', '--jobs', type=int, default=None,\
+                        help='number of worker processes (default: CPUs)')
+    parser.add_argument('-l', '--library', default=DEFAULT_STB_LIB_NAME,\
+                        help='STB library (default: %(default)s)')
+    parser.add_argument('-e', '--engine', choices=(ENGINE_LIB, ENGINE_PYTHON),\
+                        default=ENGINE_LIB,\
+                        help='stabilizer: STB library or PySTB '\
+                             '(default: %(default)s)')
+    parser.add_argument('-s', '--setting', type=parse_setting, action='append',\
+                        default=[], metavar='NAME=V1[,V2...]',\
+                        help='STB setting e.g. set_stb_tr_retry_count=3 '\
+                             '(' + ', '.join(STB_SETTERS) + ')')
+    args = parser.parse_args()
+    if args.engine == ENGINE_PYTHON:
+        if PySTB is None:
+            parser.error('PySTB requires NumPy.')
+        stb_class = PySTB
+    else:
+        stb_class = STB
+
+    jobs = []
+    for fname in args.sessions:
+        base = os.path.splitext(os.path.basename(fname))[0]
+        jobs.append((fname, os.path.join(args.output_dir, base + OUTPUT_EXT)))
+
+    failed = False
+    for (fname, out_fname, frame_count, error_count, error)\
+        in reprocess_sessions(jobs, args.library, dict(args.setting), args.jobs,\
+                              stb_class):
+        if error is not None:
+            failed = True
+            print '{0}: {1}'.format(fname, error)
+        else:
+            print '{0}: {1} frames ({2} STB errors) -> {3}'.format(fname,\
+                                         frame_count, error_count, out_fname)
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
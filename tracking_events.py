@@ -0,0 +1,199 @@
+﻿# ---------------------------------------------------------------------------
+# Copyright 2017-2018  OMRON Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ---------------------------------------------------------------------------
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from collections import namedtuple
+from hvc_tracking_result_c import STB_STATUS_NO_DATA, STB_STATUS_COMPLETE,\
+                                  STB_TRID_NOT_TRACKED
+from hvc_tracking_result import status_dic
+
+# Event types
+EVENT_ENTER  = 0    # a new tracking ID appeared
+EVENT_EXIT   = 1    # the tracking ID disappeared
+EVENT_MOVE   = 2    # the position or size changed beyond move_epsilon
+EVENT_STATUS = 3    # the estimation status(or the completed value) changed
+
+event_dic = {EVENT_ENTER :'ENTER',
+             EVENT_EXIT  :'EXIT',
+             EVENT_MOVE  :'MOVE',
+             EVENT_STATUS:'STATUS'}
+
+# Targets
+TARGET_FACE = 0
+TARGET_BODY = 1
+
+target_dic = {TARGET_FACE:'Face', TARGET_BODY:'Body'}
+
+# Estimations stabilized by STB library, and the attribute of their values.
+TRACKED_ESTIMATIONS = (('age', 'age'),
+                       ('gender', 'gender'),
+                       ('recognition', 'uid'))
+
+DEFAULT_MOVE_EPSILON = 8
+
+
+class TrackingEvent(namedtuple('TrackingEvent', ['type', 'target',\
+                                                 'tracking_id', 'data'])):
+    """One change of a tracked face or body.
+
+    Attributes:
+        type (int): EVENT_ENTER, EVENT_EXIT, EVENT_MOVE or EVENT_STATUS
+        target (int): TARGET_FACE or TARGET_BODY
+        tracking_id (int): tracking ID by STB library
+        data: EVENT_ENTER, EVENT_MOVE : tuple of (pos_x, pos_y, size)
+              EVENT_EXIT              : None
+              EVENT_STATUS            : tuple of (name, status, value)
+                  name   : 'age', 'gender' or 'recognition'
+                  status : STB_STATUS_XXX
+                  value  : age, gender or uid
+    """
+    __slots__ = ()
+
+    def __str__(self):
+        if self.type == EVENT_STATUS:
+            (name, status, value) = self.data
+            data = '{0}:{1} Status:{2}'.format(name, value, status_dic[status])
+        elif self.data is not None:
+            data = 'X:{0} Y:{1} Size:{2}'.format(*self.data)
+        else:
+            data = ''
+        return '{0:<6} {1} TrackingID:{2} {3}'.format(event_dic[self.type],\
+                       target_dic[self.target], self.tracking_id, data).rstrip()
+
+
+class _TrackState(object):
+    """Last published state of one tracking ID."""
+    __slots__ = ['pos_x', 'pos_y', 'size', 'estimations']
+    def __init__(self, pos_x, pos_y, size):
+        self.pos_x = pos_x
+        self.pos_y = pos_y
+        self.size = size
+        self.estimations = {}
+
+
+class TrackingEventDiffer(object):
+    """Differ emitting the changes between consecutive tracking results.
+
+    Faces and bodies are matched by tracking_id, and only the changes are
+    emitted as TrackingEvent, so that subscribers do not need to receive and
+    process the whole result on every frame.
+
+    - EVENT_ENTER is emitted for a new tracking ID with its position.
+    - EVENT_MOVE is emitted when the position or size differs from the last
+      emitted one by more than move_epsilon. The small jitter is not
+      emitted, but the slow drift is emitted once it accumulates.
+    - EVENT_STATUS is emitted when the status of age, gender or recognition
+      changes (e.g. CALCULATING -> FIXED), or when the value changes after
+      the estimation is complete. The initial status is NO_DATA.
+    - EVENT_EXIT is emitted for a tracking ID not in the result any more.
+
+    Note:
+        Tracking IDs are given by STB library, i.e. the results without STB
+        library (STB_TRID_NOT_TRACKED) and the hands are ignored.
+
+    Usage:
+        differ = TrackingEventDiffer()
+        while True:
+            hvc_p2_api.execute(OUT_IMG_TYPE_NONE, tracking_result, img)
+            for event in differ.diff(tracking_result):
+                publish(event)
+    """
+    def __init__(self, move_epsilon=DEFAULT_MOVE_EPSILON):
+        """Constructor
+
+        Args:
+            move_epsilon (int): minimum change of the position or size
+                                to emit EVENT_MOVE
+        """
+        if move_epsilon < 0:
+            raise ValueError("Invalid move_epsilon:{0!r}".format(move_epsilon))
+        self.move_epsilon = move_epsilon
+        self.reset()
+
+    def reset(self):
+        """Forgets all tracking IDs without emitting EVENT_EXIT.
+
+        Call this with HVCP2Api.reset_tracking().
+        """
+        self._faces = {}
+        self._bodies = {}
+
+    def diff(self, tracking_result):
+        """Compares the tracking result with the previous one.
+
+        Args:
+            tracking_result (HVCTrackingResult): the result of this frame
+
+        Returns:
+            list of TrackingEvent (empty if nothing has changed)
+        """
+        events = []
+        self._faces = self._diff(TARGET_FACE, tracking_result.faces,\
+                                 self._faces, events)
+        self._bodies = self._diff(TARGET_BODY, tracking_result.bodies,\
+                                  self._bodies, events)
+        return events
+
+    def _diff(self, target, items, last, events):
+        eps = self.move_epsilon
+        current = {}
+        for item in items:
+            tid = item.tracking_id
+            if tid is None or tid == STB_TRID_NOT_TRACKED:
+                continue
+
+            state = last.pop(tid, None)
+            if state is None:
+                state = _TrackState(item.pos_x, item.pos_y, item.size)
+                events.append(TrackingEvent(EVENT_ENTER, target, tid,\
+                                            (item.pos_x, item.pos_y, item.size)))
+            elif abs(item.pos_x - state.pos_x) > eps\
+              or abs(item.pos_y - state.pos_y) > eps\
+              or abs(item.size - state.size) > eps:
+                state.pos_x = item.pos_x
+                state.pos_y = item.pos_y
+                state.size = item.size
+                events.append(TrackingEvent(EVENT_MOVE, target, tid,\
+                                            (item.pos_x, item.pos_y, item.size)))
+
+            if target == TARGET_FACE:
+                self._diff_estimations(tid, item, state, events)
+            current[tid] = state
+
+        for tid in sorted(last):
+            events.append(TrackingEvent(EVENT_EXIT, target, tid, None))
+        return current
+
+    @staticmethod
+    def _diff_estimations(tid, face, state, events):
+        estimations = state.estimations
+        for (name, attr) in TRACKED_ESTIMATIONS:
+            res = getattr(face, name)
+            if res is None:
+                continue
+            status = getattr(res, 'tracking_status', STB_STATUS_NO_DATA)
+            value = getattr(res, attr)
+            (last_status, last_value) = estimations.get(name,\
+                                                 (STB_STATUS_NO_DATA, None))
+            if status != last_status or\
+               (status >= STB_STATUS_COMPLETE and value != last_value):
+                estimations[name] = (status, value)
+                events.append(TrackingEvent(EVENT_STATUS, TARGET_FACE, tid,\
+                                            (name, status, value)))
+
+if __name__ == '__main__':
+    pass